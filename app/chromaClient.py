@@ -1,12 +1,72 @@
 import os
+import sqlite3
+import threading
+from contextlib import contextmanager
 from chromadb import Client
 from chromadb.config import Settings
 
 # short path to avoid "File name too long"
 DB_DIR = "data/chroma"
 
+class _Gate:
+    """Counts in-flight Chroma calls; quiesced() waits for them to drain and holds new ones back."""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.active = 0
+        self.paused = False
+
+    @contextmanager
+    def call(self):
+        with self.cond:
+            while self.paused:
+                self.cond.wait()
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.active -= 1
+                self.cond.notify_all()
+
+    @contextmanager
+    def quiesced(self):
+        with self.cond:
+            while self.paused:
+                self.cond.wait()
+            self.paused = True
+            while self.active:
+                self.cond.wait()
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.paused = False
+                self.cond.notify_all()
+
+
+class _GatedCollection:
+    """Collection proxy: every method call passes through the client's gate."""
+
+    def __init__(self, collection, gate: _Gate):
+        self._collection = collection
+        self._gate = gate
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def gated(*args, **kwargs):
+            with self._gate.call():
+                return attr(*args, **kwargs)
+        return gated
+
+
 class ChromaClient:
     def __init__(self, db_dir: str = DB_DIR):
+        self.db_dir = db_dir
+        self.gate = _Gate()
         # NOTE: We keep using the default settings here. If you want persistence,
         # set persist_directory=db_dir in Settings() and ensure chroma version supports it.
         self.client = Client(Settings(
@@ -29,6 +89,8 @@ class ChromaClient:
             self.images = self.client.get_or_create_collection("images", metadata={"hnsw:space": "cosine"})
         except TypeError:
             self.images = self.client.get_or_create_collection("images")
+        self.chunks, self.tables, self.images = (
+            _GatedCollection(c, self.gate) for c in (self.chunks, self.tables, self.images))
 
     def get_or_create_collection(self, name: str):
         return self.client.get_or_create_collection(name)
@@ -51,6 +113,29 @@ class ChromaClient:
             return self.chunks.query(query_embeddings=[query_embedding], n_results=n_results, where=where, include=["documents", "metadatas", "distances", "ids"])
         return self.chunks.query(query_embeddings=[query_embedding], n_results=n_results, include=["documents", "metadatas", "distances", "ids"])
 
+    def get_chunks(self, ids: list):
+        # fetch stored chunks by id (used to hydrate corpus index hits)
+        return self.chunks.get(ids=ids, include=["documents", "metadatas"])
+
+    def get_metadatas(self, ids: list):
+        # metadata only (page / doc_id for BM25-only retrieval candidates)
+        return self.chunks.get(ids=ids, include=["metadatas"])
+
+    def get_embeddings(self, ids: list):
+        # stored vectors (MMR for candidates without a binary index)
+        return self.chunks.get(ids=ids, include=["embeddings"])
+
+    def iter_chunk_embeddings(self, batch_size: int = 5000, where: dict = None):
+        """Page through stored chunk embeddings: yields (ids, embeddings, metadatas)."""
+        offset = 0
+        while True:
+            res = self.chunks.get(where=where, limit=batch_size, offset=offset, include=["embeddings", "metadatas"])
+            ids = res.get("ids") or []
+            if not ids:
+                break
+            yield ids, res["embeddings"], res["metadatas"]
+            offset += len(ids)
+
     # ---------------- Tables ----------------
     def add_table(self, table_id: str, embedding: list, table_json: str, doc_id: str, page: int):
         metadata = {"doc_id": doc_id, "page": page, "type": "table"}
@@ -78,8 +163,37 @@ class ChromaClient:
     def query_images(self, query_embedding: list, n_results: int = 3):
         return self.images.query(query_embeddings=[query_embedding], n_results=n_results, include=["documents", "metadatas", "distances", "ids"])
 
+    def delete_document(self, doc_id: str) -> dict:
+        """Remove every chunk, table and image stored for doc_id. Returns counts per collection."""
+        removed = {}
+        for name, col in (("chunks", self.chunks), ("tables", self.tables), ("images", self.images)):
+            ids = col.get(where={"doc_id": doc_id}, include=[]).get("ids") or []
+            if ids:
+                col.delete(ids=ids)
+            removed[name] = len(ids)
+        return removed
+
+    def has_document(self, doc_id: str) -> bool:
+        return bool(self.chunks.get(where={"doc_id": doc_id}, limit=1, include=[]).get("ids"))
+
     def list_collections(self):
         return self.client.list_collections()
+
+    def vacuum(self) -> bool:
+        """
+        VACUUM the persistent SQLite store. Runs only with this client quiesced:
+        in-flight collection calls finish first and new ones wait until it is done.
+        """
+        db_path = os.path.join(self.db_dir, "chroma.sqlite3")
+        if not os.path.exists(db_path):
+            return False
+        with self.gate.quiesced():
+            conn = sqlite3.connect(db_path, timeout=30)
+            try:
+                conn.execute("VACUUM")
+            finally:
+                conn.close()
+        return True
     
     def count_chunks(self):
         try:
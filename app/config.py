@@ -8,9 +8,13 @@ DATA_DIR = BASE_DIR / "data"
 UPLOADS_DIR = DATA_DIR / "uploads"
 CHUNKS_DIR = DATA_DIR / "chunks"
 EMBEDDINGS_DIR = DATA_DIR / "embeddings"
+CACHE_DIR = DATA_DIR / "cache"
+CORPUS_INDEX_DIR = CACHE_DIR / "ivfpq"
+BINARY_INDEX_DIR = CACHE_DIR / "binary"
+CORPUS_BM25_DIR = CACHE_DIR / "bm25_corpus"
 
 # Ensure required directories exist
-for d in [UPLOADS_DIR, CHUNKS_DIR, EMBEDDINGS_DIR]:
+for d in [UPLOADS_DIR, CHUNKS_DIR, EMBEDDINGS_DIR, CORPUS_INDEX_DIR, BINARY_INDEX_DIR, CORPUS_BM25_DIR]:
     os.makedirs(d, exist_ok=True)
 
 # === Embedding Settings ===
@@ -25,8 +29,92 @@ CHUNK_OVERLAP = 50  # characters overlap to maintain context
 TOP_K = 5  # number of chunks to retrieve during search
 COSINE_SIMILARITY_THRESHOLD = 0.3  # minimum relevance for a match
 
+# === Corpus Index Settings (IVF-PQ, cross-document search) ===
+CORPUS_INDEX_ENABLED = True  # use the compressed corpus index when one has been built
+IVFPQ_NLIST = 1024  # number of inverted lists (coarse centroids)
+IVFPQ_M = 48  # PQ sub-quantizers; EMBEDDING_DIMENSION must be divisible by this
+IVFPQ_NBITS = 8  # bits per sub-quantizer code (256 centroids per sub-space)
+IVFPQ_NPROBE = 16  # inverted lists scanned per query
+IVFPQ_RERANK_K = 100  # PQ candidates re-scored with full-precision vectors
+IVFPQ_TRAIN_SIZE = 100_000  # vectors sampled for k-means training
+IVFPQ_EXACT_MAX = 20_000  # docId-filtered queries over at most this many chunks are searched exactly
+
+# === Multi-document Fan-out Settings ===
+FANOUT_MAX_WORKERS = 8  # threads retrieving documents in parallel
+FANOUT_PER_DOC_K = 10  # dense/BM25 candidates per document before global fusion
+DENSE_RETRIEVAL_TIMEOUT = 5.0  # seconds to wait for dense retrieval before fusing BM25 alone
+SPARSE_RETRIEVAL_TIMEOUT = 2.0  # seconds to wait for BM25 before fusing dense alone
+RETRIEVAL_QUEUE_TIMEOUT = 10.0  # seconds a branch may wait for a free worker; the branch timeouts start once it runs
+
+# === Retrieval Result Cache Settings ===
+RETRIEVAL_CACHE_ENABLED = True  # reuse fused/reranked results for repeated (query, docIds, top_k, config)
+RETRIEVAL_CACHE_TTL = 300.0  # seconds; ingest/delete of a covered docId invalidates earlier
+RETRIEVAL_CACHE_MAX_ITEMS = 1024
+RETRIEVAL_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# === Result Diversity (MMR) Settings ===
+MMR_LAMBDA = 0.7  # final top-k selection: 1.0 = pure relevance, lower = more novelty (per-request override)
+
+# === Adaptive Candidate Pool Settings ===
+ADAPTIVE_POOL_ENABLED = True  # floor / shrink / grow the fused pool and skip needless reranks
+POOL_RELATIVE_FLOOR = 0.3  # before reranking, drop fused candidates below this fraction of the best (keeps top_k)
+POOL_GROW_FACTOR = 2  # re-retrieve this many times more when too few candidates clear COSINE_SIMILARITY_THRESHOLD
+RERANK_SKIP_MARGIN = 0.35  # skip the cross-encoder when the top fused score leads the runner-up by this much
+
+# === Reranker Settings (cross-encoder) ===
+RERANK_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_BACKEND = "torch"  # "torch" (float32) or "onnx" (int8 ONNX Runtime export, needs onnxruntime)
+RERANK_ONNX_DIR = DATA_DIR / "models" / "reranker-int8"  # written by python -m app.scripts.exportOnnxReranker
+RERANK_ONNX_MIN_SPEARMAN = 0.95  # export fails the fidelity check below this mean rank correlation vs. torch
+RERANK_BATCH_SIZE = 32  # pairs per forward pass; pairs are length-sorted so a batch pads to similar lengths
+RERANK_MAX_LENGTH = 256  # tokens per (query, chunk) pair; longer pairs are truncated
+RERANK_TORCH_THREADS = 0  # intra-op threads for the cross-encoder (0 keeps torch's default)
+RERANK_COALESCE_WINDOW = 0.003  # seconds concurrent requests wait to share one forward pass (0 disables)
+RERANK_MAX_COALESCED_PAIRS = 256  # flush a shared batch early once this many pairs are queued
+RERANK_CACHE_ENABLED = True  # reuse cross-encoder scores per (normalized query, chunk id, model)
+RERANK_CACHE_MAX_ITEMS = 200_000  # ~100 bytes per entry
+RERANK_CACHE_TTL = 3600.0  # seconds; re-ingest/delete of a document drops its entries earlier
+RERANK_CASCADE_M = 0  # cross-encoder only scores the cheap stage's top M (0 disables); tune with bench_rerank_cascade first
+RERANK_CASCADE_STAGE = "retrieval"  # "retrieval" (fused score) or a small cross-encoder, e.g. "cross-encoder/ms-marco-TinyBERT-L-2-v2"
+
+# === RAG Pipeline Settings ===
+PIPELINE_PROFILE = "balanced"  # default stage profile: "fast" (no rerank/judge), "balanced" or "accurate"
+RAG_EXECUTOR_WORKERS = 2  # questions answered concurrently (blocking model work runs off the event loop)
+RAG_QUEUE_MAX = 16  # questions waiting for a worker before new ones are rejected with 503
+RAG_QUEUE_TIMEOUT = 60.0  # seconds a question may wait for a worker before it is dropped with 503
+
+# === Sharding Settings ===
+# Comma-separated shard base URLs (e.g. "http://127.0.0.1:9101,http://127.0.0.1:9102").
+# Empty keeps every index in this process.
+SHARD_URLS = [u.strip() for u in os.environ.get("SHARD_URLS", "").split(",") if u.strip()]
+SHARD_RPC_TIMEOUT = 10.0  # seconds per shard call
+
+# === Admin Settings ===
+# /admin/* routes (document listing, purge, compaction) are mounted only when this is set;
+# clients send it in the X-Admin-Token header.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# === Binary Quantization Settings (dense prefilter) ===
+BINARY_INDEX_ENABLED = True  # Hamming prefilter over 1-bit codes before float rescoring
+BINARY_RESCORE_K = 500  # float re-scored candidates; ~0.99 recall@10 in bench_binary_quantization
+
+# === Text Analysis Settings (shared by BM25, keyword boosting, judging, citations) ===
+TEXT_ANALYZER_STOPWORDS = True  # drop English stopwords
+TEXT_ANALYZER_STEMMING = False  # light suffix stripping; existing BM25 indexes keep the settings they were built with
+
+# === Sparse (BM25) Index Settings ===
+BM25_FLUSH_INTERVAL = 30.0  # seconds before appended-but-unflushed chunks are written to disk (0 disables)
+SPARSE_CACHE_MAX_BYTES = 512 * 1024 * 1024  # budget for loaded per-document BM25 indexes
+SPARSE_CACHE_POLICY = "lru"  # "lru" or "lfu"
+BM25_DYNAMIC_PRUNING = True  # MaxScore top-k (exact) instead of scoring every posting
+BM25_KEYWORD_BOOST = 0.1  # added to a chunk's BM25 score per distinct refiner keyword it contains
+
+# === Corpus BM25 Settings (global sparse index with corpus-level IDF) ===
+CORPUS_BM25_ENABLED = True  # use the merged index for documents it covers once built (buildCorpusIndex)
+
 # === LLM Settings (to be integrated later) ===
 LLM_MODEL_NAME = "models/qwen2.5-3b-instruct-q5_k_m.gguf"  # placeholder for local LLM
+LLM_PREFIX_CACHE_ENABLED = True  # keep KV state of static prompt preambles; only the variable suffix is evaluated
 
 # === Miscellaneous ===
 ALLOWED_FILE_TYPES = [".pdf"]
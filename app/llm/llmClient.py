@@ -1,12 +1,23 @@
 # app/llm/llmClient.py
 
 import os
+import threading
+import time
+from typing import Dict, Iterator, Optional
 from llama_cpp import Llama
+from app.config import LLM_PREFIX_CACHE_ENABLED
 from app.utils.logger import getLogger
+from app.utils.metrics import metrics
 
 logger = getLogger(__name__)
 
 
+def _state_bytes(state) -> int:
+    """Size of a llama.cpp saved state (KV cache, logits, RNG)."""
+    size = getattr(state, "llama_state_size", None)
+    return int(size) if size is not None else len(getattr(state, "llama_state", b""))
+
+
 class LLMClient:
     def __init__(self, model_path: str = "app/llm/models/qwen2.5-3b-instruct-q5_k_m.gguf"):
         """
@@ -15,6 +26,12 @@ class LLMClient:
         """
 
         self.model_path = model_path
+        # one llama.cpp context: generations from concurrent requests take turns
+        self.lock = threading.Lock()
+        # static prompt preambles (name -> text) and their evaluated KV state
+        self.prefixes: Dict[str, str] = {}
+        self.prefix_states: Dict[str, object] = {}
+        self.prefix_stats: Dict[str, Dict] = {}
 
         if not os.path.exists(self.model_path):
             raise ValueError(f"Model path does not exist: {self.model_path}")
@@ -39,18 +56,13 @@ class LLMClient:
         Dynamically adjusts max_tokens based on prompt length if not provided.
         """
         try:
-            # Estimate tokens in prompt (roughly 1 token ≈ 4 characters)
-            est_prompt_tokens = len(prompt) // 4
-
-            if max_tokens is None:
-                # Leave buffer to stay within n_ctx=2048
-                max_tokens = max(128, 2048 - est_prompt_tokens - 50)
-
-            output = self.llm(
-                prompt=prompt,
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
+            with self.lock:
+                self._restore_prefix(prompt)
+                output = self.llm(
+                    prompt=prompt,
+                    max_tokens=self._max_tokens(prompt, max_tokens),
+                    temperature=temperature
+                )
 
             if "choices" in output and len(output["choices"]) > 0:
                 return output["choices"][0]["text"].strip()
@@ -59,6 +71,100 @@ class LLMClient:
             logger.error(f"Qwen generation failed: {e}")
             return "Error: Failed to generate answer."
 
+    def register_prefix(self, name: str, text: str):
+        """
+        Declare a static preamble (template text before its first variable).
+        Prompts starting with it resume from its saved KV state, so llama.cpp
+        only evaluates the variable suffix. The state is built on first use.
+        """
+        if not LLM_PREFIX_CACHE_ENABLED or not text:
+            return
+        self.prefixes[name] = text
+        self.prefix_stats.setdefault(name, {"tokens": 0, "evalSeconds": 0.0, "hits": 0, "builds": 0,
+                                            "stateBytes": 0, "restoreSeconds": 0.0, "estimatedSavedSeconds": 0.0})
+
+    def _match_prefix(self, prompt: str) -> Optional[str]:
+        matches = [name for name, text in self.prefixes.items() if prompt.startswith(text)]
+        return max(matches, key=lambda name: len(self.prefixes[name])) if matches else None
+
+    def _restore_prefix(self, prompt: str):
+        """
+        Load the KV state of the registered prefix prompt starts with (caller
+        holds self.lock). llama.cpp keeps the evaluated tokens with the state
+        and skips the longest common token prefix, even if tokenization at the
+        template boundary differs. The first use evaluates and saves the prefix;
+        each later use is credited an estimated saving: that build's measured
+        prompt-eval time minus this call's measured state load time (the
+        per-call eval time it avoided is never observed).
+        """
+        name = self._match_prefix(prompt)
+        if name is None:
+            return
+        stats = self.prefix_stats[name]
+        state = self.prefix_states.get(name)
+        if state is not None:
+            started = time.perf_counter()
+            self.llm.load_state(state)
+            restore = time.perf_counter() - started
+            saved = max(0.0, stats["evalSeconds"] - restore)
+            stats["hits"] += 1
+            stats["restoreSeconds"] += restore
+            stats["estimatedSavedSeconds"] += saved
+            metrics.inc(f"llm.prefix_cache.{name}.hits")
+            metrics.inc(f"llm.prefix_cache.{name}.estimated_saved_seconds", saved)
+            return
+        tokens = self.llm.tokenize(self.prefixes[name].encode("utf-8"))
+        started = time.perf_counter()
+        self.llm.reset()
+        self.llm.eval(tokens)
+        stats["evalSeconds"] = time.perf_counter() - started
+        stats["tokens"] = len(tokens)
+        stats["builds"] += 1
+        self.prefix_states[name] = state = self.llm.save_state()
+        stats["stateBytes"] = _state_bytes(state)
+        metrics.inc(f"llm.prefix_cache.{name}.builds")
+        metrics.set_gauge("llm.prefix_cache.state_bytes", sum(s["stateBytes"] for s in self.prefix_stats.values()))
+        logger.info(f"Prefix state '{name}' cached: {len(tokens)} tokens, {stats['evalSeconds']:.3f}s prompt eval, "
+                    f"{stats['stateBytes']} bytes")
+
+    def prefix_cache_stats(self) -> Dict[str, Dict]:
+        """
+        Per template: prefix tokens, their prompt-eval seconds, reuses, bytes of
+        the saved KV state held in memory, and the estimated prompt-eval seconds
+        saved (see _restore_prefix).
+        """
+        # no self.lock: a long generation must not block /health/metrics
+        return {name: {**stats, **{key: round(stats[key], 4)
+                                   for key in ("evalSeconds", "restoreSeconds", "estimatedSavedSeconds")}}
+                for name, stats in list(self.prefix_stats.items())}
+
+    def _max_tokens(self, prompt: str, max_tokens: int = None) -> int:
+        if max_tokens is not None:
+            return max_tokens
+        # Estimate tokens in prompt (roughly 1 token ≈ 4 characters)
+        est_prompt_tokens = len(prompt) // 4
+        # Leave buffer to stay within n_ctx=2048
+        return max(128, 2048 - est_prompt_tokens - 50)
+
+    def streamAnswer(self, prompt: str, max_tokens: int = None, temperature: float = 0.7) -> Iterator[str]:
+        """
+        Yield answer text pieces as llama.cpp generates them (same token budget
+        as generateAnswer). The model is held until the stream is exhausted or closed.
+        """
+        with self.lock:
+            self._restore_prefix(prompt)
+            stream = self.llm(
+                prompt=prompt,
+                max_tokens=self._max_tokens(prompt, max_tokens),
+                temperature=temperature,
+                stream=True
+            )
+            for chunk in stream:
+                choices = chunk.get("choices") or []
+                text = choices[0].get("text", "") if choices else ""
+                if text:
+                    yield text
+
 
 # Singleton instance for reuse
 llmClient = LLMClient()
@@ -8,25 +8,7 @@ COMPLEX_QUERY_KEYWORDS = [
     "table", "plot", "visualize", "merge", "calculate"
 ]
 
-def needs_decomposition(query: str) -> bool:
-    """Return True if query is complex enough to require decomposition."""
-    q = query.lower()
-    if any(k in q for k in COMPLEX_QUERY_KEYWORDS):
-        return True
-    if len(q.split()) > 8:  # optional length heuristic
-        return True
-    return False
-
-def decompose(query: str, temperature: float = 0.3) -> list[str]:
-    """
-    Decompose a complex query into multiple sub-queries using LLM.
-    
-    Returns a list of sub-queries (or [query] if no decomposition is needed).
-    """
-    if not needs_decomposition(query):
-        return [query]
-
-    prompt = f"""
+DECOMPOSITION_PROMPT = """
 You are a query decomposition assistant.
 
 Take the following complex question and break it down into multiple smaller,
@@ -46,6 +28,27 @@ Output: [
 Question:
 "{query}"
 """
+llmClient.register_prefix("decomposition", DECOMPOSITION_PROMPT.split("{query}")[0])
+
+def needs_decomposition(query: str) -> bool:
+    """Return True if query is complex enough to require decomposition."""
+    q = query.lower()
+    if any(k in q for k in COMPLEX_QUERY_KEYWORDS):
+        return True
+    if len(q.split()) > 8:  # optional length heuristic
+        return True
+    return False
+
+def decompose(query: str, temperature: float = 0.3) -> list[str]:
+    """
+    Decompose a complex query into multiple sub-queries using LLM.
+    
+    Returns a list of sub-queries (or [query] if no decomposition is needed).
+    """
+    if not needs_decomposition(query):
+        return [query]
+
+    prompt = DECOMPOSITION_PROMPT.replace("{query}", query)
     response = llmClient.generateAnswer(prompt, temperature=temperature)
 
     # Ensure valid JSON output
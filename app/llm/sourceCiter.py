@@ -4,10 +4,30 @@ import json
 import re
 from typing import List, Dict
 from app.llm.llmClient import llmClient
+from app.retrieval.candidate import Candidate
+from app.utils.textAnalyzer import analyzer
 from app.utils.logger import getLogger
 
 logger = getLogger(__name__)
 
+# static instructions first so their evaluated state is reused (LLMClient.register_prefix)
+CITATION_PROMPT_HEADER = """
+Task:
+- Identify which chunks support each part of the answer.
+- Provide citations as a list of chunk IDs and page numbers.
+- Respond ONLY in JSON with keys "citations" (list of objects with "chunk_id" and "page") and "reason".
+
+Example:
+{
+    "citations": [
+        {"chunk_id": "2", "page": 5},
+        {"chunk_id": "4", "page": 6}
+    ],
+    "reason": "The answer is based mainly on chunk 2 (page 5) and chunk 4 (page 6)."
+}
+"""
+llmClient.register_prefix("citation", CITATION_PROMPT_HEADER)
+
 class SourceCiter:
     def __init__(self):
         self.llm = llmClient
@@ -25,40 +45,30 @@ class SourceCiter:
                     return None
         return None
 
-    def cite_sources(self, query: str, answer: str, context_chunks: List[Dict]) -> str:
+    def cite_sources(self, query: str, answer: str, context_chunks: List[Candidate]) -> str:
         """
         Annotates answer with citations if requested by user query.
-        Assumes all chunks are normalized dicts with 'chunk' and 'page'.
+        context_chunks: Candidates (other shapes are coerced).
         """
         if "cite" not in query.lower() and "source" not in query.lower():
             return answer
 
+        context_chunks = [Candidate.coerce(c) for c in context_chunks]
+
         # Build context text safely
         context_text = "\n\n".join(
-            [f"[Chunk {c['chunk'].get('id', i)}] (Page {c.get('page', '?')}) {c['chunk']['text']}"
+            [f"[Chunk {c.id or i}] (Page {c.page if c.page is not None else '?'}) {c.text}"
              for i, c in enumerate(context_chunks, start=1)]
         )
 
-        prompt = f"""
+        prompt = CITATION_PROMPT_HEADER + f"""
 The user asked: "{query}"
 The assistant answered: "{answer}"
 
 Here are the available source chunks with IDs and page numbers:
 {context_text}
 
-Task:
-- Identify which chunks support each part of the answer.
-- Provide citations as a list of chunk IDs and page numbers.
-- Respond ONLY in JSON with keys "citations" (list of objects with "chunk_id" and "page") and "reason".
-
-Example:
-{{
-    "citations": [
-        {{"chunk_id": "2", "page": 5}},
-        {{"chunk_id": "4", "page": 6}}
-    ],
-    "reason": "The answer is based mainly on chunk 2 (page 5) and chunk 4 (page 6)."
-}}
+Citations JSON:
 """
 
         try:
@@ -78,12 +88,12 @@ Example:
 
         # Fallback heuristic: simple string overlap
         overlap_chunks = []
+        query_terms = analyzer.term_set(query)
         for i, c in enumerate(context_chunks, start=1):
-            text = c['chunk']['text']
-            if any(word in text.lower() for word in query.lower().split()):
+            if query_terms & analyzer.term_set(c.text):
                 overlap_chunks.append({
-                    "chunk_id": c['chunk'].get("id", i),
-                    "page": c.get("page", "?")
+                    "chunk_id": c.id or i,
+                    "page": c.page if c.page is not None else "?"
                 })
 
         if overlap_chunks:
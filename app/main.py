@@ -1,6 +1,7 @@
 from fastapi import FastAPI
-from app.routes import healthRoutes, pdfRoutes, queryRoutes, documentRoutes,ragRoutes
+from app.routes import healthRoutes, pdfRoutes, queryRoutes, documentRoutes,ragRoutes, adminRoutes
 from fastapi.middleware.cors import CORSMiddleware
+from app.config import ADMIN_TOKEN
 
 app = FastAPI(title="Blended RAG Chatbot")
 
@@ -17,6 +18,8 @@ app.include_router(pdfRoutes.router, prefix="/processPdf", tags=["PDF Processing
 app.include_router(queryRoutes.router,prefix="/queryPdf", tags=['PDF Query'])
 app.include_router(documentRoutes.router,prefix="/DocRoute", tags=['Doc route'])
 app.include_router(ragRoutes.router, prefix="/rag", tags=["RAG Queries"])
+if ADMIN_TOKEN:  # destructive endpoints stay unmounted unless an admin token is configured
+    app.include_router(adminRoutes.router, tags=["Admin"])
 @app.get("/")
 def root():
     return {"message" : "Document AI Engine is running"}
\ No newline at end of file
@@ -0,0 +1,90 @@
+# app/pdfParser/indexWriter.py
+from typing import List, Dict
+import numpy as np
+from app.utils.logger import getLogger
+
+logger = getLogger(__name__)
+
+
+class DocumentIndexWriter:
+    """
+    Writes one document's chunks to the retrieval indexes while it is ingested.
+
+    In-process mode: every page goes to Chroma, the BM25 builder and the binary
+    prefilter buffer as soon as it is chunked; commit() flushes BM25 and the
+    binary codes once for the document.
+    Sharded mode (coordinator set): the API node keeps no index of its own.
+    Pages are buffered for this document only and commit() sends them to the
+    owning shard in one call.
+    discard() undoes a failed ingest so no index outlives it.
+    """
+
+    def __init__(self, doc_id: str, chroma, sparse, binary, coordinator=None):
+        self.doc_id = doc_id
+        self.chroma = chroma
+        self.sparse = sparse
+        self.binary = binary
+        self.coordinator = coordinator
+        self.pending: Dict[str, List] = {"ids": [], "texts": [], "embeddings": [], "pages": []}
+        self.sent = False
+
+    def add_page(self, page_number: int, chunks: List[Dict], embeddings: np.ndarray):
+        chunk_texts = [c["text"] for c in chunks]
+        chunk_ids = [c["id"] for c in chunks]
+        if self.coordinator is not None:
+            self.pending["ids"].extend(chunk_ids)
+            self.pending["texts"].extend(chunk_texts)
+            self.pending["embeddings"].extend(embeddings)
+            self.pending["pages"].extend([page_number] * len(chunks))
+            return
+
+        # BM25 indexing (appended in memory, flushed once per document)
+        self.sparse.appendChunks(self.doc_id, chunk_texts, chunk_ids)
+
+        # 1-bit codes for the dense Hamming prefilter (flushed once per document)
+        self.binary.add(self.doc_id, chunk_ids, embeddings)
+
+        # Chroma storage with extended metadata
+        for i, chunk in enumerate(chunks):
+            self.chroma.add_chunk(
+                chunk_id=chunk["id"],
+                embedding=embeddings[i].tolist(),
+                text=chunk["text"],
+                doc_id=self.doc_id,
+                page=page_number,
+                type_="text"
+            )
+
+    def commit(self):
+        if self.coordinator is None:
+            self.sparse.flush(self.doc_id)
+            self.binary.save(self.doc_id)
+            return
+        pending, self.pending = self.pending, {"ids": [], "texts": [], "embeddings": [], "pages": []}
+        if pending["ids"]:
+            self.sent = True
+            self.coordinator.index_document(
+                self.doc_id,
+                chunk_ids=pending["ids"],
+                texts=pending["texts"],
+                embeddings=pending["embeddings"],
+                pages=pending["pages"]
+            )
+            logger.info(f"Sent {len(pending['ids'])} chunks of {self.doc_id} to shard {self.coordinator.shard_for(self.doc_id)}")
+
+    def discard(self):
+        """Drop everything written (or buffered) for the document so far."""
+        if self.coordinator is not None:
+            self.pending = {"ids": [], "texts": [], "embeddings": [], "pages": []}
+            if self.sent:
+                try:
+                    self.coordinator.delete_document(self.doc_id)
+                except Exception as e:
+                    logger.warning(f"Shard cleanup failed for {self.doc_id}: {e}")
+            return
+        self.sparse.discard(self.doc_id)
+        self.binary.delete(self.doc_id)  # buffered page vectors too, not only saved codes
+        try:
+            self.chroma.delete_document(self.doc_id)
+        except Exception as e:
+            logger.warning(f"Chroma cleanup failed for {self.doc_id}: {e}")
@@ -9,6 +9,10 @@ from app.storage.documentStore import documentStore
 from app.utils.logger import getLogger
 from app.retrieval.sparseRetriever import sparseRetriever
 from app.chromaClient import chromaClient
+from app.retrieval.binaryIndex import binaryIndex
+from app.retrieval.blendedRetriever import blendedRetriever
+from app.sharding.coordinator import shardCoordinator
+from app.pdfParser.indexWriter import DocumentIndexWriter
 
 uploadDir = "data/uploads"
 logger = getLogger(__name__)
@@ -19,6 +23,7 @@ CHUNK_OVERLAP = 100
 
 async def processPdf(file: UploadFile):
     os.makedirs(uploadDir, exist_ok=True)
+    writer = None
     try:
         docId = str(uuid.uuid4())
         filePath = os.path.join(uploadDir, f"{docId}_{file.filename}")
@@ -34,6 +39,9 @@ async def processPdf(file: UploadFile):
         logger.info(f"Extracted structured PDF layout with {len(pdf_json['pages'])} pages")
 
         all_chunks = []
+        # in-process indexes, or the owning shard when retrieval is partitioned
+        writer = DocumentIndexWriter(docId, chroma=chromaClient, sparse=sparseRetriever,
+                                     binary=binaryIndex, coordinator=shardCoordinator)
 
         for page in pdf_json["pages"]:
             page_text = " ".join([e["content"] for e in page["elements"] if e["type"] == "textbox"])
@@ -46,26 +54,11 @@ async def processPdf(file: UploadFile):
                 page_number=page["page_number"]
             )
 
-            chunk_texts = [c["text"] for c in page_chunks]
-            chunk_ids = [c["id"] for c in page_chunks]
-            embeddings = embeddingClient.generateEmbeddings(chunk_texts)
-
-            # BM25 indexing
-            sparseRetriever.indexDocument(docId, chunk_texts, chunk_ids)
-
-            # Chroma storage with extended metadata
-            for i, chunk in enumerate(page_chunks):
-                chromaClient.add_chunk(
-                    chunk_id=chunk["id"],
-                    embedding=embeddings[i].tolist(),
-                    text=chunk["text"],
-                    doc_id=docId,
-                    page=page["page_number"],
-                    type_="text"
-                )
-
+            embeddings = embeddingClient.generateEmbeddings([c["text"] for c in page_chunks])
+            writer.add_page(page["page_number"], page_chunks, embeddings)
             all_chunks.extend(page_chunks)
 
+        writer.commit()
         logger.info(f"Processed {len(all_chunks)} text chunks for docId={docId}")
 
         documentStore.saveDocument(docId, {
@@ -73,6 +66,8 @@ async def processPdf(file: UploadFile):
             "pageCount": len(pdf_json["pages"]),
             "chunks": all_chunks
         })
+        # all-document queries cached before this upload no longer cover the corpus
+        blendedRetriever.invalidate_document(docId)
 
         return {
             "docId": docId,
@@ -83,6 +78,9 @@ async def processPdf(file: UploadFile):
 
     except Exception as e:
         logger.error(f"Ingestion failed for {file.filename}: {e}")
+        if writer is not None:
+            # no partial index may outlive a document that was never saved
+            writer.discard()
         raise
 
 
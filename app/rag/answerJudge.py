@@ -4,6 +4,8 @@ import json
 import re
 from app.llm.llmClient import llmClient  # Qwen2.5-3B
 from app.llm.mistralClient import mistralClient  # Mistral for judging
+from app.retrieval.candidate import Candidate
+from app.utils.textAnalyzer import analyzer
 from app.utils.logger import getLogger
 
 logger = getLogger(__name__)
@@ -23,21 +25,20 @@ class AnswerJudge:
             logger.debug(f"AnswerJudge JSON parse failed: {e}")
             return None
 
-    def score_answer(self, query: str, answer: str, context_chunks: List[Dict], max_tokens: int = 200) -> Dict:
+    def score_answer(self, query: str, answer: str, context_chunks: List[Candidate], max_tokens: int = 200) -> Dict:
         """
         Returns {"score": float(0-1), "method": str, "reason": str}
         """
         if not answer:
             return {"score": 0.0, "method": "none", "reason": "No answer provided"}
+        context_chunks = [Candidate.coerce(c) for c in context_chunks]
 
         # --- Heuristic: fraction of chunks mentioning query tokens ---
         try:
-            query_tokens = set(query.lower().split())
+            query_tokens = analyzer.term_set(query)
             overlap_count = 0
             for c in context_chunks:
-                text = c.get("chunk", {}).get("text") if isinstance(c.get("chunk"), dict) else str(c.get("chunk", ""))
-                text_tokens = set(text.lower().split())
-                if query_tokens & text_tokens:
+                if query_tokens & analyzer.term_set(c.text or ""):
                     overlap_count += 1
             heuristic_score = overlap_count / max(1, len(context_chunks))
         except Exception as e:
@@ -56,7 +57,7 @@ Answer only "Y" if fully supported, else "N".
 Question: "{query}"
 Answer: "{answer}"
 Context chunks (text only, short snippets):
-{chr(10).join([c.get('chunk', {}).get('text', '')[:200] if isinstance(c.get('chunk'), dict) else str(c.get('chunk',''))[:200] for c in context_chunks])}
+{chr(10).join([(c.text or '')[:200] for c in context_chunks])}
 """
             llm_out = self.llm_judge.generateAnswer(prompt, max_tokens=64, temperature=0.0)
             llm_out_clean = llm_out.strip().upper()
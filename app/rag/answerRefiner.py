@@ -2,29 +2,14 @@
 
 import re
 from app.rag.postProcessor import post_process_answer
+from app.retrieval.candidate import Candidate
 
 def normalize_chunks(context_chunks: list) -> list:
     """
-    Ensure every chunk is a dict with 'chunk' containing a dict with 'text' and 'meta',
-    and a top-level 'page' field.
+    Ensure every chunk is a Candidate (id, text, page, scores), whatever shape
+    it arrived in (Candidate, {"chunk", "score"} dict, {"text"} dict or string).
     """
-    normalized = []
-    for i, c in enumerate(context_chunks, start=1):
-        if isinstance(c, dict):
-            chunk_obj = c.get("chunk")
-            score = c.get("score", 0.0)
-            if isinstance(chunk_obj, dict):
-                meta = chunk_obj.get("meta", {})
-                page = meta.get("page") or meta.get("page_num") or meta.get("pageNumber")
-            else:
-                chunk_obj = {"text": str(chunk_obj or ""), "meta": {}}
-                page = None
-        else:
-            chunk_obj = {"text": str(c), "meta": {}}
-            score = 0.0
-            page = None
-        normalized.append({"chunk": chunk_obj, "score": score, "page": page})
-    return normalized
+    return [Candidate.coerce(c) for c in context_chunks]
 
 
 def refine_final_answer(raw_answer: str, query: str, context_chunks: list) -> str:
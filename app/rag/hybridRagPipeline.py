@@ -1,150 +1,353 @@
 # app/rag/hybridRagPipeline.py
-from typing import List, Dict, Any
+import time
+from dataclasses import dataclass, field, replace
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from app.config import PIPELINE_PROFILE
 from app.utils.logger import getLogger
+from app.utils.metrics import metrics
 from app.retrieval.queryRefiner import refine_query_intelligent
 from app.retrieval.blendedRetriever import blendedRetriever
-from app.retrieval.reranker import reranker
 from app.llm.llmClient import llmClient
 from app.rag.postProcessor import post_process_answer
 from app.rag.answerJudge import answerJudge
 from app.storage.documentStore import documentStore
-from app.rag.answerRefiner import refine_final_answer, normalize_chunks
+from app.rag.answerRefiner import refine_final_answer
 from app.llm import sourceCiter
+from app.retrieval.candidate import Candidate
+from app.rag.pipelineGraph import PROFILES, PipelineProfile, PipelineState, Stage, StageError, StageGraph
 
 logger = getLogger(__name__)
 
-# Optional iterative retriever
-try:
-    from app.retrieval.iterativeRetriever import IterativeRetriever
-    iterative_available = True
-    iterative_retriever = IterativeRetriever(retriever=blendedRetriever)
-except Exception:
-    iterative_available = False
-    iterative_retriever = None
+ANSWER_PROMPT_HEADER = (
+    "Answer the question using ONLY the provided context. If not present, say you don't know.\n\n"
+    "Context:\n"
+)
+llmClient.register_prefix("answer", ANSWER_PROMPT_HEADER)
 
-
-def _build_prompt(query: str, context_chunks: List[Dict], max_context_tokens: int = 800) -> str:
+def _build_prompt(query: str, context_chunks: List[Candidate], max_context_tokens: int = 800) -> str:
     """
-    Builds a prompt using normalized chunks only.
-    Assumes each chunk has 'chunk' dict with 'text' and a top-level 'page'.
+    Builds a prompt using normalized chunks (Candidates) only.
     """
     accumulated = 0
     parts = []
     for i, c in enumerate(context_chunks, start=1):
-        snippet = c["chunk"]["text"][:2000]
+        snippet = c.text[:2000]
         est_tokens = len(snippet) // 4
         if accumulated + est_tokens > max_context_tokens:
             break
-        page = c.get("page", "?")
+        page = c.page if c.page is not None else "?"
         parts.append(f"[{i}] (page={page})\n{snippet}")
         accumulated += est_tokens
 
     context_block = "\n\n".join(parts)
     prompt = (
-        "Answer the question using ONLY the provided context. If not present, say you don't know.\n\n"
-        f"Context:\n{context_block}\n\n"
+        ANSWER_PROMPT_HEADER
+        + f"{context_block}\n\n"
         f"Question: {query}\n\nAnswer:"
     )
     return prompt
 
 
-def run_pipeline(
-    doc_id: str,
-    user_query: str,
-    top_k: int = 5,
-    rerank: bool = True,
-    judge_threshold: float = 0.7,
-    iterative: bool = True,
-    debug: bool = False
-) -> Dict[str, Any]:
-    result: Dict[str, Any] = {"docId": doc_id, "originalQuery": user_query, "finalAnswer": None}
-    doc_meta = documentStore.getDocument(doc_id)
-    if not doc_meta:
-        return {"error": "Document not found", "docId": doc_id}
+# ---------------- Stages ----------------
+# Typed stage outputs. Retrieval, fusion and cross-encoder reranking all happen
+# inside BlendedRetriever, so fuse and rerank are marker stages in the graph:
+# the retrieve output covers them (rerank may instead be skipped by the profile).
+
+@dataclass
+class Refined:
+    query: str
+    keywords: Optional[List[str]] = None
+
+
+@dataclass
+class Retrieved:
+    candidates: List[Candidate]
+    covers: Tuple[str, ...] = ()
+
+
+@dataclass
+class Answer:
+    context: List[Candidate]
+    prompt: str
+    text: str
+
+
+@dataclass
+class Verdict:
+    judge: Dict[str, Any]
+    answer: str
+    attempts: int = 0
+    retries: List[Dict[str, Any]] = field(default_factory=list)  # {"answer", "judge"} per regeneration
+
+
+@dataclass
+class Cited:
+    answer: str
+    citations: List[Dict[str, Any]]
+
 
-    # Step 1: Query refinement
+def _ranked(state: PipelineState) -> List[Candidate]:
+    """The fused (and reranked, unless the profile skips it) pool from the retrieve stage."""
+    out = state.get("retrieve")
+    return out.candidates if out is not None else []
+
+
+def _refine_stage(state: PipelineState) -> Refined:
     try:
-        rq = refine_query_intelligent(user_query)
-        refined = rq.get("refinedQuery") or rq.get("variants", [user_query])[0] or user_query
+        rq = refine_query_intelligent(state.query)
+        refined = rq.get("refinedQuery") or rq.get("variants", [state.query])[0] or state.query
+        return Refined(refined, rq.get("keywords") or None)
     except Exception as e:
         logger.warning(f"Query refinement failed: {e}")
-        refined = user_query
-    result["refinedQuery"] = refined
+        return Refined(state.query)
 
-    # Step 2: Retrieve
-    retrieve_k = max(top_k * 3, 10)
-    retrieved = blendedRetriever.query(doc_id, refined, top_k=retrieve_k)
-    if iterative and iterative_available:
-        try:
-            iterative_docs = iterative_retriever.retrieve(refined, doc_id, collection_name=None, top_k=retrieve_k)
-            if iterative_docs:
-                retrieved = iterative_docs
-        except Exception as e:
-            logger.debug(f"Iterative retrieval failed/ignored: {e}")
 
-    # Step 3: Rerank
-    try:
-        reranked = reranker.rerank(refined, retrieved, top_k=top_k) if rerank and retrieved else retrieved[:top_k]
-    except Exception as e:
-        logger.exception(f"Reranker failed, falling back: {e}")
-        reranked = retrieved[:top_k]
-
-    # Step 4: Normalize chunks
-    context_chunks: List[Dict] = normalize_chunks(reranked)
-    result["chunksUsed"] = [
-        {"id": c['chunk'].get('id'), "page": c.get("page"), "score": c.get("score")}
-        for c in context_chunks
-    ]
+def _retrieve_stage(state: PipelineState) -> Retrieved:
+    """
+    One BlendedRetriever call returns the fused, reranked and MMR-ordered pool.
+    Greedy MMR is prefix-consistent, so the first top_k of the pool are the
+    top_k selection; the pool size only sets how much the reranker sees.
+    """
+    refined, p, profile = state.get("refine"), state.params, state.profile
+    pool_k = profile.pool_size(state.top_k)
+    rerank = profile.enabled("rerank")
+    mmr_lambda = p.get("mmr_lambda") if p.get("mmr_lambda") is not None else profile.mmr_lambda
+    if p.get("cross_doc"):
+        retrieved = blendedRetriever.query_corpus(refined.query, doc_ids=p.get("doc_ids"), top_k=pool_k, rerank=rerank,
+                                                  per_doc_k=p.get("per_doc_k"), keywords=refined.keywords,
+                                                  mmr_lambda=mmr_lambda)
+    else:
+        retrieved = blendedRetriever.query(p["doc_id"], refined.query, top_k=pool_k, rerank=rerank,
+                                           keywords=refined.keywords, mmr_lambda=mmr_lambda)
+    return Retrieved(retrieved, ("fuse", "rerank") if rerank else ("fuse",))
 
-    # Step 5: Build prompt and generate answer
-    prompt = _build_prompt(user_query, context_chunks, max_context_tokens=1200)
+
+def _generate_stage(state: PipelineState) -> Answer:
+    context_chunks = _ranked(state)[:state.top_k]
+    prompt = _build_prompt(state.query, context_chunks, max_context_tokens=1200)
     try:
-        raw_answer = llmClient.generateAnswer(prompt, max_tokens=512, temperature=0.7)
+        text = llmClient.generateAnswer(prompt, max_tokens=512, temperature=0.7)
     except Exception as e:
         logger.exception(f"LLM generation failed: {e}")
-        return {"error": "LLM generation failed", "details": str(e)}
-    result["rawAnswer"] = raw_answer
-
-    # Step 6: Judge answer
-    judge = answerJudge.score_answer(user_query, raw_answer, context_chunks)
-    result["judge"] = judge
-
-    # Step 7: Refinement loop
-    attempts = 0
-    max_attempts = 2
-    while judge.get("score", 0) < judge_threshold and attempts < max_attempts:
-        attempts += 1
-        logger.info(f"Low judge score ({judge['score']}). Attempting refinement #{attempts}")
+        raise StageError("generate", "LLM generation failed", str(e))
+    return Answer(context_chunks, prompt, text)
+
+
+def _judge_stage(state: PipelineState) -> Verdict:
+    """Score the answer; regenerate up to profile.judge_attempts times while below judge_threshold."""
+    answer, threshold = state.get("generate"), state.params.get("judge_threshold", 0.7)
+    judge = answerJudge.score_answer(state.query, answer.text, answer.context)
+    verdict = Verdict(judge, answer.text)
+    while verdict.judge.get("score", 0) < threshold and verdict.attempts < state.profile.judge_attempts:
+        verdict.attempts += 1
+        logger.info(f"Low judge score ({verdict.judge['score']}). Attempting refinement #{verdict.attempts}")
         refine_prompt = (
-            prompt
+            answer.prompt
             + "\n\nThe previous answer was low confidence. "
               "Please re-check the context and produce a concise answer focusing only on facts present in the context."
         )
         try:
-            raw_answer = llmClient.generateAnswer(refine_prompt, max_tokens=512, temperature=0.7)
-            result[f"rawAnswer_attempt_{attempts}"] = raw_answer
-            judge = answerJudge.score_answer(user_query, raw_answer, context_chunks)
-            result.setdefault("judge_attempts", []).append(judge)
-            if judge.get("score", 0) >= judge_threshold:
-                break
+            text = llmClient.generateAnswer(refine_prompt, max_tokens=512, temperature=0.7)
+            judge = answerJudge.score_answer(state.query, text, answer.context)
+            verdict.retries.append({"answer": text, "judge": judge})
+            verdict.answer, verdict.judge = text, judge
         except Exception as e:
             logger.debug(f"Refinement attempt failed: {e}")
             break
+    return verdict
+
 
-    # Step 8: Post-process and attach citations
-    final_answer = refine_final_answer(raw_answer, user_query, context_chunks)
-    final_answer = sourceCiter.sourceCiter.cite_sources(user_query, final_answer, context_chunks)
-    result["finalAnswer"] = final_answer
-    result["attempts"] = attempts
+def _cite_stage(state: PipelineState) -> Cited:
+    answer = state.get("generate")
+    verdict = state.get("judge")
+    raw_answer = verdict.answer if verdict is not None else answer.text
+    final_answer = refine_final_answer(raw_answer, state.query, answer.context)
+    final_answer = sourceCiter.sourceCiter.cite_sources(state.query, final_answer, answer.context)
+    return Cited(final_answer, _citations(answer.context))
 
-    citations = [
-        {"rank": i, "chunk_id": c["chunk"].get("id"), "page": c.get("page")}
+
+def _citations(context_chunks: List[Candidate]) -> List[Dict[str, Any]]:
+    return [
+        {"rank": i, "chunk_id": c.id, "page": c.page}
         for i, c in enumerate(context_chunks, start=1)
     ]
-    result["citations"] = citations
+
+
+PIPELINE = StageGraph([
+    Stage("refine", _refine_stage),
+    Stage("retrieve", _retrieve_stage, after=("refine",)),
+    Stage("fuse", after=("retrieve",)),
+    Stage("rerank", after=("fuse",), optional=True),
+    Stage("generate", _generate_stage, after=("rerank",)),
+    Stage("judge", _judge_stage, after=("generate",), optional=True),
+    Stage("cite", _cite_stage, after=("judge",)),
+])
+
+
+def resolve_profile(name: Optional[str] = None, rerank: bool = True) -> PipelineProfile:
+    """Named profile (PIPELINE_PROFILE by default); rerank=False also switches the rerank stage off."""
+    name = name or PIPELINE_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown pipeline profile: {name} (expected one of {sorted(PROFILES)})")
+    profile = PROFILES[name]
+    return profile if rerank else replace(profile, skip=profile.skip | {"rerank"})
+
+
+def _start(
+    doc_id: Optional[str],
+    user_query: str,
+    top_k: int,
+    rerank: bool,
+    judge_threshold: float,
+    doc_ids: Optional[List[str]],
+    all_documents: bool,
+    per_doc_k: Optional[int],
+    mmr_lambda: Optional[float],
+    profile: Optional[str],
+) -> Tuple[Dict[str, Any], Optional[PipelineState]]:
+    """(response header, pipeline state); state is None and the header is an error payload if no document matched."""
+    pipeline_profile = resolve_profile(profile, rerank)
+    cross_doc = all_documents or doc_ids is not None
+    if cross_doc:
+        missing = [] if all_documents else [d for d in doc_ids if not documentStore.getDocument(d)]
+        doc_ids = None if all_documents else [d for d in doc_ids if d not in missing]
+        if doc_ids == []:
+            return {"error": "Document not found", "docIds": missing}, None
+        result: Dict[str, Any] = {"docIds": doc_ids, "originalQuery": user_query, "finalAnswer": None}
+        if missing:
+            result["missingDocIds"] = missing
+    else:
+        result = {"docId": doc_id, "originalQuery": user_query, "finalAnswer": None}
+        doc_meta = documentStore.getDocument(doc_id)
+        if not doc_meta:
+            return {"error": "Document not found", "docId": doc_id}, None
+    result["profile"] = pipeline_profile.name
+
+    state = PipelineState(user_query, top_k, pipeline_profile, params={
+        "doc_id": doc_id, "doc_ids": doc_ids, "cross_doc": cross_doc, "per_doc_k": per_doc_k,
+        "mmr_lambda": mmr_lambda, "judge_threshold": judge_threshold,
+    })
+    return result, state
+
+
+def run_pipeline(
+    doc_id: Optional[str],
+    user_query: str,
+    top_k: int = 5,
+    rerank: bool = True,
+    judge_threshold: float = 0.7,
+    debug: bool = False,
+    doc_ids: Optional[List[str]] = None,
+    all_documents: bool = False,
+    per_doc_k: Optional[int] = None,
+    mmr_lambda: Optional[float] = None,
+    profile: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Single-document mode by default. Pass doc_ids (or all_documents=True) for
+    cross-document mode: the query is refined and embedded once, retrieved across
+    the documents in parallel, fused globally and answered once.
+    mmr_lambda overrides MMR_LAMBDA (result diversity) for this request.
+    profile selects the stages and pool size ("fast", "balanced", "accurate").
+    """
+    result, state = _start(doc_id, user_query, top_k, rerank, judge_threshold,
+                           doc_ids, all_documents, per_doc_k, mmr_lambda, profile)
+    if state is None:
+        return result
+    try:
+        PIPELINE.run(state)
+    except StageError as e:
+        return {"error": e.message, "details": e.details}
+
+    answer, verdict, cited = state.get("generate"), state.get("judge"), state.get("cite")
+    context_chunks = answer.context
+    result["refinedQuery"] = state.get("refine").query
+    result["chunksUsed"] = [{"id": c.id, "page": c.page, "score": c.score} for c in context_chunks]
+    result["rawAnswer"] = answer.text
+    result["judge"] = verdict.judge if verdict is not None else None
+    if verdict is not None:
+        for i, retry in enumerate(verdict.retries, start=1):
+            result[f"rawAnswer_attempt_{i}"] = retry["answer"]
+        if verdict.retries:
+            result["judge_attempts"] = [r["judge"] for r in verdict.retries]
+    result["finalAnswer"] = cited.answer
+    result["attempts"] = verdict.attempts if verdict is not None else 0
+    result["citations"] = cited.citations
 
     if debug:
-        result["context_chunks_debug"] = context_chunks
+        result["context_chunks_debug"] = [c.to_dict() for c in context_chunks]
+        result["stages"] = state.trace
 
     return result
 
+
+def stream_pipeline(
+    doc_id: Optional[str],
+    user_query: str,
+    top_k: int = 5,
+    rerank: bool = True,
+    judge_threshold: float = 0.7,
+    doc_ids: Optional[List[str]] = None,
+    all_documents: bool = False,
+    per_doc_k: Optional[int] = None,
+    mmr_lambda: Optional[float] = None,
+    profile: Optional[str] = None
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming variant of run_pipeline yielding (event, data):
+      "retrieval" - refined query, chunks and citations, before generation starts
+      "token"     - answer text pieces as llama.cpp produces them
+      "answer"    - the post-processed final answer (with LLM citations if asked for)
+      "judge"     - judge scores, last, so they never delay the answer
+      "done"      - timings (ttftSeconds: request start to first token)
+    or a single "error". Streamed text cannot be taken back, so low judge
+    scores are reported but never trigger regeneration here.
+    """
+    started = time.perf_counter()
+    result, state = _start(doc_id, user_query, top_k, rerank, judge_threshold,
+                           doc_ids, all_documents, per_doc_k, mmr_lambda, profile)
+    if state is None:
+        yield "error", result
+        return
+    state.profile = replace(state.profile, judge_attempts=0)
+
+    PIPELINE.run(state, until="generate")
+    context_chunks = _ranked(state)[:top_k]
+    yield "retrieval", {
+        **result,
+        "refinedQuery": state.get("refine").query,
+        "chunksUsed": [{"id": c.id, "page": c.page, "score": c.score} for c in context_chunks],
+        "citations": _citations(context_chunks),
+    }
+
+    prompt = _build_prompt(user_query, context_chunks, max_context_tokens=1200)
+    generation_started = time.perf_counter()
+    ttft, parts = None, []
+    try:
+        for piece in llmClient.streamAnswer(prompt, max_tokens=512, temperature=0.7):
+            if ttft is None:
+                ttft = time.perf_counter() - started
+                metrics.observe("rag.stream.ttft_seconds", ttft)
+            parts.append(piece)
+            yield "token", {"text": piece}
+    except Exception as e:
+        logger.exception(f"LLM streaming failed: {e}")
+        yield "error", {"error": "LLM generation failed", "details": str(e)}
+        return
+    PIPELINE.complete(state, "generate", Answer(context_chunks, prompt, "".join(parts).strip()),
+                      seconds=time.perf_counter() - generation_started)
+
+    # judging cannot regenerate here, so cite the raw answer and send it before the judge runs
+    PIPELINE.run(state, until="judge")
+    cite_started = time.perf_counter()
+    cited = _cite_stage(state)
+    PIPELINE.complete(state, "cite", cited, seconds=time.perf_counter() - cite_started)
+    yield "answer", {"finalAnswer": cited.answer, "rawAnswer": state.get("generate").text}
+
+    PIPELINE.run(state)
+    verdict = state.get("judge")
+    yield "judge", {"judge": verdict.judge if verdict is not None else None}
+    total = time.perf_counter() - started
+    metrics.observe("rag.stream.total_seconds", total)
+    yield "done", {"ttftSeconds": round(ttft, 4) if ttft is not None else None, "totalSeconds": round(total, 4),
+                   "stages": state.trace}
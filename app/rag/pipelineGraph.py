@@ -0,0 +1,157 @@
+# app/rag/pipelineGraph.py
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+from app.utils.metrics import metrics
+from app.utils.logger import getLogger
+
+logger = getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PipelineProfile:
+    """
+    Per-request pipeline configuration.
+
+    skip: optional stages switched off for this profile
+    pool_factor / min_pool: candidates retrieved (and reranked) per answer chunk
+    judge_attempts: regeneration attempts while the judge score is below threshold
+    mmr_lambda: default result diversity (the request may still override it)
+    """
+    name: str
+    skip: FrozenSet[str] = frozenset()
+    pool_factor: int = 3
+    min_pool: int = 10
+    judge_attempts: int = 2
+    mmr_lambda: Optional[float] = None
+
+    def enabled(self, stage: str) -> bool:
+        return stage not in self.skip
+
+    def pool_size(self, top_k: int) -> int:
+        return max(top_k * self.pool_factor, self.min_pool)
+
+
+PROFILES: Dict[str, PipelineProfile] = {
+    # no cross-encoder, no judge loop, small pool
+    "fast": PipelineProfile("fast", skip=frozenset({"rerank", "judge"}), pool_factor=2, min_pool=5,
+                            judge_attempts=0),
+    "balanced": PipelineProfile("balanced"),
+    # larger pool and one more regeneration attempt
+    "accurate": PipelineProfile("accurate", pool_factor=5, min_pool=20, judge_attempts=3),
+}
+
+
+@dataclass
+class Stage:
+    """
+    One node of the pipeline. run(state) returns the stage's typed output,
+    stored as state.outputs[name]. after lists the stages it reads from;
+    optional stages can be switched off by a profile. A stage without run is a
+    marker for work an earlier stage always does (it must be covered or skipped).
+    """
+    name: str
+    run: Optional[Callable[["PipelineState"], Any]] = None
+    after: Tuple[str, ...] = ()
+    optional: bool = False
+
+
+@dataclass
+class PipelineState:
+    """Request inputs plus every stage output produced so far."""
+    query: str
+    top_k: int
+    profile: PipelineProfile
+    params: Dict[str, Any] = field(default_factory=dict)
+    outputs: Dict[str, Any] = field(default_factory=dict)
+    done: set = field(default_factory=set)
+    visited: set = field(default_factory=set)
+    trace: List[Dict[str, Any]] = field(default_factory=list)
+
+    def get(self, stage: str, default: Any = None) -> Any:
+        return self.outputs.get(stage, default)
+
+
+class StageError(Exception):
+    """Raised by a stage to abort the request with an error payload."""
+
+    def __init__(self, stage: str, message: str, details: str = ""):
+        super().__init__(f"{stage}: {message}")
+        self.stage = stage
+        self.message = message
+        self.details = details
+
+
+class StageGraph:
+    """
+    Declarative stage graph. Stages run in dependency order, each at most once
+    per request: a stage whose work was already done by an earlier stage
+    (its output lists it in `covers`) is not run again, and a stage switched
+    off by the profile is skipped. Timings go to `pipeline.<stage>.seconds`.
+    """
+
+    def __init__(self, stages: Sequence[Stage]):
+        names = [s.name for s in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate stage names: {names}")
+        self.stages = {s.name: s for s in stages}
+        self.order = self._toposort(stages)
+
+    def _toposort(self, stages: Sequence[Stage]) -> List[Stage]:
+        order: List[Stage] = []
+        placed = set()
+        pending = list(stages)
+        while pending:
+            ready = [s for s in pending if all(d in placed for d in s.after)]
+            if not ready:
+                unknown = {d for s in pending for d in s.after if d not in self.stages}
+                raise ValueError(f"Unknown stage dependencies {sorted(unknown)}" if unknown
+                                 else f"Cycle among stages {[s.name for s in pending]}")
+            for s in ready:  # declaration order among ready stages
+                order.append(s)
+                placed.add(s.name)
+                pending.remove(s)
+        return order
+
+    def run(self, state: PipelineState, until: Optional[str] = None) -> PipelineState:
+        """
+        Run every stage not handled yet. until stops before that stage, so a
+        caller can produce its output itself (see complete) and call run again.
+        """
+        for stage in self.order:
+            if stage.name == until:
+                break
+            if stage.name in state.visited:
+                continue
+            state.visited.add(stage.name)
+            if stage.name in state.done:
+                state.trace.append({"stage": stage.name, "status": "covered"})
+                metrics.inc(f"pipeline.{stage.name}.covered")
+                continue
+            if stage.optional and not state.profile.enabled(stage.name):
+                state.trace.append({"stage": stage.name, "status": "skipped"})
+                metrics.inc(f"pipeline.{stage.name}.skipped")
+                continue
+            if stage.run is None:
+                raise StageError(stage.name, "Stage was not covered by an earlier stage",
+                                 f"no earlier output lists {stage.name!r} in covers")
+            with metrics.timer(f"pipeline.{stage.name}.seconds"):
+                output = stage.run(state)
+            state.outputs[stage.name] = output
+            state.done.add(stage.name)
+            covers = tuple(getattr(output, "covers", ()))
+            state.done.update(covers)
+            state.trace.append({"stage": stage.name, "status": "ran", **({"covers": list(covers)} if covers else {})})
+        return state
+
+    def complete(self, state: PipelineState, name: str, output: Any, seconds: Optional[float] = None):
+        """Record the output of a stage the caller ran outside the graph (e.g. streamed generation)."""
+        if name not in self.stages:
+            raise ValueError(f"Unknown stage: {name}")
+        if name in state.visited:
+            raise ValueError(f"Stage already handled: {name}")
+        if seconds is not None:
+            metrics.observe(f"pipeline.{name}.seconds", seconds)
+        state.visited.add(name)
+        state.done.add(name)
+        state.outputs[name] = output
+        state.trace.append({"stage": name, "status": "ran"})
@@ -68,14 +68,15 @@ def query_document(docId: str, user_query: str, topK: int = 10) -> dict:
     retrieved_docs = blendedRetriever.query(
         doc_id=docId,
         query=rq.get("refinedQuery", user_query),
-        top_k=topK
+        top_k=topK,
+        keywords=rq.get("keywords")
     )
 
     # Extract text chunks
     # top_chunks = [{"text": d.get("chunk")} for d in retrieved_docs[:3] if d.get("chunk")]
     top_chunks =     [
-        {"text": getTopSentences(d.get("chunk"), user_query, top_n=2)}
-        for d in retrieved_docs[:5] if d.get("chunk")
+        {"text": getTopSentences(d.text, user_query, top_n=2)}
+        for d in retrieved_docs[:5] if d.text
     ]
 
     # Step 3: Generate Raw Answer
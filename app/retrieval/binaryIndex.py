@@ -0,0 +1,167 @@
+# app/retrieval/binaryIndex.py
+import os
+import json
+import threading
+from typing import List, Dict, Optional
+import numpy as np
+from app.utils.logger import getLogger
+from app.config import BINARY_INDEX_DIR, BINARY_RESCORE_K
+
+logger = getLogger(__name__)
+
+# popcount lookup for numpy builds without np.bitwise_count (< 2.0)
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def pack_signs(vectors: np.ndarray) -> np.ndarray:
+    """1-bit sign quantization: (n, dim) floats -> (n, dim/8) packed uint8 codes."""
+    x = np.atleast_2d(np.asarray(vectors))
+    return np.packbits(x > 0, axis=1)
+
+
+def hamming_distances(codes: np.ndarray, query_code: np.ndarray) -> np.ndarray:
+    """Hamming distance between every packed code row and a packed query code."""
+    xor = np.bitwise_xor(codes, query_code.reshape(1, -1))
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT_TABLE[xor].sum(axis=1, dtype=np.int32)
+
+
+class BinaryIndex:
+    """
+    Per-document side index of sign-quantized chunk embeddings.
+
+    Embeddings from EmbeddingClient are L2-normalized, so the sign pattern is a
+    good locality-sensitive hash of the direction: 384 dims -> 48 bytes per chunk
+    instead of 1536. Search scans the codes with popcount Hamming distance and
+    re-scores the closest `rescore_k` candidates against the float32 vectors,
+    which stay on disk (memory-mapped) and are only touched for those rows.
+    """
+
+    def __init__(self, index_dir: str, rescore_k: int = 200):
+        self.index_dir = index_dir
+        self.rescore_k = rescore_k
+        self.lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, list]] = {}  # doc_id -> buffered ids/vectors before save
+        self._loaded: Dict[str, Dict] = {}             # doc_id -> {"codes", "vectors", "ids"}
+        os.makedirs(index_dir, exist_ok=True)
+
+    def _doc_dir(self, doc_id: str) -> str:
+        return os.path.join(self.index_dir, doc_id)
+
+    # ---------------- Ingest ----------------
+    def add(self, doc_id: str, chunk_ids: List[str], embeddings: np.ndarray):
+        """Buffer a batch (e.g. one page) of chunk embeddings; call save() once per document."""
+        if not chunk_ids:
+            return
+        with self.lock:
+            buf = self._pending.setdefault(doc_id, {"ids": [], "vectors": []})
+            buf["ids"].extend(chunk_ids)
+            buf["vectors"].append(np.asarray(embeddings, dtype=np.float32))
+
+    def save(self, doc_id: str):
+        with self.lock:
+            buf = self._pending.pop(doc_id, None)
+        if not buf or not buf["ids"]:
+            return
+        vectors = np.concatenate(buf["vectors"])
+        path = self._doc_dir(doc_id)
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "codes.npy"), pack_signs(vectors))
+        np.save(os.path.join(path, "vectors.npy"), vectors)
+        with open(os.path.join(path, "ids.json"), "w") as f:
+            json.dump(buf["ids"], f)
+        with self.lock:
+            self._loaded.pop(doc_id, None)
+        logger.info(f"Binary index saved for document {doc_id} ({len(buf['ids'])} chunks)")
+
+    # ---------------- Query ----------------
+    def _load(self, doc_id: str) -> Optional[Dict]:
+        with self.lock:
+            if doc_id in self._loaded:
+                return self._loaded[doc_id]
+        path = self._doc_dir(doc_id)
+        if not os.path.exists(os.path.join(path, "codes.npy")):
+            return None
+        entry = {
+            "codes": np.load(os.path.join(path, "codes.npy")),
+            "vectors": np.load(os.path.join(path, "vectors.npy"), mmap_mode="r"),
+        }
+        with open(os.path.join(path, "ids.json")) as f:
+            entry["ids"] = json.load(f)
+        with self.lock:
+            self._loaded[doc_id] = entry
+        return entry
+
+    def has_document(self, doc_id: str) -> bool:
+        return self._load(doc_id) is not None
+
+    def vectors(self, doc_id: str, chunk_ids: List[str]) -> Dict[str, np.ndarray]:
+        """Stored float32 vectors for those chunk_ids that doc_id has ({} without a binary index)."""
+        entry = self._load(doc_id)
+        if entry is None:
+            return {}
+        rows = entry.get("rows")
+        if rows is None:
+            rows = entry["rows"] = {cid: i for i, cid in enumerate(entry["ids"])}
+        found = [cid for cid in chunk_ids if cid in rows]
+        if not found:
+            return {}
+        mat = np.asarray(entry["vectors"][[rows[cid] for cid in found]], dtype=np.float32)
+        return dict(zip(found, mat))
+
+    def search(self, doc_id: str, query_vec: np.ndarray, top_k: int = 10, rescore_k: Optional[int] = None) -> List[Dict]:
+        """
+        Hamming prefilter + float rescoring.
+        Returns [{"id": chunk_id, "score": cosine}, ...] best first.
+        """
+        entry = self._load(doc_id)
+        if entry is None:
+            return []
+        codes = entry["codes"]
+        n = len(codes)
+        if n == 0:
+            return []
+        q = np.asarray(query_vec, dtype=np.float32).ravel()
+        rescore_k = min(n, max(top_k, rescore_k or self.rescore_k))
+
+        dists = hamming_distances(codes, pack_signs(q)[0])
+        if rescore_k < n:
+            cand = np.argpartition(dists, rescore_k - 1)[:rescore_k]
+        else:
+            cand = np.arange(n)
+        cand = np.sort(cand)
+
+        exact = np.asarray(entry["vectors"][cand], dtype=np.float32) @ q
+        k = min(top_k, len(cand))
+        best = np.argpartition(-exact, k - 1)[:k]
+        best = best[np.argsort(-exact[best])]
+        ids = entry["ids"]
+        return [{"id": ids[cand[i]], "score": float(exact[i])} for i in best]
+
+    def delete(self, doc_id: str) -> int:
+        """Remove a document's codes and vectors. Returns bytes freed on disk."""
+        with self.lock:
+            self._pending.pop(doc_id, None)
+            self._loaded.pop(doc_id, None)
+        path = self._doc_dir(doc_id)
+        if not os.path.isdir(path):
+            return 0
+        freed = 0
+        for name in os.listdir(path):
+            fp = os.path.join(path, name)
+            freed += os.path.getsize(fp)
+            os.remove(fp)
+        os.rmdir(path)
+        return freed
+
+    def memory_footprint(self, doc_id: str) -> Dict[str, int]:
+        """Bytes held in RAM for the codes vs. what the float vectors would need."""
+        entry = self._load(doc_id)
+        if entry is None:
+            return {"codes_bytes": 0, "float_bytes": 0}
+        return {"codes_bytes": int(entry["codes"].nbytes), "float_bytes": int(entry["vectors"].nbytes)}
+
+
+# Singleton instance
+binaryIndex = BinaryIndex(str(BINARY_INDEX_DIR), rescore_k=BINARY_RESCORE_K)
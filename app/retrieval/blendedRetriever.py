@@ -1,31 +1,145 @@
 # app/retrieval/blendedRetriever.py
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from app.retrieval.denseRetriever import DenseRetriever
-from app.retrieval.sparseRetriever import SparseRetriever
+from app.retrieval.candidate import Candidate
+from app.retrieval.mmr import mmr_select
+from app.retrieval.sparseRetriever import sparseRetriever
 from app.utils.logger import getLogger
 from app.chromaClient import chromaClient
 from app.retrieval.reranker import reranker
 from app.embeddings.embeddingClient import EmbeddingClient
+from app.retrieval.ivfpqIndex import IVFPQIndex
+from app.retrieval.corpusBM25Index import CorpusBM25Index
+from app.retrieval.binaryIndex import binaryIndex
+from app.storage.documentStore import documentStore
+from app.sharding.coordinator import shardCoordinator
+from app.config import (
+    CORPUS_INDEX_ENABLED, CORPUS_INDEX_DIR, BINARY_INDEX_ENABLED,
+    FANOUT_MAX_WORKERS, FANOUT_PER_DOC_K, CORPUS_BM25_ENABLED, CORPUS_BM25_DIR,
+    DENSE_RETRIEVAL_TIMEOUT, SPARSE_RETRIEVAL_TIMEOUT, RETRIEVAL_QUEUE_TIMEOUT,
+    RETRIEVAL_CACHE_ENABLED, RETRIEVAL_CACHE_TTL,
+    RETRIEVAL_CACHE_MAX_ITEMS, RETRIEVAL_CACHE_MAX_BYTES, MMR_LAMBDA, COSINE_SIMILARITY_THRESHOLD,
+    ADAPTIVE_POOL_ENABLED, POOL_RELATIVE_FLOOR, POOL_GROW_FACTOR, RERANK_SKIP_MARGIN
+)
+from app.utils.cache import BoundedCache
+from app.utils.fileUtils import recover_dir
+from app.utils.metrics import metrics
+from app.utils.textAnalyzer import normalize
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 import hashlib
-import re
+import threading
+import time
+import numpy as np
 from collections import Counter
 
 logger = getLogger(__name__)
 
+POOL_SIZE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 100, 200)
+
+
+def _results_bytes(results: List[Candidate]) -> int:
+    """Approximate footprint of a cached result list (dominated by chunk text)."""
+    return sum(200 + len(c.text or "") for c in results)
+
+
+class _BranchTask:
+    """When a branch submitted to the shared pool was queued and when a worker picked it up."""
+
+    __slots__ = ("submitted_at", "started_at", "started")
+
+    def __init__(self):
+        self.submitted_at = time.perf_counter()
+        self.started_at = 0.0
+        self.started = threading.Event()
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self.started.set()
+
+
 class BlendedRetriever:
-    def __init__(self, alpha: float = 0.3, diversity_penalty: float = 0.12):
+    def __init__(self, alpha: float = 0.3, mmr_lambda: float = MMR_LAMBDA,
+                 max_workers: int = FANOUT_MAX_WORKERS, per_doc_k: int = FANOUT_PER_DOC_K,
+                 dense_timeout: float = DENSE_RETRIEVAL_TIMEOUT, sparse_timeout: float = SPARSE_RETRIEVAL_TIMEOUT,
+                 queue_timeout: float = RETRIEVAL_QUEUE_TIMEOUT):
         """
         alpha: weight for dense retriever (0.3 = 30% dense, 70% sparse)
-        diversity_penalty: penalty applied per extra chunk from the same page (tunable)
+        mmr_lambda: relevance/novelty trade-off of the final MMR selection (1.0 disables it)
+        max_workers: shared pool running dense/BM25 branches (and per-document fan-out)
+        per_doc_k: candidates taken from each document before global fusion
+        dense_timeout / sparse_timeout: seconds each branch may run before fusing without it
+        queue_timeout: seconds a request's branches may wait for free workers on the shared pool
         """
         self.alpha = alpha
-        self.diversity_penalty = diversity_penalty
+        self.mmr_lambda = mmr_lambda
+        self.per_doc_k = per_doc_k
+        self.timeouts = {"dense": dense_timeout, "sparse": sparse_timeout}
+        self.queue_timeout = queue_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="retrieval-fanout")
         embedding_client = EmbeddingClient()
         self.dense = DenseRetriever(
             chroma_client=chromaClient,
-            embedding_fn=embedding_client.generateEmbedding
+            embedding_fn=embedding_client.generateEmbedding,
+            binary_index=binaryIndex if BINARY_INDEX_ENABLED else None
         )
-        self.sparse = SparseRetriever()
+        self.sparse = sparseRetriever  # shared with ingest so deletes/re-indexes are seen here
+        self.sparse.on_change(self._sparse_changed)
+        self.embed = embedding_client.generateEmbedding
+        self.corpus_index: Optional[IVFPQIndex] = None  # loaded lazily for cross-document queries
+        self.corpus_bm25: Optional[CorpusBM25Index] = None  # global BM25 (corpus IDF), loaded lazily
+        self.coordinator = shardCoordinator  # set when indexes are partitioned across shard processes
+        self.result_cache = BoundedCache("retrieval_cache", max_bytes=RETRIEVAL_CACHE_MAX_BYTES,
+                                         max_items=RETRIEVAL_CACHE_MAX_ITEMS, ttl=RETRIEVAL_CACHE_TTL,
+                                         sizeof=_results_bytes)
+        self._generation = 0  # bumped on every invalidation; stale in-flight results are not cached
+
+    # ---------------- Public entry points (result cache in front) ----------------
+    def query(self, doc_id: str, query: str, top_k: int = 10, rerank: bool = True,
+              keywords: Optional[List[str]] = None, mmr_lambda: Optional[float] = None) -> List[Candidate]:
+        """mmr_lambda overrides the instance default for this request."""
+        lam = self.mmr_lambda if mmr_lambda is None else mmr_lambda
+        key = self._cache_key(query, [doc_id], top_k, rerank, None, keywords, lam)
+        return self._cached(key, lambda: self._query(doc_id, query, top_k, rerank, keywords, lam))
+
+    def query_multi(self, doc_ids: List[str], query: str, top_k: int = 10, rerank: bool = True,
+                    per_doc_k: Optional[int] = None, keywords: Optional[List[str]] = None,
+                    mmr_lambda: Optional[float] = None) -> List[Candidate]:
+        lam = self.mmr_lambda if mmr_lambda is None else mmr_lambda
+        key = self._cache_key(query, doc_ids, top_k, rerank, per_doc_k, keywords, lam)
+        return self._cached(key, lambda: self._query_multi(doc_ids, query, top_k, rerank, per_doc_k, keywords, lam))
+
+    def query_corpus(self, query: str, doc_ids: Optional[List[str]] = None, top_k: int = 10, rerank: bool = True,
+                     per_doc_k: Optional[int] = None, keywords: Optional[List[str]] = None,
+                     mmr_lambda: Optional[float] = None) -> List[Candidate]:
+        lam = self.mmr_lambda if mmr_lambda is None else mmr_lambda
+        key = self._cache_key(query, doc_ids, top_k, rerank, per_doc_k, keywords, lam)
+        return self._cached(key, lambda: self._query_corpus(query, doc_ids, top_k, rerank, per_doc_k, keywords, lam))
+
+    def _cache_key(self, query: str, doc_ids: Optional[List[str]], top_k: int, rerank: bool,
+                   per_doc_k: Optional[int], keywords: Optional[List[str]], mmr_lambda: float) -> Tuple:
+        """(normalized query, docIds or None for all, top_k, keywords, retrieval config)."""
+        docs = None if doc_ids is None else tuple(sorted(set(doc_ids)))
+        config = (self.alpha, mmr_lambda, per_doc_k or self.per_doc_k, rerank)
+        return normalize(query), docs, top_k, tuple(sorted(set(keywords or ()))), config
+
+    def _cached(self, key: Tuple, compute) -> List[Candidate]:
+        if not RETRIEVAL_CACHE_ENABLED:
+            return compute()
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            return [c.copy() for c in cached]  # later stages update scores in place
+        generation = self._generation
+        results = compute()
+        if generation == self._generation:
+            self.result_cache.put(key, [c.copy() for c in results])
+        return results
+
+    def invalidate_document(self, doc_id: str) -> int:
+        """Drop cached results that cover doc_id (including all-document queries). Returns the number dropped."""
+        self._generation += 1
+        if reranker is not None:
+            reranker.invalidate_document(doc_id)
+        return self.result_cache.invalidate(lambda key: key[1] is None or doc_id in key[1])
 
     def _joint_normalize(self, dense_scores: List[float], sparse_scores: List[float]):
         """Normalize dense + sparse scores together instead of separately."""
@@ -39,137 +153,413 @@ class BlendedRetriever:
         def scale(x): return (x - min_s) / (max_s - min_s)
         return [scale(s) for s in dense_scores], [scale(s) for s in sparse_scores]
 
-    def _generate_key(self, chunk_data) -> str:
-        """Generate stable ID for chunks using provided id or hash of text."""
-        if isinstance(chunk_data, dict):
-            cid = chunk_data.get("id")
-            if cid:
-                return str(cid)
-            text = chunk_data.get("text", "")
-        else:
-            text = str(chunk_data)
-        return hashlib.md5(text.encode("utf-8")).hexdigest()
+    def _key(self, cand: Candidate) -> str:
+        """Chunk id, or a hash of the text for candidates without one."""
+        return str(cand.id) if cand.id else hashlib.md5((cand.text or "").encode("utf-8")).hexdigest()
+
+    def _attach_pages(self, ranked: List[Candidate]) -> List[Candidate]:
+        """Fill page/docId from Chroma metadata for candidates that only came from BM25."""
+        missing = [c for c in ranked if c.page is None and c.id]
+        if not missing:
+            return ranked
+        try:
+            stored = chromaClient.get_metadatas([c.id for c in missing])
+        except Exception as e:
+            logger.debug(f"Page lookup failed: {e}")
+            return ranked
+        by_id = dict(zip(stored["ids"], stored["metadatas"]))
+        for c in missing:
+            meta = by_id.get(c.id)
+            if meta:
+                filled = Candidate.from_chunk({"id": c.id, "meta": meta})
+                c.meta, c.page, c.doc_id = meta, filled.page, c.doc_id or filled.doc_id
+        return ranked
 
-    def _get_page_for_chunk(self, chunk_data) -> Optional[int]:
+    def _embeddings(self, cands: List[Candidate]) -> np.ndarray:
         """
-        Try multiple strategies to extract page number from chunk metadata or chunk id.
+        Stored vectors for the candidates: the per-document binary index's float
+        vectors where available, otherwise one batched Chroma lookup. Rows stay
+        zero for chunks with no stored vector.
         """
-        if not chunk_data:
-            return None
-        # if chunk_data is dict with meta
-        if isinstance(chunk_data, dict):
-            meta = chunk_data.get("meta") or chunk_data.get("metadata") or {}
-            if isinstance(meta, dict) and "page" in meta:
-                try:
-                    return int(meta["page"])
-                except Exception:
-                    pass
-            # also support chunk_data with "id" like docId_page{n}_chunk{i}
-            cid = chunk_data.get("id")
-            if isinstance(cid, str):
-                m = re.search(r"_page(\d+)_", cid)
-                if m:
-                    return int(m.group(1))
-        # chunk_data might be a plain string id
-        if isinstance(chunk_data, str):
-            m = re.search(r"_page(\d+)_", chunk_data)
-            if m:
-                return int(m.group(1))
-        return None
-
-    def _apply_diversity_penalty(self, ranked_list: List[Dict]) -> List[Dict]:
-        """
-        If many chunks come from the same page, apply a small penalty to later ones.
-        This promotes diversity across pages/sections.
-        """
-        pages = [self._get_page_for_chunk(item.get("chunk")) for item in ranked_list]
-        counts = Counter(pages)
-        # if everything is None or only single page, skip penalty
-        if len([p for p in pages if p is not None]) <= 1:
-            return ranked_list
-
-        # Walk through list and apply penalty grows with how many times that page has appeared so far
-        seen = Counter()
-        for item in ranked_list:
-            page = self._get_page_for_chunk(item.get("chunk"))
-            if page is None:
-                continue
-            seen[page] += 1
-            # apply penalty for second+ appearance
-            if seen[page] > 1:
-                penalty = self.diversity_penalty * (seen[page] - 1)
-                item["score"] = item.get("score", 0.0) - penalty
-                logger.debug(f"Applied diversity penalty to page {page}: -{penalty} (now {item['score']})")
-        return ranked_list
-
-    def query(self, doc_id: str, query: str, top_k: int = 10, rerank: bool = True) -> List[Dict]:
-        logger.info(f"Querying doc_id: {doc_id} with query: {query}, top_k: {top_k}")
+        found: Dict[str, np.ndarray] = {}
+        by_doc: Dict[Optional[str], List[str]] = {}
+        for c in cands:
+            by_doc.setdefault(c.doc_id, []).append(c.id)
+        if BINARY_INDEX_ENABLED:
+            for doc_id, ids in by_doc.items():
+                if doc_id is not None:
+                    found.update(binaryIndex.vectors(doc_id, ids))
+        missing = [c.id for c in cands if c.id and c.id not in found]
+        if missing:
+            try:
+                stored = chromaClient.get_embeddings(missing)
+                found.update(zip(stored["ids"], (np.asarray(e, dtype=np.float32) for e in stored["embeddings"])))
+            except Exception as e:
+                logger.debug(f"Embedding lookup for MMR failed: {e}")
+        dim = next((len(v) for v in found.values()), 0)
+        out = np.zeros((len(cands), dim), dtype=np.float32)
+        for i, c in enumerate(cands):
+            if c.id in found:
+                out[i] = found[c.id]
+        return out
 
-        # Get dense and sparse results (each entry: {"chunk": {...}, "score": float})
-        dense_results = self.dense.query(doc_id, query, top_k=top_k)
-        sparse_results = self.sparse.query(doc_id, query, top_k=top_k)
+    def _diversify(self, ranked: List[Candidate], top_k: int, mmr_lambda: float) -> List[Candidate]:
+        """MMR selection of top_k, relevance = rerank score when reranked, else the fused score."""
+        if mmr_lambda >= 1.0 or len(ranked) <= 1:
+            return ranked[:top_k]
+        reranked = all(c.rerank_score is not None for c in ranked)
+        relevance = np.array([c.rerank_score if reranked else c.score for c in ranked], dtype=np.float64)
+        order = mmr_select(self._embeddings(ranked), relevance, top_k, mmr_lambda)
+        return [ranked[i] for i in order]
 
-        # Extract scores (guard for empty)
-        dense_scores = [float(r.get("score", 0.0)) for r in dense_results] if dense_results else []
-        sparse_scores = [float(r.get("score", 0.0)) for r in sparse_results] if sparse_results else []
+    def _fuse(self, dense_results: List[Candidate], sparse_results: List[Candidate]) -> List[Candidate]:
+        """Jointly normalize dense + sparse scores and merge them into one ranked list."""
+        dense_scores = [c.dense_score or 0.0 for c in dense_results]
+        sparse_scores = [c.sparse_score or 0.0 for c in sparse_results]
 
         # Joint normalization to keep them comparable
         dense_scores, sparse_scores = self._joint_normalize(dense_scores, sparse_scores)
 
-        combined = {}
+        combined: Dict[str, Candidate] = {}
+        for weight, results, scores in ((self.alpha, dense_results, dense_scores),
+                                        (1 - self.alpha, sparse_results, sparse_scores)):
+            for c, norm in zip(results, scores):
+                key = self._key(c)
+                if key in combined:
+                    fused = combined[key]
+                    fused.score += weight * norm
+                    fused.dense_score = fused.dense_score if c.dense_score is None else c.dense_score
+                    fused.sparse_score = fused.sparse_score if c.sparse_score is None else c.sparse_score
+                else:
+                    c.score = weight * norm
+                    combined[key] = c
+                logger.debug(f"Merged: key={key}, add_score={weight * norm}")
 
-        # Merge dense results
-        for i, r in enumerate(dense_results or []):
-            chunk_data = r.get("chunk") if isinstance(r, dict) else r
-            key = self._generate_key(chunk_data)
-            score = self.alpha * (dense_scores[i] if i < len(dense_scores) else 0.0)
-            if key in combined:
-                combined[key]["score"] += score
-            else:
-                combined[key] = {"chunk": chunk_data, "score": score}
-            logger.debug(f"Dense merged: key={key}, add_score={score}")
-
-        # Merge sparse results
-        for i, r in enumerate(sparse_results or []):
-            # sparse returns {"chunk": text-or-dict, "score": s, "id": maybe}
-            chunk_data = r.get("chunk") if isinstance(r, dict) else r
-            key = self._generate_key(chunk_data)
-            score = (1 - self.alpha) * (sparse_scores[i] if i < len(sparse_scores) else 0.0)
-            if key in combined:
-                combined[key]["score"] += score
-            else:
-                combined[key] = {"chunk": chunk_data, "score": score}
-            logger.debug(f"Sparse merged: key={key}, add_score={score}")
+        return sorted(combined.values(), key=lambda c: c.score, reverse=True)
 
-        ranked = sorted(combined.values(), key=lambda x: x["score"], reverse=True)
+    # ---------------- Adaptive candidate pool ----------------
+    def _apply_floor(self, ranked: List[Candidate]) -> List[Candidate]:
+        """Drop dense-only candidates below COSINE_SIMILARITY_THRESHOLD (BM25 matches are kept)."""
+        if not ADAPTIVE_POOL_ENABLED:
+            return ranked
+        kept = [c for c in ranked
+                if c.sparse_score is not None or c.dense_score is None or c.dense_score >= COSINE_SIMILARITY_THRESHOLD]
+        if not kept:
+            kept = ranked[:1]  # answer from the best match rather than nothing
+        if len(kept) < len(ranked):
+            metrics.inc("retrieval.pool.floor_dropped", len(ranked) - len(kept))
+        return kept
 
-        # Debug: log top-5 before diversity/rerank
-        logger.info("Top-5 candidates before penalty/rerank:")
-        for idx, c in enumerate(ranked[:5]):
-            chunk = c.get("chunk")
-            page = self._get_page_for_chunk(chunk)
-            text_snippet = (chunk.get("text")[:120] if isinstance(chunk, dict) else str(chunk)[:120])
-            logger.info(f"  #{idx+1}: score={c['score']:.4f} page={page} snippet={text_snippet!r}")
+    def _adaptive(self, query: str, retrieve, top_k: int, rerank: bool,
+                  mmr_lambda: Optional[float]) -> List[Candidate]:
+        """
+        retrieve(scale) -> (fused candidates, whether a branch filled its list).
+        When fewer than top_k candidates clear the score floor although more
+        may exist below the cut, retrieve once more with a POOL_GROW_FACTOR
+        times larger pool.
+        """
+        ranked, full = retrieve(1)
+        pool = self._apply_floor(ranked)
+        if ADAPTIVE_POOL_ENABLED and len(pool) < top_k and full:
+            metrics.inc("retrieval.pool.grown")
+            logger.info(f"Only {len(pool)} candidates above the score floor; growing the pool x{POOL_GROW_FACTOR}")
+            ranked, _ = retrieve(POOL_GROW_FACTOR)
+            pool = self._apply_floor(ranked)
+        return self._finalize(query, pool, top_k, rerank, mmr_lambda)
+
+    def _shrink(self, ranked: List[Candidate], top_k: int) -> List[Candidate]:
+        """Drop candidates far below the best fused score before reranking (never below top_k)."""
+        if ADAPTIVE_POOL_ENABLED and len(ranked) > top_k:
+            cutoff = POOL_RELATIVE_FLOOR * ranked[0].score
+            keep = max(top_k, sum(1 for c in ranked if c.score >= cutoff))
+            if keep < len(ranked):
+                metrics.inc("retrieval.pool.shrunk")
+                ranked = ranked[:keep]
+        metrics.observe("retrieval.pool.size", len(ranked), buckets=POOL_SIZE_BUCKETS)
+        return ranked
 
-        # Apply diversity penalty
-        ranked = self._apply_diversity_penalty(ranked)
+    def _skip_rerank(self, ranked: List[Candidate]) -> bool:
+        """The cross-encoder cannot change the answer when the top fused hit leads by RERANK_SKIP_MARGIN."""
+        skip = ADAPTIVE_POOL_ENABLED and (
+            len(ranked) == 1 or ranked[0].score - ranked[1].score >= RERANK_SKIP_MARGIN)
+        metrics.inc("retrieval.rerank.skipped" if skip else "retrieval.rerank.run")
+        if skip:
+            logger.info(f"Skipping rerank: top candidate leads by >= {RERANK_SKIP_MARGIN}")
+        return skip
 
-        # Re-sort after penalty
-        ranked = sorted(ranked, key=lambda x: x["score"], reverse=True)
+    def _finalize(self, query: str, ranked: List[Candidate], top_k: int, rerank: bool,
+                  mmr_lambda: Optional[float] = None) -> List[Candidate]:
+        """Shrink the pool, optionally cross-encoder rerank it, then MMR selection of top_k."""
+        ranked = self._attach_pages(self._shrink(ranked, top_k))
+        mmr_lambda = self.mmr_lambda if mmr_lambda is None else mmr_lambda
 
-        # Optionally rerank with cross-encoder (if configured)
-        if rerank and reranker is not None:
+        # Debug: log top-5 before rerank
+        logger.info("Top-5 candidates before rerank:")
+        for idx, c in enumerate(ranked[:5]):
+            logger.info(f"  #{idx+1}: score={c.score:.4f} page={c.page} snippet={c.text[:120]!r}")
+
+        # Optionally rerank with cross-encoder (if configured); every candidate is
+        # scored so MMR can pick top_k from the whole reranked pool
+        if rerank and reranker is not None and ranked and not self._skip_rerank(ranked):
             try:
-                reranked = reranker.rerank(query, ranked, top_k=top_k)
+                ranked = reranker.rerank(query, ranked, top_k=len(ranked))
                 logger.info("Top-5 after rerank:")
-                for idx, c in enumerate(reranked[:5]):
-                    logger.info(f"  #{idx+1}: rerank_score={c.get('rerank_score')} blended_score={c.get('score'):.4f}")
-                return reranked
+                for idx, c in enumerate(ranked[:5]):
+                    logger.info(f"  #{idx+1}: rerank_score={c.rerank_score} blended_score={c.score:.4f}")
             except Exception as e:
                 logger.error(f"Reranker failed: {e}. Falling back to blended ranks.")
 
-        # return top_k
-        return ranked[:top_k]
+        return self._diversify(ranked, top_k, mmr_lambda)
+
+    def _query_shards(self, query: str, doc_ids: Optional[List[str]], top_k: int, rerank: bool,
+                      mmr_lambda: Optional[float] = None) -> List[Candidate]:
+        """Scatter to the shards owning doc_ids (all shards for None); rerank the merged top-k here."""
+        ranked = self.coordinator.query(query, self.embed(query), doc_ids=doc_ids, top_k=top_k)
+        return self._finalize(query, [Candidate.coerce(r) for r in ranked], top_k, rerank, mmr_lambda)
+
+    def _query(self, doc_id: str, query: str, top_k: int = 10, rerank: bool = True,
+               keywords: Optional[List[str]] = None, mmr_lambda: Optional[float] = None) -> List[Candidate]:
+        logger.info(f"Querying doc_id: {doc_id} with query: {query}, top_k: {top_k}")
+        if self.coordinator is not None:
+            return self._query_shards(query, [doc_id], top_k, rerank, mmr_lambda)
+
+        corpus_bm25 = self._get_corpus_bm25()
+        use_corpus = corpus_bm25 is not None and corpus_bm25.covers(doc_id)
+
+        def retrieve(scale: int):
+            # Dense and sparse run concurrently
+            k = top_k * scale
+            if use_corpus:
+                search = lambda: corpus_bm25.search(query, top_k=k, doc_ids=[doc_id], keywords=keywords)
+            else:
+                search = lambda: self.sparse.query(doc_id, query, top_k=k, keywords=keywords)
+            sparse_fn = lambda: [Candidate.from_sparse(h, doc_id) for h in search()]
+            results = self._gather({
+                self._submit("dense", self.dense.query, doc_id, query, top_k=k): ("dense", doc_id),
+                self._submit("sparse", sparse_fn): ("sparse", doc_id),
+            })
+            return self._fused(results, k)
+
+        return self._adaptive(query, retrieve, top_k, rerank, mmr_lambda)
+
+    def _fused(self, results: Dict[str, List[Candidate]], k: int):
+        """(fused ranking, whether either branch returned a full list of k)."""
+        full = len(results["dense"]) >= k or len(results["sparse"]) >= k
+        return self._fuse(results["dense"], results["sparse"]), full
+
+    # ---------------- Concurrent branches ----------------
+    def _timed(self, branch: str, task: "_BranchTask", fn, *args, **kwargs):
+        task.start()
+        metrics.observe("retrieval.queue_wait.seconds", task.started_at - task.submitted_at)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            metrics.observe(f"retrieval.{branch}.seconds", time.perf_counter() - task.started_at)
+
+    def _submit(self, branch: str, fn, *args, **kwargs) -> Future:
+        task = _BranchTask()
+        fut = self.executor.submit(self._timed, branch, task, fn, *args, **kwargs)
+        fut.task = task
+        return fut
+
+    def _gather(self, futures: Dict[Future, tuple]) -> Dict[str, List[Candidate]]:
+        """
+        Collect branch futures ({future: (branch, label)}) into {branch: results}.
+        Each branch gets its own timeout, counted from when its task starts
+        running (time queued behind other requests on the shared pool does not
+        count against it; queue_timeout bounds that wait separately); a future
+        that fails, never gets a worker or is still running by then is dropped
+        (counted in metrics) and the query is answered with whatever the other
+        branch returned.
+        """
+        gathered_at = time.perf_counter()
+        results: Dict[str, List[Candidate]] = {"dense": [], "sparse": []}
+        dropped = {"dense": 0, "sparse": 0}
+        for fut, (branch, label) in futures.items():
+            if not fut.task.started.wait(max(0.0, gathered_at + self.queue_timeout - time.perf_counter())):
+                fut.cancel()
+                dropped[branch] += 1
+                metrics.inc(f"retrieval.{branch}.queue_timeouts")
+                logger.warning(f"{branch} retrieval for {label} got no worker within {self.queue_timeout}s")
+                continue
+            try:
+                remaining = fut.task.started_at + self.timeouts[branch] - time.perf_counter()
+                results[branch].extend(fut.result(timeout=max(0.0, remaining)))
+            except FutureTimeout:
+                fut.cancel()
+                dropped[branch] += 1
+                metrics.inc(f"retrieval.{branch}.timeouts")
+                logger.warning(f"{branch} retrieval timed out after {self.timeouts[branch]}s for {label}")
+            except FileNotFoundError:
+                logger.debug(f"No BM25 index for {label}, skipping")
+            except Exception as e:
+                dropped[branch] += 1
+                metrics.inc(f"retrieval.{branch}.failures")
+                logger.warning(f"{branch} retrieval failed for {label}: {e}")
+        submitted = Counter(branch for branch, _ in futures.values())
+        for branch, n in dropped.items():
+            if n and n == submitted[branch]:
+                metrics.inc(f"retrieval.degraded.{branch}")
+                logger.warning(f"Answering without {branch} retrieval")
+        for branch in results:
+            results[branch].sort(key=lambda c: c.score, reverse=True)
+        return results
+
+    # ---------------- Cross-document mode ----------------
+    def _get_corpus_index(self) -> Optional[IVFPQIndex]:
+        if not CORPUS_INDEX_ENABLED:
+            return None
+        if self.corpus_index is None:
+            recover_dir(str(CORPUS_INDEX_DIR))
+            self.corpus_index = IVFPQIndex.load(str(CORPUS_INDEX_DIR))
+        return self.corpus_index
+
+    def _get_corpus_bm25(self) -> Optional[CorpusBM25Index]:
+        if not CORPUS_BM25_ENABLED:
+            return None
+        if self.corpus_bm25 is None:
+            recover_dir(str(CORPUS_BM25_DIR))
+            self.corpus_bm25 = CorpusBM25Index.load(str(CORPUS_BM25_DIR))
+        return self.corpus_bm25
+
+    def reload_corpus_index(self):
+        """Drop the loaded corpus indexes so the next cross-document query picks up a rebuild."""
+        self.corpus_index = None
+        self.corpus_bm25 = None
+        self._generation += 1
+        self.result_cache.clear()
+
+    def delete_document(self, doc_id: str) -> bool:
+        """Tombstone doc_id in the corpus indexes until compaction rebuilds them. Returns True if it was indexed."""
+        self.invalidate_document(doc_id)
+        tombstoned = False
+        index = self._get_corpus_index()
+        if index is not None and doc_id in index.doc_table:
+            index.delete_document(doc_id)
+            index.save_ids(str(CORPUS_INDEX_DIR))
+            tombstoned = True
+        corpus_bm25 = self._get_corpus_bm25()
+        if corpus_bm25 is not None and corpus_bm25.covers(doc_id):
+            corpus_bm25.delete_document(doc_id)
+            corpus_bm25.save_ids(str(CORPUS_BM25_DIR))
+            tombstoned = True
+        return tombstoned
+
+    def _sparse_changed(self, doc_id: str):
+        """
+        A per-document BM25 index changed, so the corpus BM25 copy of doc_id is
+        stale: tombstone it there and queries use the per-document index until
+        compaction merges the current version back in.
+        """
+        corpus_bm25 = self._get_corpus_bm25()
+        if corpus_bm25 is not None and corpus_bm25.covers(doc_id):
+            corpus_bm25.delete_document(doc_id)
+            corpus_bm25.save_ids(str(CORPUS_BM25_DIR))
+            logger.info(f"Corpus BM25 no longer covers {doc_id} (changed since the last build)")
+
+    def _split_covered(self, doc_ids: List[str]):
+        """(docIds the global BM25 index covers, the rest)."""
+        corpus_bm25 = self._get_corpus_bm25()
+        if corpus_bm25 is None:
+            return [], list(doc_ids)
+        return ([d for d in doc_ids if corpus_bm25.covers(d)],
+                [d for d in doc_ids if not corpus_bm25.covers(d)])
+
+    def _corpus_sparse(self, doc_ids: List[str], query: str, top_k: int, keywords: Optional[List[str]] = None):
+        """BM25 over covered documents in one pass, scaled to the best hit."""
+        hits = self._get_corpus_bm25().search(query, top_k=top_k, doc_ids=doc_ids, keywords=keywords)
+        return self._scale_to_best([Candidate.from_sparse(h) for h in hits])
+
+    @staticmethod
+    def _scale_to_best(cands: List[Candidate]) -> List[Candidate]:
+        best = max((c.sparse_score for c in cands), default=0.0)
+        if best > 0:
+            for c in cands:
+                c.sparse_score = c.score = c.sparse_score / best
+        return cands
+
+    def _sparse_doc(self, doc_id: str, query: str, per_doc_k: int, keywords: Optional[List[str]] = None):
+        """Per-document BM25 candidates (runs on the shared pool)."""
+        hits = self.sparse.query(doc_id, query, top_k=per_doc_k, keywords=keywords)
+        # BM25 scores are only comparable within a document (per-doc IDF), so
+        # scale each document's list to its own best hit before global fusion
+        return self._scale_to_best([Candidate.from_sparse(h, doc_id) for h in hits])
+
+    def _fan_out(self, doc_ids: List[str], query: str, query_vec, per_doc_k: int, dense: bool = True,
+                 sparse_doc_ids: Optional[List[str]] = None, keywords: Optional[List[str]] = None):
+        """
+        Submit one dense and one BM25 task per document; collect them with _gather.
+        sparse_doc_ids limits per-document BM25 to those docs (None: all of doc_ids).
+        """
+        futures = {}
+        if dense:
+            for doc_id in doc_ids:
+                fut = self._submit("dense", self.dense.query, doc_id, query, top_k=per_doc_k, query_embedding=query_vec)
+                futures[fut] = ("dense", doc_id)
+        for doc_id in (doc_ids if sparse_doc_ids is None else sparse_doc_ids):
+            futures[self._submit("sparse", self._sparse_doc, doc_id, query, per_doc_k, keywords)] = ("sparse", doc_id)
+        return futures
+
+    def _query_multi(self, doc_ids: List[str], query: str, top_k: int = 10, rerank: bool = True,
+                     per_doc_k: Optional[int] = None, keywords: Optional[List[str]] = None,
+                     mmr_lambda: Optional[float] = None) -> List[Candidate]:
+        """
+        Multi-document retrieval: embed the query once, fan dense + BM25 retrieval
+        out across doc_ids on the shared pool, then fuse and rerank globally.
+        """
+        if self.coordinator is not None:
+            return self._query_shards(query, doc_ids, top_k, rerank, mmr_lambda)
+        per_doc_k = per_doc_k or self.per_doc_k
+        logger.info(f"Fan-out query over {len(doc_ids)} documents: {query}, top_k: {top_k}, per_doc_k: {per_doc_k}")
+        covered, uncovered = self._split_covered(doc_ids)
+        query_vec = None
+
+        def retrieve(scale: int):
+            nonlocal query_vec
+            k, doc_k = top_k * scale, per_doc_k * scale
+            futures = {}
+            if covered:  # corpus BM25 needs no embedding: start it first
+                fut = self._submit("sparse", self._corpus_sparse, covered, query, max(k, doc_k), keywords)
+                futures[fut] = ("sparse", "corpus BM25")
+            if query_vec is None:
+                query_vec = self.embed(query)
+            futures.update(self._fan_out(doc_ids, query, query_vec, doc_k, sparse_doc_ids=uncovered, keywords=keywords))
+            return self._fused(self._gather(futures), k)
+
+        return self._adaptive(query, retrieve, top_k, rerank, mmr_lambda)
+
+    def _query_corpus(self, query: str, doc_ids: Optional[List[str]] = None, top_k: int = 10, rerank: bool = True,
+                      per_doc_k: Optional[int] = None, keywords: Optional[List[str]] = None,
+                      mmr_lambda: Optional[float] = None) -> List[Candidate]:
+        """
+        Cross-document retrieval. doc_ids=None searches every ingested document.
+        Dense hits come from the IVF-PQ corpus index in one pass when it has been
+        built; otherwise dense retrieval fans out per document. BM25 likewise uses
+        the corpus BM25 index for the documents it covers and fans out for the rest.
+        """
+        if self.coordinator is not None:
+            return self._query_shards(query, doc_ids, top_k, rerank, mmr_lambda)
+        target = doc_ids if doc_ids is not None else [d["docId"] for d in documentStore.listDocuments()]
+        index = self._get_corpus_index()
+        if index is None:
+            return self._query_multi(target, query, top_k=top_k, rerank=rerank, per_doc_k=per_doc_k,
+                                     keywords=keywords, mmr_lambda=mmr_lambda)
+
+        logger.info(f"Corpus query over {len(doc_ids) if doc_ids else 'all'} documents: {query}, top_k: {top_k}")
+        per_doc_k = per_doc_k or self.per_doc_k
+        covered, uncovered = self._split_covered(target)
+
+        def retrieve(scale: int):
+            k, doc_k = top_k * scale, per_doc_k * scale
+            dense_fn = lambda: self.dense._hydrate(index.search(self.embed(query), top_k=k, doc_ids=doc_ids))
+            futures = {self._submit("dense", dense_fn): ("dense", "corpus index")}
+            if covered:
+                fut = self._submit("sparse", self._corpus_sparse, covered, query, max(k, doc_k), keywords)
+                futures[fut] = ("sparse", "corpus BM25")
+            futures.update(self._fan_out(uncovered, query, None, doc_k, dense=False, keywords=keywords))
+            return self._fused(self._gather(futures), k)
+
+        return self._adaptive(query, retrieve, top_k, rerank, mmr_lambda)
 
 
 # Singleton instance
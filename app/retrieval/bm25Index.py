@@ -0,0 +1,446 @@
+# app/retrieval/bm25Index.py
+import os
+import json
+from collections import Counter
+from typing import List, Dict, Tuple, Optional
+import numpy as np
+from app.utils.metrics import metrics
+
+
+def _save_strings(path: str, strings: List[str]):
+    """Concatenated UTF-8 blob + offsets, so strings can be sliced out of a memory map."""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    np.save(f"{path}_blob.npy", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    np.save(f"{path}_offsets.npy", offsets)
+
+
+def _accumulate(ids: np.ndarray, scores: np.ndarray, docs: np.ndarray,
+                add: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Sparse score accumulator: ids (sorted chunk ids) and their scores gain
+    add[i] for docs[i] (sorted, unique, as in a posting list). Returns
+    (ids, scores, the updated scores of docs).
+    """
+    pos = np.searchsorted(ids, docs)
+    found = pos < len(ids)
+    found[found] = ids[pos[found]] == docs[found]
+    scores[pos[found]] += add[found]
+    new = ~found
+    if new.any():
+        ids = np.insert(ids, pos[new], docs[new])
+        scores = np.insert(scores, pos[new], add[new])
+        pos = np.searchsorted(ids, docs)
+    return ids, scores, scores[pos]
+
+
+class StringTable:
+    """Read-only list of strings backed by a (memory-mapped) UTF-8 blob."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "StringTable":
+        mode = "r" if mmap else None
+        return cls(np.load(f"{path}_blob.npy", mmap_mode=mode), np.load(f"{path}_offsets.npy"))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class BM25Index:
+    """
+    Okapi BM25 over CSR postings (same scoring as rank_bm25.BM25Okapi):
+
+      term_offsets[t]:term_offsets[t+1]  -> slice of post_docs / post_tfs for term t
+      idf[t]                             -> precomputed IDF (negative IDF floored at epsilon * mean)
+      len_norm[d]                        -> k1 * (1 - b + b * |d| / avgdl)
+      fwd_offsets[d]:fwd_offsets[d+1]    -> slice of fwd_terms: distinct term ids of chunk d
+
+    The forward arrays are the chunk token streams computed once at ingest, so
+    keyword overlap and index edits never re-tokenize chunk text. `analyzer` is
+    the textAnalyzer signature the index was built with (None: legacy
+    lowercase/whitespace tokens).
+
+    Queries touch only the postings of their terms, and top-k selection uses
+    argpartition over the matching chunks instead of sorting every chunk.
+    """
+
+    ARRAYS = ("term_offsets", "post_docs", "post_tfs", "idf", "doc_len", "len_norm", "max_impact",
+              "fwd_offsets", "fwd_terms")
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25, analyzer: Optional[Dict] = None):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.analyzer = analyzer
+        self.vocab: Dict[str, int] = {}
+        self.term_offsets = np.zeros(1, dtype=np.int64)
+        self.post_docs = np.zeros(0, dtype=np.int32)
+        self.post_tfs = np.zeros(0, dtype=np.float32)
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.doc_len = np.zeros(0, dtype=np.int32)
+        self.len_norm = np.zeros(0, dtype=np.float32)
+        self.max_impact = np.zeros(0, dtype=np.float32)  # per-term score upper bound (MaxScore)
+        self.fwd_offsets = np.zeros(1, dtype=np.int64)
+        self.fwd_terms = np.zeros(0, dtype=np.int32)
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def memory_bytes(self) -> int:
+        """Approximate footprint: arrays (mapped or not), id/text storage and the vocab dict."""
+        total = sum(np.asarray(getattr(self, name)).nbytes for name in self.ARRAYS)
+        for table in (self.ids, self.texts):
+            if isinstance(table, StringTable):
+                total += table.blob.nbytes + table.offsets.nbytes
+            else:
+                total += sum(len(x) for x in table) + 56 * len(table)
+        return total + 100 * len(self.vocab)  # ~ key str + int + dict slot per term
+
+    # ---------------- Build ----------------
+    @classmethod
+    def build(cls, tokenized: List[List[str]], ids: List[str], texts: List[str], **params) -> "BM25Index":
+        index = cls(**params)
+        postings: Dict[int, List[Tuple[int, int]]] = {}
+        forward: List[List[int]] = []
+        for d, toks in enumerate(tokenized):
+            row = []
+            for term, tf in Counter(toks).items():
+                tid = index.vocab.setdefault(term, len(index.vocab))
+                postings.setdefault(tid, []).append((d, tf))
+                row.append(tid)
+            forward.append(row)
+
+        n_terms = len(index.vocab)
+        df = np.array([len(postings[t]) for t in range(n_terms)], dtype=np.int64)
+        index.term_offsets = np.zeros(n_terms + 1, dtype=np.int64)
+        index.term_offsets[1:] = np.cumsum(df)
+        flat = [p for t in range(n_terms) for p in postings[t]]
+        index.post_docs = np.array([d for d, _ in flat], dtype=np.int32)
+        index.post_tfs = np.array([tf for _, tf in flat], dtype=np.float32)
+        index.doc_len = np.array([len(t) for t in tokenized], dtype=np.int32)
+        index._set_forward(forward)
+        index.ids = list(ids)
+        index.texts = list(texts)
+        index._finalize(df)
+        return index
+
+    def _set_forward(self, forward: List[List[int]]):
+        self.fwd_offsets = np.zeros(len(forward) + 1, dtype=np.int64)
+        self.fwd_offsets[1:] = np.cumsum([len(r) for r in forward])
+        self.fwd_terms = np.array([t for r in forward for t in r], dtype=np.int32)
+
+    @property
+    def has_forward(self) -> bool:
+        return len(self.fwd_offsets) == len(self.doc_len) + 1
+
+    def chunk_term_ids(self, d: int) -> np.ndarray:
+        return np.asarray(self.fwd_terms[self.fwd_offsets[d]:self.fwd_offsets[d + 1]])
+
+    def term_ids(self, tokens: List[str]) -> np.ndarray:
+        return np.array(sorted({self.vocab[t] for t in tokens if t in self.vocab}), dtype=np.int32)
+
+    def _finalize(self, df: np.ndarray):
+        """Corpus statistics: IDF per term and length normalization per chunk."""
+        n = len(self.doc_len)
+        avgdl = float(self.doc_len.mean()) if n else 0.0
+        idf = np.log((n - df + 0.5) / (df + 0.5)) if len(df) else np.zeros(0)
+        if len(idf):
+            idf = np.where(idf < 0, self.epsilon * idf.mean(), idf)
+        self.idf = idf.astype(np.float32)
+        if avgdl > 0:
+            self.len_norm = (self.k1 * (1 - self.b + self.b * self.doc_len / avgdl)).astype(np.float32)
+        else:
+            self.len_norm = np.full(n, self.k1, dtype=np.float32)
+        self._compute_max_impact()
+
+    def _compute_max_impact(self):
+        """Largest contribution any single chunk can get from each term."""
+        n_terms = len(self.term_offsets) - 1
+        if n_terms <= 0 or len(self.post_docs) == 0:
+            self.max_impact = np.zeros(max(n_terms, 0), dtype=np.float32)
+            return
+        tf = np.asarray(self.post_tfs)
+        saturation = tf * (self.k1 + 1) / (tf + self.len_norm[np.asarray(self.post_docs)])
+        best = np.maximum.reduceat(saturation, np.asarray(self.term_offsets[:-1]))
+        self.max_impact = (np.asarray(self.idf) * best).astype(np.float32)
+
+    # ---------------- Query ----------------
+    def _query_terms(self, query_tokens: List[str]) -> Tuple[List[int], List[int]]:
+        counts = Counter(t for t in query_tokens if t in self.vocab)
+        return [self.vocab[t] for t in counts], list(counts.values())
+
+    def score(self, query_tokens: List[str], mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (chunk indices, BM25 scores) for chunks containing at least one query term.
+        mask: optional boolean bitmap over chunks; postings outside it are dropped
+        before accumulation.
+        """
+        term_ids, weights = self._query_terms(query_tokens)
+        docs_parts, contrib_parts = [], []
+        for t, w in zip(term_ids, weights):
+            s, e = self.term_offsets[t], self.term_offsets[t + 1]
+            docs = np.asarray(self.post_docs[s:e])
+            tf = np.asarray(self.post_tfs[s:e])
+            if mask is not None:
+                keep = mask[docs]
+                docs, tf = docs[keep], tf[keep]
+            docs_parts.append(docs)
+            contrib_parts.append(w * self.idf[t] * tf * (self.k1 + 1) / (tf + self.len_norm[docs]))
+        if not docs_parts:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        docs = np.concatenate(docs_parts)
+        cand, inverse = np.unique(docs, return_inverse=True)
+        return cand, np.bincount(inverse, weights=np.concatenate(contrib_parts)).astype(np.float32)
+
+    @staticmethod
+    def _select(cand: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if len(cand) > k:
+            part = np.argpartition(-scores, k - 1)[:k]
+            cand, scores = cand[part], scores[part]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(cand[i]), float(scores[i])) for i in order]
+
+    def _kth(self, scores: np.ndarray, k: int) -> float:
+        return float(np.partition(scores, len(scores) - k)[len(scores) - k]) if len(scores) >= k else -np.inf
+
+    def maxscore_top_k(self, query_tokens: List[str], k: int, mask: Optional[np.ndarray] = None,
+                       keyword_tokens: Optional[List[str]] = None, keyword_boost: float = 0.0,
+                       prune: bool = True) -> Tuple[List[Tuple[int, float]], int, int]:
+        """
+        Exact top-k of BM25 + keyword_boost * (distinct keywords present), with
+        MaxScore dynamic pruning. Returns (hits, postings evaluated, postings total).
+
+        Keyword boosting is the sparse mat-vec  incidence(chunks x terms) @ 1[keywords]
+        evaluated over the keyword postings; each keyword acts as one more
+        "term" with a constant contribution (and bound) of keyword_boost.
+
+        Terms are visited by decreasing upper bound (w * max_impact), adding
+        their postings to a sparse accumulator (sorted chunk ids + scores, so a
+        query costs its postings, not the corpus size). theta, a lower bound on the k-th
+        best score, is the k-th best score among the chunks just updated. Once
+        theta exceeds the summed bounds of the unvisited terms, no unseen chunk
+        can reach the top-k. The candidates are frozen, and the remaining (long,
+        low-IDF) lists are only probed for those candidates. Candidates whose
+        score plus remaining bound falls below theta are dropped as we go.
+        """
+        term_ids, weights = self._query_terms(query_tokens)
+        if len(self.max_impact) != len(self.term_offsets) - 1:
+            self._compute_max_impact()
+        # (term id, query weight or None for a keyword, upper bound)
+        entries = [(t, w, w * float(self.max_impact[t])) for t, w in zip(term_ids, weights)]
+        if keyword_tokens and keyword_boost:
+            entries += [(int(t), None, keyword_boost) for t in self.term_ids(keyword_tokens)]
+        total = sum(int(self.term_offsets[t + 1] - self.term_offsets[t]) for t, _, _ in entries)
+        if k <= 0 or not entries:
+            return [], 0, total
+        # negative contributions break the lower-bound argument: score everything
+        prune = prune and keyword_boost >= 0 and all(float(self.idf[t]) >= 0 for t in term_ids)
+
+        def contrib(t, w, docs, tf):
+            if w is None:
+                return np.full(len(docs), keyword_boost)
+            return w * float(self.idf[t]) * tf * (self.k1 + 1) / (tf + self.len_norm[docs])
+
+        entries.sort(key=lambda x: -x[2])
+        # remaining[i]: summed bounds of the entries after i (exactly 0 after the last)
+        rest = np.append(np.cumsum([b for _, _, b in entries][::-1])[::-1][1:], 0.0)
+        acc_ids = np.zeros(0, dtype=np.int64)  # chunks touched so far, sorted
+        acc = np.zeros(0, dtype=np.float64)  # their scores
+        theta = -np.inf
+        cand: Optional[np.ndarray] = None  # set once the candidate set is frozen
+        scores: Optional[np.ndarray] = None  # scores of cand
+        evaluated = 0
+        for (t, w, _), remaining in zip(entries, rest):
+            s, e = int(self.term_offsets[t]), int(self.term_offsets[t + 1])
+            if cand is None:
+                docs = np.asarray(self.post_docs[s:e])
+                tf = np.asarray(self.post_tfs[s:e])
+                evaluated += e - s
+                if mask is not None:
+                    keep = mask[docs]
+                    docs, tf = docs[keep], tf[keep]
+                acc_ids, acc, updated = _accumulate(acc_ids, acc, docs, contrib(t, w, docs, tf))
+                if prune:
+                    theta = max(theta, self._kth(updated, k))
+                    if theta > remaining:
+                        keep = acc + remaining >= theta
+                        cand, scores = acc_ids[keep], acc[keep]
+                continue
+            if len(cand) == 0:
+                break
+            if len(cand) * 16 < e - s:
+                # probe: binary-search the candidates in the sorted posting list
+                docs = self.post_docs[s:e]
+                pos = np.minimum(np.searchsorted(docs, cand), e - s - 1)
+                hit = np.asarray(docs[pos]) == cand
+                evaluated += len(cand)
+                tf = np.asarray(self.post_tfs[s:e])[pos[hit]]
+            else:
+                # scan: binary-search the postings in the sorted candidates
+                docs = np.asarray(self.post_docs[s:e])
+                evaluated += e - s
+                pos = np.minimum(np.searchsorted(cand, docs), len(cand) - 1)
+                keep = cand[pos] == docs
+                hit = np.zeros(len(cand), dtype=bool)
+                hit[pos[keep]] = True
+                tf = np.asarray(self.post_tfs[s:e])[keep]
+            scores[hit] += contrib(t, w, cand[hit], tf)
+            theta = max(theta, self._kth(scores, k))
+            keep = scores + remaining >= theta
+            cand, scores = cand[keep], scores[keep]
+
+        if cand is None:
+            cand, scores = acc_ids, acc
+        return self._select(cand, scores.astype(np.float32), k), evaluated, total
+
+    def top_k(self, query_tokens: List[str], k: int, mask: Optional[np.ndarray] = None,
+              prune: bool = True, keyword_tokens: Optional[List[str]] = None,
+              keyword_boost: float = 0.0) -> List[Tuple[int, float]]:
+        hits, evaluated, total = self.maxscore_top_k(query_tokens, k, mask, keyword_tokens, keyword_boost, prune)
+        metrics.inc("bm25.postings_evaluated", evaluated)
+        metrics.inc("bm25.postings_total", total)
+        return hits
+
+
+    # ---------------- Persistence ----------------
+    def save(self, index_dir: str):
+        os.makedirs(index_dir, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(index_dir, f"{name}.npy"), np.asarray(getattr(self, name)))
+        _save_strings(os.path.join(index_dir, "ids"), list(self.ids))
+        _save_strings(os.path.join(index_dir, "texts"), list(self.texts))
+        with open(os.path.join(index_dir, "vocab.json"), "w") as f:
+            json.dump({"k1": self.k1, "b": self.b, "epsilon": self.epsilon,
+                       "analyzer": self.analyzer, "vocab": self.vocab}, f)
+
+    @classmethod
+    def load(cls, index_dir: str, mmap: bool = True) -> Optional["BM25Index"]:
+        vocab_path = os.path.join(index_dir, "vocab.json")
+        if not os.path.exists(vocab_path):
+            return None
+        with open(vocab_path) as f:
+            meta = json.load(f)
+        index = cls(k1=meta["k1"], b=meta["b"], epsilon=meta["epsilon"], analyzer=meta.get("analyzer"))
+        index.vocab = meta["vocab"]
+        mode = "r" if mmap else None
+        for name in index.ARRAYS:
+            path = os.path.join(index_dir, f"{name}.npy")
+            if os.path.exists(path):  # indexes written before forward arrays existed lack fwd_*
+                setattr(index, name, np.load(path, mmap_mode=mode))
+        index.ids = StringTable.load(os.path.join(index_dir, "ids"), mmap=mmap)
+        index.texts = StringTable.load(os.path.join(index_dir, "texts"), mmap=mmap)
+        return index
+
+
+class BM25Builder:
+    """
+    Mutable BM25 segment for a document that is still being ingested or edited.
+
+    Chunks can be appended and deleted by id; document frequencies, chunk count
+    and total length are kept up to date on every change, so freezing into a
+    BM25Index is a single pass over the live postings with no recount.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25, analyzer: Optional[Dict] = None):
+        self.params = {"k1": k1, "b": b, "epsilon": epsilon, "analyzer": analyzer}
+        self.postings: Dict[str, Dict[int, int]] = {}  # term -> {slot: tf}
+        self.slot_terms: List[Optional[Counter]] = []  # None once the slot is deleted
+        self.doc_len: List[int] = []
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.slot_of: Dict[str, int] = {}
+        self.total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.slot_of)
+
+    def stats(self) -> Dict:
+        n = len(self.slot_of)
+        return {"chunks": n, "terms": len(self.postings), "avgdl": self.total_len / n if n else 0.0}
+
+    @classmethod
+    def from_index(cls, index: BM25Index) -> "BM25Builder":
+        builder = cls(k1=index.k1, b=index.b, epsilon=index.epsilon, analyzer=index.analyzer)
+        n = len(index)
+        slot_terms = [Counter() for _ in range(n)]
+        for term, t in index.vocab.items():
+            s, e = int(index.term_offsets[t]), int(index.term_offsets[t + 1])
+            docs = np.asarray(index.post_docs[s:e]).tolist()
+            tfs = np.asarray(index.post_tfs[s:e]).astype(int).tolist()
+            builder.postings[term] = dict(zip(docs, tfs))
+            for d, tf in zip(docs, tfs):
+                slot_terms[d][term] = tf
+        builder.slot_terms = slot_terms
+        builder.doc_len = np.asarray(index.doc_len).tolist()
+        builder.ids = list(index.ids)
+        builder.texts = list(index.texts)
+        builder.slot_of = {cid: i for i, cid in enumerate(builder.ids)}
+        builder.total_len = int(sum(builder.doc_len))
+        return builder
+
+    def append(self, tokenized: List[List[str]], ids: List[str], texts: List[str]):
+        """Add chunks; an id that already exists is replaced."""
+        self.delete([cid for cid in ids if cid in self.slot_of])
+        for toks, cid, text in zip(tokenized, ids, texts):
+            slot = len(self.ids)
+            counts = Counter(toks)
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[slot] = tf
+            self.slot_terms.append(counts)
+            self.doc_len.append(len(toks))
+            self.ids.append(cid)
+            self.texts.append(text)
+            self.slot_of[cid] = slot
+            self.total_len += len(toks)
+
+    def delete(self, ids: List[str]) -> int:
+        removed = 0
+        for cid in ids:
+            slot = self.slot_of.pop(cid, None)
+            if slot is None:
+                continue
+            for term in self.slot_terms[slot]:
+                docs = self.postings[term]
+                del docs[slot]
+                if not docs:
+                    del self.postings[term]
+            self.slot_terms[slot] = None
+            self.total_len -= self.doc_len[slot]
+            removed += 1
+        return removed
+
+    def freeze(self) -> BM25Index:
+        """Compact the live chunks into an immutable CSR index."""
+        index = BM25Index(**self.params)
+        live = sorted(self.slot_of.values())
+        remap = {slot: i for i, slot in enumerate(live)}
+        offsets, docs, tfs, df = [0], [], [], []
+        for term, posting in self.postings.items():
+            index.vocab[term] = len(index.vocab)
+            for slot in sorted(posting):
+                docs.append(remap[slot])
+                tfs.append(posting[slot])
+            offsets.append(len(docs))
+            df.append(len(posting))
+        index.term_offsets = np.array(offsets, dtype=np.int64)
+        index.post_docs = np.array(docs, dtype=np.int32)
+        index.post_tfs = np.array(tfs, dtype=np.float32)
+        index.doc_len = np.array([self.doc_len[s] for s in live], dtype=np.int32)
+        index._set_forward([[index.vocab[t] for t in self.slot_terms[s]] for s in live])
+        index.ids = [self.ids[s] for s in live]
+        index.texts = [self.texts[s] for s in live]
+        index._finalize(np.array(df, dtype=np.int64))
+        return index
@@ -0,0 +1,94 @@
+# app/retrieval/candidate.py
+from typing import Any, Dict, Optional
+
+
+def _page(meta: Dict) -> Optional[int]:
+    page = meta.get("page", meta.get("page_num", meta.get("pageNumber")))
+    try:
+        return int(page) if page is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class Candidate:
+    """
+    One retrieved chunk as it moves through dense/sparse retrieval, fusion,
+    reranking and prompt building. Page and docId come from chunk metadata;
+    text is a reference to the string held by the index or Chroma result.
+
+    score is the current ranking score (fused, then diversity-adjusted);
+    the per-stage scores are kept alongside it.
+    """
+
+    __slots__ = ("id", "doc_id", "page", "text", "meta", "score",
+                 "dense_score", "sparse_score", "rerank_score")
+
+    def __init__(self, id: str, text: str = "", doc_id: Optional[str] = None, page: Optional[int] = None,
+                 meta: Optional[Dict] = None, score: float = 0.0, dense_score: Optional[float] = None,
+                 sparse_score: Optional[float] = None, rerank_score: Optional[float] = None):
+        self.id = id
+        self.text = text
+        self.doc_id = doc_id
+        self.page = page
+        self.meta = meta or {}
+        self.score = score
+        self.dense_score = dense_score
+        self.sparse_score = sparse_score
+        self.rerank_score = rerank_score
+
+    def __repr__(self) -> str:
+        return f"Candidate(id={self.id!r}, doc_id={self.doc_id!r}, page={self.page}, score={self.score:.4f})"
+
+    @classmethod
+    def from_chunk(cls, chunk: Dict, score: float = 0.0, **scores) -> "Candidate":
+        """From a Chroma-style chunk {"id", "text", "meta"}."""
+        meta = chunk.get("meta") or chunk.get("metadata") or {}
+        return cls(chunk.get("id"), chunk.get("text") or "", doc_id=meta.get("doc_id"), page=_page(meta),
+                   meta=meta, score=score, **scores)
+
+    @classmethod
+    def from_dense(cls, chunk: Dict, score: float) -> "Candidate":
+        return cls.from_chunk(chunk, score=float(score), dense_score=float(score))
+
+    @classmethod
+    def from_sparse(cls, hit: Dict, doc_id: Optional[str] = None) -> "Candidate":
+        """From a BM25 hit {"chunk": text, "score", "id"[, "doc_id", "page"]}."""
+        score = float(hit["score"])
+        page = hit.get("page")
+        return cls(hit["id"], hit["chunk"], doc_id=hit.get("doc_id", doc_id), page=page,
+                   meta={"doc_id": hit.get("doc_id", doc_id), "page": page}, score=score, sparse_score=score)
+
+    @classmethod
+    def coerce(cls, item: Any) -> "Candidate":
+        """Accept a Candidate, a {"chunk", "score"} dict (shard RPC / legacy), a {"text"} dict or a string."""
+        if isinstance(item, cls):
+            return item
+        if isinstance(item, dict):
+            chunk = item.get("chunk")
+            if isinstance(chunk, dict):
+                cand = cls.from_chunk(chunk, score=float(item.get("score") or 0.0))
+            elif chunk is not None:
+                cand = cls(item.get("id"), str(chunk), score=float(item.get("score") or 0.0))
+            else:
+                cand = cls(item.get("id"), str(item.get("text") or ""), score=float(item.get("score") or 0.0))
+            if item.get("page") is not None:
+                cand.page = item["page"]
+            cand.rerank_score = item.get("rerank_score")
+            return cand
+        return cls(None, str(item or ""))
+
+    def copy(self) -> "Candidate":
+        return Candidate(self.id, self.text, self.doc_id, self.page, self.meta, self.score,
+                         self.dense_score, self.sparse_score, self.rerank_score)
+
+    def to_dict(self) -> Dict:
+        """JSON-friendly form (API responses, debug output)."""
+        return {
+            "chunk": {"id": self.id, "text": self.text, "meta": self.meta},
+            "docId": self.doc_id,
+            "page": self.page,
+            "score": self.score,
+            "denseScore": self.dense_score,
+            "sparseScore": self.sparse_score,
+            "rerankScore": self.rerank_score,
+        }
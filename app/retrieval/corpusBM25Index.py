@@ -0,0 +1,183 @@
+# app/retrieval/corpusBM25Index.py
+import os
+import json
+from typing import List, Dict, Optional, Tuple, Iterable
+import numpy as np
+from app.retrieval.bm25Index import BM25Index
+from app.utils.textAnalyzer import Analyzer, analyzer
+from app.config import BM25_DYNAMIC_PRUNING, BM25_KEYWORD_BOOST
+from app.utils.logger import getLogger
+
+logger = getLogger(__name__)
+
+
+class CorpusBM25Index:
+    """
+    One BM25 index over every document's chunks, so IDF is computed over the
+    whole corpus and multi-document search is a single pass over the postings.
+
+    Chunks are laid out document by document: doc_starts[i]:doc_starts[i+1] is
+    the chunk range of doc_table[i]. Filters (docIds, page range, tombstones)
+    become a boolean bitmap over chunks applied to the postings while scoring.
+    """
+
+    def __init__(self, index: BM25Index, doc_table: List[str], doc_starts: np.ndarray, pages: np.ndarray,
+                 tombstones: Optional[List[str]] = None):
+        self.index = index
+        self.doc_table = list(doc_table)
+        self.doc_pos = {d: i for i, d in enumerate(self.doc_table)}
+        self.doc_starts = doc_starts
+        self.pages = pages  # -1 where the page is unknown
+        self.tombstones = set(tombstones or [])
+        self.analyzer = analyzer if index.analyzer == analyzer.signature else Analyzer.from_signature(index.analyzer)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def covers(self, doc_id: str) -> bool:
+        return doc_id in self.doc_pos and doc_id not in self.tombstones
+
+    def delete_document(self, doc_id: str):
+        """
+        Tombstone a document (deleted, or changed since the build); searches skip
+        its chunks and the next rebuild merges whatever per-document index it has.
+        """
+        if doc_id in self.doc_pos:
+            self.tombstones.add(doc_id)
+
+    def _doc_range(self, doc_id: str) -> Tuple[int, int]:
+        i = self.doc_pos[doc_id]
+        return int(self.doc_starts[i]), int(self.doc_starts[i + 1])
+
+    def filter_mask(self, doc_ids: Optional[List[str]] = None,
+                    page_range: Optional[Tuple[int, int]] = None) -> Optional[np.ndarray]:
+        """Bitmap of searchable chunks, or None when nothing is filtered out."""
+        if doc_ids is None and page_range is None and not self.tombstones:
+            return None
+        if doc_ids is None:
+            mask = np.ones(len(self), dtype=bool)
+            for d in self.tombstones:
+                s, e = self._doc_range(d)
+                mask[s:e] = False
+        else:
+            mask = np.zeros(len(self), dtype=bool)
+            for d in doc_ids:
+                if self.covers(d):
+                    s, e = self._doc_range(d)
+                    mask[s:e] = True
+        if page_range is not None:
+            lo, hi = page_range
+            mask &= (self.pages >= lo) & (self.pages <= hi)
+        return mask
+
+    def doc_of(self, chunk_idx: int) -> str:
+        return self.doc_table[int(np.searchsorted(self.doc_starts, chunk_idx, side="right")) - 1]
+
+    def search(self, query: str, top_k: int = 10, doc_ids: Optional[List[str]] = None,
+               page_range: Optional[Tuple[int, int]] = None, keywords: Optional[List[str]] = None) -> List[Dict]:
+        """Returns [{"chunk": text, "score", "id", "doc_id", "page"}, ...] best first."""
+        mask = self.filter_mask(doc_ids, page_range)
+        if mask is not None and not mask.any():
+            return []
+        keyword_tokens = self.analyzer.analyze(" ".join(keywords)) if keywords else None
+        hits = self.index.top_k(self.analyzer.analyze(query), top_k, mask=mask, prune=BM25_DYNAMIC_PRUNING,
+                                keyword_tokens=keyword_tokens, keyword_boost=BM25_KEYWORD_BOOST)
+        return [
+            {"chunk": self.index.texts[i], "score": s, "id": self.index.ids[i],
+             "doc_id": self.doc_of(i), "page": int(self.pages[i]) if self.pages[i] >= 0 else None}
+            for i, s in hits
+        ]
+
+    # ---------------- Build ----------------
+    @classmethod
+    def merge(cls, parts: Iterable[Tuple[str, BM25Index, List[int]]]) -> "CorpusBM25Index":
+        """
+        Merge per-document indexes (doc_id, index, pages) without re-tokenizing:
+        postings are concatenated with chunk offsets and IDF is recomputed over
+        the combined corpus. Indexes built with a different analyzer are
+        re-analyzed from their stored text.
+        """
+        merged = BM25Index(analyzer=analyzer.signature)
+        term_docs: Dict[int, List[np.ndarray]] = {}
+        term_tfs: Dict[int, List[np.ndarray]] = {}
+        doc_table, doc_starts, pages, doc_lens, ids, texts = [], [0], [], [], [], []
+        offset = 0
+        for doc_id, index, doc_pages in parts:
+            if index.analyzer != analyzer.signature:
+                index = BM25Index.build([analyzer.analyze(t) for t in index.texts], list(index.ids), list(index.texts))
+            for term, t in index.vocab.items():
+                gid = merged.vocab.setdefault(term, len(merged.vocab))
+                s, e = int(index.term_offsets[t]), int(index.term_offsets[t + 1])
+                term_docs.setdefault(gid, []).append(np.asarray(index.post_docs[s:e]) + offset)
+                term_tfs.setdefault(gid, []).append(np.asarray(index.post_tfs[s:e]))
+            doc_table.append(doc_id)
+            offset += len(index)
+            doc_starts.append(offset)
+            pages.extend(doc_pages)
+            doc_lens.append(np.asarray(index.doc_len))
+            ids.extend(index.ids)
+            texts.extend(index.texts)
+
+        n_terms = len(merged.vocab)
+        df = np.array([sum(len(p) for p in term_docs[t]) for t in range(n_terms)], dtype=np.int64)
+        merged.term_offsets = np.zeros(n_terms + 1, dtype=np.int64)
+        merged.term_offsets[1:] = np.cumsum(df)
+        merged.post_docs = np.concatenate([p for t in range(n_terms) for p in term_docs[t]] or [np.zeros(0)]).astype(np.int32)
+        merged.post_tfs = np.concatenate([p for t in range(n_terms) for p in term_tfs[t]] or [np.zeros(0)]).astype(np.float32)
+        merged.doc_len = np.concatenate(doc_lens or [np.zeros(0)]).astype(np.int32)
+        merged.ids, merged.texts = ids, texts
+        merged._finalize(df)
+        return cls(merged, doc_table, np.array(doc_starts, dtype=np.int64), np.array(pages, dtype=np.int32))
+
+    # ---------------- Persistence ----------------
+    def save(self, index_dir: str):
+        self.index.save(index_dir)
+        np.save(os.path.join(index_dir, "doc_starts.npy"), self.doc_starts)
+        np.save(os.path.join(index_dir, "pages.npy"), self.pages)
+        self.save_ids(index_dir)
+
+    def save_ids(self, index_dir: str):
+        """Rewrite only the document table + tombstones (cheap, used on delete)."""
+        with open(os.path.join(index_dir, "docs.json"), "w") as f:
+            json.dump({"doc_table": self.doc_table, "tombstones": sorted(self.tombstones)}, f)
+
+    @classmethod
+    def load(cls, index_dir: str, mmap: bool = True) -> Optional["CorpusBM25Index"]:
+        docs_path = os.path.join(index_dir, "docs.json")
+        index = BM25Index.load(index_dir, mmap=mmap)
+        if index is None or not os.path.exists(docs_path):
+            return None
+        with open(docs_path) as f:
+            meta = json.load(f)
+        mode = "r" if mmap else None
+        return cls(index, meta["doc_table"], np.load(os.path.join(index_dir, "doc_starts.npy")),
+                   np.load(os.path.join(index_dir, "pages.npy"), mmap_mode=mode), meta.get("tombstones"))
+
+
+def _pages_for(chroma_client, ids: List[str]) -> List[int]:
+    pages = {}
+    for start in range(0, len(ids), 5000):
+        res = chroma_client.chunks.get(ids=ids[start:start + 5000], include=["metadatas"])
+        for cid, meta in zip(res.get("ids") or [], res.get("metadatas") or []):
+            page = (meta or {}).get("page")
+            pages[cid] = int(page) if page is not None else -1
+    return [pages.get(cid, -1) for cid in ids]
+
+
+def build_corpus_bm25(sparse_retriever, chroma_client) -> CorpusBM25Index:
+    """Merge every per-document BM25 index on disk; pages come from Chroma chunk metadata."""
+    sparse_retriever.flush()
+
+    def parts():
+        for doc_id in sparse_retriever.listDocuments():
+            try:
+                index = sparse_retriever.getIndex(doc_id)
+            except FileNotFoundError:
+                continue
+            yield doc_id, index, _pages_for(chroma_client, list(index.ids))
+
+    corpus = CorpusBM25Index.merge(parts())
+    if not corpus.doc_table:
+        raise ValueError("No BM25 indexes found to build the corpus index")
+    logger.info(f"Corpus BM25 index built: {len(corpus)} chunks, {len(corpus.doc_table)} documents")
+    return corpus
@@ -1,23 +1,58 @@
 # pythonService/app/retrieval/denseRetriever.py
 from typing import List, Dict
+from app.retrieval.candidate import Candidate
 
 class DenseRetriever:
-    def __init__(self, chroma_client, embedding_fn):
+    def __init__(self, chroma_client, embedding_fn, binary_index=None):
         self.chroma = chroma_client
         self.embed = embedding_fn
+        # optional BinaryIndex: Hamming prefilter + float rescoring per document
+        self.binary_index = binary_index
+
+    def _hydrate(self, hits: List[Dict]) -> List[Candidate]:
+        """Attach stored text + metadata to [{"id", "score"}] hits."""
+        if not hits:
+            return []
+        stored = self.chroma.get_chunks([h["id"] for h in hits])
+        by_id = {cid: (doc, meta) for cid, doc, meta in zip(stored["ids"], stored["documents"], stored["metadatas"])}
+        out = []
+        for h in hits:
+            if h["id"] not in by_id:
+                continue
+            text, meta = by_id[h["id"]]
+            out.append(Candidate.from_dense({"id": h["id"], "text": text, "meta": meta}, h["score"]))
+        return out
+
+    def query(self, collection_name: str, q: str, top_k: int=20, query_embedding=None) -> List[Candidate]:
+        """
+        query_embedding: precomputed embedding of q, so callers fanning out over
+        several documents only embed the query once.
+        """
+        if self.binary_index is not None and self.binary_index.has_document(collection_name):
+            vec = query_embedding if query_embedding is not None else self.embed(q)
+            return self._hydrate(self.binary_index.search(collection_name, vec, top_k=top_k))
+
+        if query_embedding is not None:
+            res = self.chroma.query_chunks(list(map(float, query_embedding)), n_results=top_k, where={"doc_id": collection_name})
+            return [
+                Candidate.from_dense(
+                    {"id": cid, "text": res["documents"][0][i], "meta": res["metadatas"][0][i]},
+                    1.0 - float(res["distances"][0][i]),
+                )
+                for i, cid in enumerate(res["ids"][0])
+            ]
 
-    def query(self, collection_name: str, q: str, top_k: int=20) -> List[Dict]:
         col = self.chroma.get_or_create_collection(collection_name)
         res = col.query(query_texts=[q], n_results=top_k,
                         include=["documents","metadatas","distances"])
         out = []
         for i, cid in enumerate(res["ids"][0]):
-            out.append({
-                "chunk": {
+            out.append(Candidate.from_dense(
+                {
                     "id": cid,
                     "text": res["documents"][0][i],
                     "meta": res["metadatas"][0][i],
                 },
-                "score": 1.0 - float(res["distances"][0][i]) if "distances" in res else 0.0,
-            })
+                1.0 - float(res["distances"][0][i]) if "distances" in res else 0.0,
+            ))
         return out
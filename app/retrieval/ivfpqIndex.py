@@ -0,0 +1,407 @@
+# app/retrieval/ivfpqIndex.py
+import os
+import json
+import shutil
+from typing import List, Dict, Optional, Iterable, Sequence, Tuple
+import numpy as np
+from app.retrieval.bm25Index import StringTable
+from app.utils.logger import getLogger
+
+logger = getLogger(__name__)
+
+
+def _assign(x: np.ndarray, centroids: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+    """Nearest centroid (L2) for every row of x, computed in batches to bound memory."""
+    c_norms = (centroids ** 2).sum(axis=1)
+    out = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), batch_size):
+        xb = x[start:start + batch_size]
+        # ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2 ; ||x||^2 is constant per row
+        dists = c_norms[None, :] - 2.0 * (xb @ centroids.T)
+        out[start:start + batch_size] = np.argmin(dists, axis=1)
+    return out
+
+
+def _kmeans(x: np.ndarray, k: int, n_iter: int = 20, seed: int = 0) -> np.ndarray:
+    """Plain Lloyd k-means. Empty clusters are re-seeded from random points."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(x))
+    centroids = x[rng.choice(len(x), k, replace=False)].astype(np.float32).copy()
+    for _ in range(n_iter):
+        assign = _assign(x, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=k)
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nonempty]
+        sums = np.add.reduceat(x[order], starts, axis=0)
+        centroids[nonempty] = sums / counts[nonempty, None]
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = x[rng.choice(len(x), len(empty), replace=False)]
+    return centroids
+
+
+def _sample(batches: Iterable[np.ndarray], size: int, seed: int = 0) -> Tuple[np.ndarray, int]:
+    """
+    Uniform sample of at most `size` rows from a stream of row batches
+    (reservoir sampling), so training never holds more than `size` vectors.
+    Returns (sample, rows seen).
+    """
+    rng = np.random.default_rng(seed)
+    sample, seen = None, 0
+    for x in batches:
+        if not len(x):
+            continue
+        if sample is None:
+            sample = np.empty((size, x.shape[1]), dtype=np.float32)
+        fill = min(len(x), max(0, size - seen))
+        sample[seen:seen + fill] = x[:fill]
+        rest = x[fill:]
+        if len(rest):
+            # row i of rest is stream element seen + fill + i; it replaces a random slot with prob size / (index + 1)
+            slots = rng.integers(0, seen + fill + np.arange(len(rest)) + 1)
+            keep = slots < size
+            sample[slots[keep]] = rest[keep]
+        seen += len(x)
+    if sample is None:
+        return np.empty((0, 0), dtype=np.float32), 0
+    return sample[:min(seen, size)], seen
+
+
+def _gather_strings(src_blob: np.ndarray, src_offsets: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Concatenated UTF-8 bytes of strings `rows` of a (blob, offsets) string table."""
+    starts = src_offsets[rows]
+    lens = src_offsets[rows + 1] - starts
+    if not lens.sum():
+        return np.empty(0, dtype=np.uint8)
+    within = np.arange(lens.sum()) - np.repeat(np.cumsum(lens) - lens, lens)
+    return src_blob[np.repeat(starts, lens) + within]
+
+
+def _open(index_dir: str, name: str, dtype, shape) -> np.ndarray:
+    return np.lib.format.open_memmap(os.path.join(index_dir, f"{name}.npy"), mode="w+", dtype=dtype, shape=shape)
+
+
+class IVFPQIndex:
+    """
+    Corpus-level approximate nearest neighbour index: inverted lists over a coarse
+    k-means quantizer, residuals compressed with product quantization.
+
+    Vectors are expected to be L2-normalized (see EmbeddingClient) so inner product
+    equals cosine similarity. Search scans `nprobe` lists with asymmetric distance
+    tables, then re-scores the best `rerank_k` candidates against the full-precision
+    vectors. Everything sized by the corpus (codes, vectors, chunk ids, per-document
+    row table) lives on disk and is memory-mapped; only the centroids and codebooks
+    are loaded. A docId filter whose documents hold at most `exact_max` entries is
+    answered by exact search over those rows instead of probing.
+    """
+
+    ARRAYS = ("list_offsets", "codes", "vectors", "entry_docs", "doc_offsets", "doc_rows")
+
+    def __init__(self, nlist: int = 1024, m: int = 48, nbits: int = 8,
+                 nprobe: int = 16, rerank_k: int = 100, train_size: int = 100_000, exact_max: int = 20_000):
+        self.nlist = nlist
+        self.m = m
+        self.nbits = nbits
+        self.nprobe = nprobe
+        self.rerank_k = rerank_k
+        self.train_size = train_size
+        self.exact_max = exact_max
+
+        self.dim: Optional[int] = None
+        self.centroids: Optional[np.ndarray] = None   # (nlist, dim)
+        self.codebooks: Optional[np.ndarray] = None   # (m, ksub, dsub)
+        # Entries are stored grouped by inverted list (CSR layout)
+        self.list_offsets: Optional[np.ndarray] = None  # (nlist + 1,)
+        self.codes: Optional[np.ndarray] = None       # (N, m) uint8
+        self.vectors: Optional[np.ndarray] = None     # (N, dim) float32, full precision
+        self.entry_docs: Optional[np.ndarray] = None  # (N,) index into doc_table
+        # entry rows of doc_table[d]: doc_rows[doc_offsets[d]:doc_offsets[d + 1]]
+        self.doc_offsets: Optional[np.ndarray] = None
+        self.doc_rows: Optional[np.ndarray] = None
+        self.chunk_ids: Sequence[str] = []  # StringTable once written
+        self.doc_table: List[str] = []
+        self._doc_index: Dict[str, int] = {}
+        self.tombstones: set = set()  # deleted docIds still encoded until the next rebuild
+
+    # ---------------- Build ----------------
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None and self.codebooks is not None
+
+    def train(self, vectors: np.ndarray, seed: int = 0):
+        x = np.ascontiguousarray(vectors, dtype=np.float32)
+        n, dim = x.shape
+        if dim % self.m != 0:
+            raise ValueError(f"Embedding dimension {dim} is not divisible by m={self.m}")
+        self.dim = dim
+        rng = np.random.default_rng(seed)
+        if n > self.train_size:
+            x = x[rng.choice(n, self.train_size, replace=False)]
+
+        # Keep ~39+ points per list, as k-means needs for stable centroids
+        self.nlist = max(1, min(self.nlist, len(x) // 39 or 1))
+        self.centroids = _kmeans(x, self.nlist, seed=seed)
+
+        residuals = x - self.centroids[_assign(x, self.centroids)]
+        ksub = min(2 ** self.nbits, len(x))
+        dsub = dim // self.m
+        self.codebooks = np.stack([
+            _kmeans(np.ascontiguousarray(residuals[:, j * dsub:(j + 1) * dsub]), ksub, seed=seed + j)
+            for j in range(self.m)
+        ])
+        logger.info(f"IVF-PQ trained: nlist={self.nlist}, m={self.m}, ksub={self.codebooks.shape[1]}, train_n={len(x)}")
+
+    def _encode(self, residuals: np.ndarray) -> np.ndarray:
+        dsub = self.dim // self.m
+        codes = np.empty((len(residuals), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = _assign(np.ascontiguousarray(residuals[:, j * dsub:(j + 1) * dsub]), self.codebooks[j])
+        return codes
+
+    def _doc_position(self, doc_id: str) -> int:
+        if doc_id not in self._doc_index:
+            self._doc_index[doc_id] = len(self.doc_table)
+            self.doc_table.append(doc_id)
+        return self._doc_index[doc_id]
+
+    def write(self, index_dir: str, batches: Iterable[Tuple[np.ndarray, List[str], List[str]]],
+              total: int, block: int = 65536):
+        """
+        Encode a stream of (vectors, chunk_ids, doc_ids) batches into index_dir
+        (an empty directory) and map the result. Each batch is encoded and
+        appended to memory-mapped staging arrays; entries are then regrouped by
+        inverted list `block` rows at a time. RAM holds one batch plus a few
+        integers per entry, never the vectors of the corpus.
+        total: number of vectors the stream yields (extra ones are skipped)
+        """
+        if not self.is_trained:
+            raise RuntimeError("IVFPQIndex must be trained before write()")
+        stage = os.path.join(index_dir, "staging")
+        os.makedirs(stage, exist_ok=True)
+        lists = np.empty(total, dtype=np.int32)
+        codes = _open(stage, "codes", np.uint8, (total, self.m))
+        vectors = _open(stage, "vectors", np.float32, (total, self.dim))
+        docs = _open(stage, "entry_docs", np.int32, (total,))
+        id_offsets = _open(stage, "id_offsets", np.int64, (total + 1,))
+        id_offsets[0] = 0
+        n = 0
+        with open(os.path.join(stage, "ids.bin"), "wb") as blob:
+            for x, chunk_ids, doc_ids in batches:
+                if n + len(x) > total:
+                    logger.warning(f"Corpus grew while the index was built; {n + len(x) - total}+ new vectors "
+                                   f"are left for the next rebuild")
+                    x, chunk_ids, doc_ids = x[:total - n], chunk_ids[:total - n], doc_ids[:total - n]
+                if not len(x):
+                    break
+                x = np.ascontiguousarray(x, dtype=np.float32)
+                end = n + len(x)
+                assign = _assign(x, self.centroids)
+                lists[n:end] = assign
+                codes[n:end] = self._encode(x - self.centroids[assign])
+                vectors[n:end] = x
+                docs[n:end] = [self._doc_position(d) for d in doc_ids]
+                encoded = [c.encode("utf-8") for c in chunk_ids]
+                id_offsets[n + 1:end + 1] = id_offsets[n] + np.cumsum([len(e) for e in encoded])
+                blob.write(b"".join(encoded))
+                n = end
+
+        # group by inverted list (CSR), block by block from the staging maps
+        order = np.argsort(lists[:n], kind="stable")
+        list_offsets = np.concatenate(([0], np.cumsum(np.bincount(lists[:n], minlength=self.nlist)))).astype(np.int64)
+        del lists
+        id_blob = (np.memmap(os.path.join(stage, "ids.bin"), dtype=np.uint8, mode="r")
+                   if id_offsets[n] else np.empty(0, dtype=np.uint8))
+        out_codes = _open(index_dir, "codes", np.uint8, (n, self.m))
+        out_vectors = _open(index_dir, "vectors", np.float32, (n, self.dim))
+        out_docs = _open(index_dir, "entry_docs", np.int32, (n,))
+        lens = np.diff(id_offsets[:n + 1])
+        out_id_offsets = np.concatenate(([0], np.cumsum(lens[order]))).astype(np.int64)
+        out_id_blob = _open(index_dir, "chunk_ids_blob", np.uint8, (int(out_id_offsets[-1]),))
+        for start in range(0, n, block):
+            rows = order[start:start + block]
+            end = start + len(rows)
+            out_codes[start:end] = codes[rows]
+            out_vectors[start:end] = vectors[rows]
+            out_docs[start:end] = docs[rows]
+            out_id_blob[out_id_offsets[start]:out_id_offsets[end]] = _gather_strings(id_blob, id_offsets, rows)
+        del order
+
+        # per-document row table for filtered search
+        doc_offsets = np.concatenate(([0], np.cumsum(np.bincount(out_docs, minlength=len(self.doc_table))))).astype(np.int64)
+        doc_rows = _open(index_dir, "doc_rows", np.int64, (n,))
+        doc_rows[:] = np.argsort(out_docs, kind="stable")
+
+        for arr in (out_codes, out_vectors, out_docs, out_id_blob, doc_rows):
+            arr.flush()
+        del codes, vectors, docs, id_offsets, id_blob, out_codes, out_vectors, out_docs, out_id_blob, doc_rows
+        shutil.rmtree(stage)
+        np.save(os.path.join(index_dir, "chunk_ids_offsets.npy"), out_id_offsets)
+        np.save(os.path.join(index_dir, "list_offsets.npy"), list_offsets)
+        np.save(os.path.join(index_dir, "doc_offsets.npy"), doc_offsets)
+        np.save(os.path.join(index_dir, "centroids.npy"), self.centroids)
+        np.save(os.path.join(index_dir, "codebooks.npy"), self.codebooks)
+        self.save_ids(index_dir)
+        with open(os.path.join(index_dir, "meta.json"), "w") as f:
+            json.dump({"nlist": self.nlist, "m": self.m, "nbits": self.nbits, "dim": self.dim,
+                       "nprobe": self.nprobe, "rerank_k": self.rerank_k, "exact_max": self.exact_max}, f)
+        self._map(index_dir)
+        logger.info(f"IVF-PQ index written to {index_dir} ({len(self)} vectors)")
+
+    # ---------------- Search ----------------
+    def delete_document(self, doc_id: str):
+        """Hide a document from search; its entries are dropped when the index is rebuilt."""
+        if doc_id in self._doc_index:
+            self.tombstones.add(doc_id)
+
+    def _doc_mask(self, doc_ids: Optional[Iterable[str]]) -> Optional[np.ndarray]:
+        if doc_ids is None and not self.tombstones:
+            return None
+        if doc_ids is None:
+            mask = np.ones(len(self.doc_table), dtype=bool)
+        else:
+            mask = np.zeros(len(self.doc_table), dtype=bool)
+            mask[[self._doc_index[d] for d in doc_ids if d in self._doc_index]] = True
+        mask[[self._doc_index[d] for d in self.tombstones]] = False
+        return mask
+
+    def _doc_subset(self, doc_ids: Iterable[str]) -> np.ndarray:
+        """Entry rows of the requested (not deleted) documents, sorted."""
+        docs = sorted(self._doc_index[d] for d in set(doc_ids) if d in self._doc_index and d not in self.tombstones)
+        if not docs:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate([self.doc_rows[self.doc_offsets[d]:self.doc_offsets[d + 1]] for d in docs]))
+
+    def _rescore(self, q: np.ndarray, rows: np.ndarray, top_k: int) -> List[Dict]:
+        # Full-precision scoring; sorted rows keep memory-mapped reads sequential
+        rows = np.sort(rows)
+        exact = np.asarray(self.vectors[rows], dtype=np.float32) @ q
+        best = np.argsort(-exact)[:top_k]
+        return [
+            {
+                "id": self.chunk_ids[rows[i]],
+                "doc_id": self.doc_table[self.entry_docs[rows[i]]],
+                "score": float(exact[i]),
+            }
+            for i in best
+        ]
+
+    def search(self, query: np.ndarray, top_k: int = 10, doc_ids: Optional[List[str]] = None,
+               nprobe: Optional[int] = None, rerank_k: Optional[int] = None) -> List[Dict]:
+        """
+        Returns [{"id": chunk_id, "doc_id": ..., "score": cosine}, ...] best first.
+        doc_ids restricts the search to those documents; None searches the whole corpus.
+        A selective doc_ids filter is searched exactly (at most exact_max rows), a
+        broader one probes proportionally more lists so as many allowed entries
+        are scanned as an unfiltered query would.
+        """
+        if not len(self.chunk_ids):
+            return []
+        q = np.asarray(query, dtype=np.float32).ravel()
+        nprobe = max(1, min(nprobe or self.nprobe, self.nlist))
+        rerank_k = max(top_k, rerank_k or self.rerank_k)
+
+        if doc_ids is not None:
+            subset = self._doc_subset(doc_ids)
+            if len(subset) <= max(self.exact_max, rerank_k):
+                return self._rescore(q, subset, top_k) if len(subset) else []
+            nprobe = min(self.nlist, int(np.ceil(nprobe * len(self) / len(subset))))
+
+        coarse = self.centroids @ q
+        probe = np.argpartition(-coarse, nprobe - 1)[:nprobe]
+        # Inner-product lookup table: q . (c + r) = q.c + sum_j q_j . codebook_j[code_j]
+        dsub = self.dim // self.m
+        lut = np.einsum("mkd,md->mk", self.codebooks, q.reshape(self.m, dsub))
+        sub = np.arange(self.m)[None, :]
+        allowed = self._doc_mask(doc_ids)
+
+        cand_rows, cand_scores = [], []
+        for lst in probe:
+            start, end = int(self.list_offsets[lst]), int(self.list_offsets[lst + 1])
+            if start == end:
+                continue
+            rows = np.arange(start, end)
+            if allowed is not None:
+                rows = rows[allowed[self.entry_docs[start:end]]]
+                if not len(rows):
+                    continue
+            approx = coarse[lst] + lut[sub, self.codes[rows]].sum(axis=1)
+            cand_rows.append(rows)
+            cand_scores.append(approx)
+
+        if not cand_rows:
+            return []
+        rows = np.concatenate(cand_rows)
+        approx = np.concatenate(cand_scores)
+        if len(rows) > rerank_k:
+            keep = np.argpartition(-approx, rerank_k - 1)[:rerank_k]
+            rows = rows[keep]
+        return self._rescore(q, rows, top_k)
+
+    # ---------------- Persistence ----------------
+    def save_ids(self, index_dir: str):
+        """Rewrite only the document table + tombstones (e.g. after delete_document)."""
+        with open(os.path.join(index_dir, "ids.json"), "w") as f:
+            json.dump({"doc_table": self.doc_table, "tombstones": sorted(self.tombstones)}, f)
+
+    def _map(self, index_dir: str, mmap: bool = True):
+        mode = "r" if mmap else None
+        self.centroids = np.load(os.path.join(index_dir, "centroids.npy"))
+        self.codebooks = np.load(os.path.join(index_dir, "codebooks.npy"))
+        for name in self.ARRAYS:
+            setattr(self, name, np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode=mode))
+        self.chunk_ids = StringTable.load(os.path.join(index_dir, "chunk_ids"), mmap=mmap)
+
+    @classmethod
+    def load(cls, index_dir: str, mmap: bool = True) -> Optional["IVFPQIndex"]:
+        """Load a saved index, or return None if none has been built yet."""
+        meta_path = os.path.join(index_dir, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        if not os.path.exists(os.path.join(index_dir, "doc_rows.npy")):
+            logger.warning(f"IVF-PQ index in {index_dir} predates the memory-mapped id table; "
+                           f"rebuild it with python -m app.scripts.buildCorpusIndex")
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        index = cls(nlist=meta["nlist"], m=meta["m"], nbits=meta["nbits"], nprobe=meta["nprobe"],
+                    rerank_k=meta["rerank_k"], exact_max=meta.get("exact_max", 20_000))
+        index.dim = meta["dim"]
+        index._map(index_dir, mmap=mmap)
+        with open(os.path.join(index_dir, "ids.json")) as f:
+            ids = json.load(f)
+        index.doc_table = ids["doc_table"]
+        index._doc_index = {d: i for i, d in enumerate(index.doc_table)}
+        index.tombstones = set(ids.get("tombstones", []))
+        logger.info(f"IVF-PQ index loaded from {index_dir} ({len(index)} vectors)")
+        return index
+
+
+def _chroma_batches(chroma_client, batch_size: int):
+    """(vectors, chunk_ids, doc_ids) per Chroma page; zero vectors (layout placeholders written by pdfToJson) are skipped."""
+    for batch_ids, embeddings, metadatas in chroma_client.iter_chunk_embeddings(batch_size=batch_size):
+        vecs = np.asarray(embeddings, dtype=np.float32)
+        keep = np.linalg.norm(vecs, axis=1) > 0
+        yield (vecs[keep],
+               [i for i, k in zip(batch_ids, keep) if k],
+               [(m or {}).get("doc_id", "") for m, k in zip(metadatas, keep) if k])
+
+
+def build_corpus_index(chroma_client, index_dir: str, batch_size: int = 5000, **params) -> IVFPQIndex:
+    """
+    Build an IVF-PQ index in index_dir (created; must not hold an index yet) from
+    every text chunk embedding stored in Chroma, in two streaming passes: a
+    reservoir sample of train_size vectors for training, then batch encoding.
+    """
+    index = IVFPQIndex(**params)
+    sample, total = _sample((v for v, _, _ in _chroma_batches(chroma_client, batch_size)), index.train_size)
+    if not total:
+        raise ValueError("No chunk embeddings found to build the corpus index")
+    index.train(sample)
+    del sample
+    os.makedirs(index_dir, exist_ok=True)
+    index.write(index_dir, _chroma_batches(chroma_client, batch_size), total)
+    return index
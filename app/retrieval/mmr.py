@@ -0,0 +1,43 @@
+# app/retrieval/mmr.py
+from typing import List
+import numpy as np
+
+
+def mmr_select(vectors: np.ndarray, relevance: np.ndarray, k: int, lam: float = 0.7) -> List[int]:
+    """
+    Maximal Marginal Relevance over n candidates, vectorized.
+
+    vectors: (n, d) candidate embeddings (rows of zeros are never penalized)
+    relevance: (n,) relevance scores, rescaled here to [0, 1]
+    lam: 1.0 ranks purely by relevance, lower values trade relevance for novelty
+
+    Returns the indices of the k selected candidates in selection order. The
+    pairwise cosine matrix is computed once; each step only updates the
+    running max-similarity to the selected set (O(n) per step), floored
+    at 0 so dissimilar candidates are not rewarded.
+    """
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    rel = np.asarray(relevance, dtype=np.float64)
+    span = rel.max() - rel.min()
+    rel = (rel - rel.min()) / span if span > 0 else np.ones(n)
+    if lam >= 1.0:
+        return [int(i) for i in np.argsort(-rel, kind="stable")[:k]]
+
+    v = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(v, axis=1, keepdims=True)
+    v = v / np.where(norms > 0, norms, 1.0)
+    sim = v @ v.T
+
+    max_sim = np.zeros(n)
+    available = np.ones(n, dtype=bool)
+    selected: List[int] = []
+    for _ in range(k):
+        mmr = np.where(available, lam * rel - (1.0 - lam) * max_sim, -np.inf)
+        i = int(np.argmax(mmr))
+        selected.append(i)
+        available[i] = False
+        np.maximum(max_sim, sim[i], out=max_sim)
+    return selected
@@ -0,0 +1,106 @@
+# app/retrieval/onnxCrossEncoder.py
+from pathlib import Path
+from typing import Callable, List, Sequence, Tuple
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    import onnxruntime as ort
+    ONNX_AVAILABLE = True
+except Exception:
+    ONNX_AVAILABLE = False
+
+MODEL_FILE = "model_int8.onnx"
+
+
+class OnnxCrossEncoder:
+    """
+    int8 ONNX Runtime export of a sentence-transformers CrossEncoder (see
+    export_quantized). predict() has the CrossEncoder signature so Reranker
+    can use either backend; it returns raw logits like CrossEncoder.predict.
+    """
+
+    def __init__(self, model_dir: str, max_length: int = 256, threads: int = 0):
+        if not ONNX_AVAILABLE:
+            raise RuntimeError("onnxruntime is not installed")
+        from transformers import AutoTokenizer
+
+        model_path = Path(model_dir) / MODEL_FILE
+        if not model_path.exists():
+            raise FileNotFoundError(f"No ONNX reranker at {model_path}; run app.scripts.exportOnnxReranker")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.max_length = max_length
+
+    def predict(self, pairs: Sequence[Tuple[str, str]], batch_size: int = 32,
+                show_progress_bar: bool = False) -> np.ndarray:
+        scores = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            enc = self.tokenizer([q for q, _ in batch], [t for _, t in batch], padding=True,
+                                 truncation="longest_first", max_length=self.max_length, return_tensors="np")
+            logits = self.session.run(None, {n: enc[n].astype(np.int64) for n in self.input_names})[0]
+            scores.append(logits[:, 0] if logits.ndim == 2 else logits)
+        return np.concatenate(scores) if scores else np.empty(0, dtype=np.float32)
+
+
+def export_quantized(model_name: str, out_dir: str, opset: int = 17) -> Path:
+    """
+    Export model_name to ONNX and quantize its weights to int8 (dynamic
+    quantization: int8 MatMul weights, activations quantized at run time).
+    Writes MODEL_FILE and the tokenizer to out_dir.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+    sample = tokenizer(["what is the approval process"], ["Requests are approved by the budget owner."],
+                       return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    dynamic_axes = {n: {0: "batch", 1: "sequence"} for n in names}
+    dynamic_axes["logits"] = {0: "batch"}
+
+    fp32_path = out / "model_fp32.onnx"
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(sample[n] for n in names), str(fp32_path), input_names=names,
+                          output_names=["logits"], dynamic_axes=dynamic_axes, opset_version=opset)
+    quantize_dynamic(str(fp32_path), str(out / MODEL_FILE), weight_type=QuantType.QInt8)
+    fp32_path.unlink()
+    tokenizer.save_pretrained(str(out))
+    logger.info(f"Exported int8 ONNX cross-encoder {model_name} -> {out / MODEL_FILE}")
+    return out / MODEL_FILE
+
+
+def spearman(a: Sequence[float], b: Sequence[float]) -> float:
+    """Spearman rank correlation (average ranks for ties)."""
+    def ranks(x):
+        _, inverse, counts = np.unique(np.asarray(x, dtype=np.float64), return_inverse=True, return_counts=True)
+        return (np.cumsum(counts) - (counts + 1) / 2)[inverse]
+    ra, rb = ranks(a), ranks(b)
+    ra, rb = ra - ra.mean(), rb - rb.mean()
+    denom = np.sqrt((ra ** 2).sum() * (rb ** 2).sum())
+    return float((ra * rb).sum() / denom) if denom > 0 else 1.0
+
+
+def rank_fidelity(reference: Callable, candidate: Callable,
+                  queries: List[Tuple[str, List[str]]]) -> Tuple[float, float]:
+    """
+    (mean, min) per-query Spearman correlation between the scores of two
+    predict functions over each query's candidate texts.
+    """
+    rhos = []
+    for query, texts in queries:
+        pairs = [(query, t) for t in texts]
+        rhos.append(spearman(reference(pairs), candidate(pairs)))
+    return float(np.mean(rhos)), float(np.min(rhos))
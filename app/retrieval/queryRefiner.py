@@ -1,16 +1,12 @@
 # app/rag/queryRefiner.py
 import json
-import re
 from typing import Dict, List
 from app.llm.llmClient import llmClient
 from app.rag.prompts import RQ_PROMPT
 from app.embeddings.embeddingClient import EmbeddingClient
+from app.utils.textAnalyzer import analyzer, normalize, tokenize, STOPWORDS
 import numpy as np
 
-_stopwords = {
-    "the","is","at","which","on","a","an","and","or","in","for","to","of","by","with","as","that","this"
-}
-
 _synonymMap = {
     "price": ["cost", "pricing"],
     "error": ["issue", "problem", "fault"],
@@ -19,15 +15,18 @@ _synonymMap = {
 
 embeddingClient = EmbeddingClient()
 SIMILARITY_THRESHOLD = 0.75
+llmClient.register_prefix("query_refiner", RQ_PROMPT.split("{question}")[0])
 
 def _basic_preprocess(query: str) -> str:
-    q = query.strip().lower()
-    q = re.sub(r"\s+", " ", q)
-    return q
+    return normalize(query)
+
+def _content_tokens(query: str) -> List[str]:
+    # unstemmed so variants can substitute them back into the query text
+    return [t for t in tokenize(query) if t not in STOPWORDS]
 
 def _fallback_variants(query: str) -> List[str]:
     refined = _basic_preprocess(query)
-    tokens = [t for t in re.split(r"\W+", refined) if t and t not in _stopwords]
+    tokens = _content_tokens(refined)
     variants = {refined}
     for tok in tokens:
         if tok in _synonymMap:
@@ -48,12 +47,7 @@ def _intent_to_weights(intent: str) -> Dict[str, float]:
     return {"bm25": 0.5, "dense": 0.5}
 
 def _cheap_keywords(s: str, cap: int = 10) -> List[str]:
-    toks = [t for t in re.findall(r"[a-z0-9\-]+", s.lower()) if t not in _stopwords and len(t) > 2]
-    uniq = []
-    for t in toks:
-        if t not in uniq:
-            uniq.append(t)
-    return uniq[:cap]
+    return analyzer.keywords(s, cap=cap)
 
 def _extract_json(s: str) -> str:
     start = s.find("{")
@@ -92,7 +86,7 @@ def refine_query_intelligent(query: str) -> Dict:
     except Exception:
         # Fall back to heuristic
         refinedQuery = _basic_preprocess(original)
-        tokens = [t for t in re.split(r"\W+", refinedQuery) if t and t not in _stopwords]
+        tokens = _content_tokens(refinedQuery)
         if tokens:
             subQueries = [" ".join(tokens)]
         keywords = _cheap_keywords(refinedQuery)
@@ -1,6 +1,11 @@
 # app/retrieval/reranker.py
-from typing import List, Dict
+from concurrent.futures import Future
+from typing import List, Optional, Sequence, Tuple
+import hashlib
 import logging
+import queue
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -10,81 +15,270 @@ try:
 except Exception:
     CROSS_ENCODER_AVAILABLE = False
 
+from app.config import (
+    RERANK_MODEL_NAME, RERANK_BATCH_SIZE, RERANK_MAX_LENGTH, RERANK_TORCH_THREADS,
+    RERANK_COALESCE_WINDOW, RERANK_MAX_COALESCED_PAIRS,
+    RERANK_CACHE_ENABLED, RERANK_CACHE_MAX_ITEMS, RERANK_CACHE_TTL,
+    RERANK_CASCADE_M, RERANK_CASCADE_STAGE, RERANK_BACKEND, RERANK_ONNX_DIR,
+)
 from app.embeddings.embeddingClient import EmbeddingClient
+from app.retrieval.candidate import Candidate
+from app.retrieval.onnxCrossEncoder import OnnxCrossEncoder
+from app.utils.cache import BoundedCache
+from app.utils.metrics import metrics
+from app.utils.textAnalyzer import normalize
 import numpy as np
-from numpy.linalg import norm
 from scipy.special import expit  # sigmoid for normalizing CrossEncoder scores
 
+# pairs per coalesced forward pass (histogram upper bounds)
+BATCH_PAIR_BUCKETS = (8, 16, 32, 64, 128, 256, 512)
+# characters kept per chunk before tokenization; the tokenizer truncates to
+# max_length anyway, this only avoids tokenizing text that would be cut
+CHARS_PER_TOKEN = 6
+
+
+def _set_torch_threads(n: int):
+    try:
+        import torch
+        torch.set_num_threads(n)
+        logger.info(f"Reranker: torch intra-op threads = {n}")
+    except Exception as e:
+        logger.warning(f"Could not set torch threads to {n}: {e}")
+
+
+class RerankBatcher:
+    """
+    Coalesces (query, chunk) pairs from concurrent rerank calls into shared
+    forward passes. The first waiting call opens a window of `window` seconds
+    (or until max_pairs are queued); everything queued by then is scored in
+    one call to score_fn and the scores are split back per caller.
+    """
+
+    def __init__(self, score_fn, window: float, max_pairs: int):
+        self.score_fn = score_fn
+        self.window = window
+        self.max_pairs = max_pairs
+        self.queue: "queue.Queue[Tuple[Sequence[Tuple[str, str]], Future]]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def score(self, pairs: Sequence[Tuple[str, str]]) -> np.ndarray:
+        fut: Future = Future()
+        self.queue.put((pairs, fut))
+        self._ensure_worker()
+        return fut.result()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="rerank-batcher", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            jobs = [self.queue.get()]
+            n = len(jobs[0][0])
+            deadline = time.monotonic() + self.window
+            while n < self.max_pairs:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                jobs.append(job)
+                n += len(job[0])
+            self._run(jobs)
+
+    def _run(self, jobs):
+        pairs = [p for job_pairs, _ in jobs for p in job_pairs]
+        try:
+            scores = self.score_fn(pairs)
+        except Exception as e:
+            for _, fut in jobs:
+                fut.set_exception(e)
+            return
+        metrics.observe("rerank.batch.pairs", len(pairs), buckets=BATCH_PAIR_BUCKETS)
+        metrics.inc("rerank.batch.requests", len(jobs))
+        offset = 0
+        for job_pairs, fut in jobs:
+            fut.set_result(scores[offset:offset + len(job_pairs)])
+            offset += len(job_pairs)
+
+
 class Reranker:
     def __init__(
         self,
-        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        model_name: str = RERANK_MODEL_NAME,
         normalize_scores: bool = True,  # optional: map scores to 0..1
+        batch_size: int = RERANK_BATCH_SIZE,
+        max_length: int = RERANK_MAX_LENGTH,
+        torch_threads: int = RERANK_TORCH_THREADS,
+        coalesce_window: float = RERANK_COALESCE_WINDOW,
+        cascade_m: int = RERANK_CASCADE_M,
+        cascade_stage: str = RERANK_CASCADE_STAGE,
+        backend: str = RERANK_BACKEND,
     ):
+        """
+        batch_size: pairs per forward pass; pairs are sorted by length first so
+            each batch pads to similar lengths
+        max_length: tokens per (query, chunk) pair, longer pairs are truncated
+        torch_threads: intra-op threads for the cross-encoder (0 keeps torch's default)
+        coalesce_window: seconds concurrent requests wait to share a forward pass (0 disables)
+        cascade_m: candidates the cheap first stage passes on to the cross-encoder (0 disables)
+        cascade_stage: first-stage scorer, "retrieval" (the fused dense+BM25 score
+            already on each candidate) or the name of a small distilled cross-encoder
+        backend: "torch" (float32 sentence-transformers) or "onnx" (int8 ONNX Runtime
+            export of the same model in RERANK_ONNX_DIR; falls back to torch)
+        """
         self.model_name = model_name
         self.model = None
+        self.backend = None
         self.normalize_scores = normalize_scores
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.batcher = None
+        self.cascade_m = cascade_m
+        self.stage1_model = None
 
-        if CROSS_ENCODER_AVAILABLE:
+        if backend == "onnx":
             try:
-                self.model = CrossEncoder(self.model_name)
-                logger.info(f"CrossEncoder loaded: {self.model_name}")
+                self.model = OnnxCrossEncoder(str(RERANK_ONNX_DIR), max_length=max_length, threads=torch_threads)
+                self.backend = "onnx-int8"
+                logger.info(f"ONNX int8 cross-encoder loaded from {RERANK_ONNX_DIR}")
             except Exception as e:
-                logger.warning(f"Failed to load CrossEncoder '{self.model_name}': {e}")
-                self.model = None
+                logger.warning(f"ONNX reranker unavailable, using torch: {e}")
+        if CROSS_ENCODER_AVAILABLE:
+            if torch_threads:
+                _set_torch_threads(torch_threads)
+            if self.model is None:
+                try:
+                    self.model = CrossEncoder(self.model_name, max_length=max_length)
+                    self.backend = "torch"
+                    logger.info(f"CrossEncoder loaded: {self.model_name} (max_length={max_length})")
+                except Exception as e:
+                    logger.warning(f"Failed to load CrossEncoder '{self.model_name}': {e}")
+                    self.model = None
+            if self.model is not None and cascade_m and cascade_stage != "retrieval":
+                try:
+                    self.stage1_model = CrossEncoder(cascade_stage, max_length=max_length)
+                    logger.info(f"Cascade first stage loaded: {cascade_stage}")
+                except Exception as e:
+                    logger.warning(f"Failed to load cascade model '{cascade_stage}', using retrieval scores: {e}")
+        if self.model is not None and coalesce_window > 0:
+            self.batcher = RerankBatcher(self.predict, coalesce_window, RERANK_MAX_COALESCED_PAIRS)
+
+        # cross-encoder scores keyed by (query hash, chunk id, model name, doc id);
+        # doc id rides along so a re-ingested or deleted document can be dropped
+        self.score_cache: Optional[BoundedCache] = None
+        if RERANK_CACHE_ENABLED:
+            self.score_cache = BoundedCache("rerank_cache", max_items=RERANK_CACHE_MAX_ITEMS, ttl=RERANK_CACHE_TTL)
 
         # embedding fallback
         self.embedder = EmbeddingClient()
 
-    def rerank(self, query: str, candidates: List[Dict], top_k: int = 5) -> List[Dict]:
+    def predict(self, pairs: Sequence[Tuple[str, str]], model=None) -> np.ndarray:
+        """Cross-encoder scores for (query, text) pairs, in input order, in length-sorted batches."""
+        model = model or self.model
+        max_chars = self.max_length * CHARS_PER_TOKEN
+        pairs = [(q, t[:max_chars]) for q, t in pairs]
+        order = np.argsort([len(q) + len(t) for q, t in pairs], kind="stable")
+        scores = np.empty(len(pairs), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            scores[idx] = model.predict([pairs[i] for i in idx], batch_size=len(idx),
+                                        show_progress_bar=False)
+        return expit(scores) if self.normalize_scores else scores  # map to 0..1
+
+    def _cache_keys(self, query: str, candidates: List[Candidate]) -> List[Tuple]:
+        query_hash = hashlib.md5(normalize(query).encode("utf-8")).hexdigest()
+        model = f"{self.model_name}:{self.backend}"  # int8 and float32 scores are not interchangeable
+        return [(query_hash, c.id or hashlib.md5(c.text.encode("utf-8")).hexdigest(), model, c.doc_id)
+                for c in candidates]
+
+    def _cross_encoder_scores(self, query: str, candidates: List[Candidate]) -> np.ndarray:
+        """Scores from the cache where present; only the uncached pairs go to the model."""
+        scores = np.empty(len(candidates), dtype=np.float32)
+        keys, missing = None, list(range(len(candidates)))
+        if self.score_cache is not None:
+            keys, missing = self._cache_keys(query, candidates), []
+            for i, key in enumerate(keys):
+                cached = self.score_cache.get(key)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    scores[i] = cached
+        if missing:
+            pairs = [(query, candidates[i].text) for i in missing]
+            fresh = self.batcher.score(pairs) if self.batcher is not None else self.predict(pairs)
+            scores[missing] = fresh
+            if keys is not None:
+                for i, s in zip(missing, fresh):
+                    self.score_cache.put(keys[i], float(s))
+        metrics.inc("rerank.pairs_scored", len(missing))
+        return scores
+
+    def _stage1_scores(self, query: str, candidates: List[Candidate]) -> np.ndarray:
+        if self.stage1_model is not None:
+            return self.predict([(query, c.text) for c in candidates], model=self.stage1_model)
+        return np.array([c.score for c in candidates], dtype=np.float32)
+
+    def _cascade_scores(self, query: str, candidates: List[Candidate]) -> np.ndarray:
         """
-        candidates: list of {"chunk": {"id":..., "text":..., "meta":...}, "score": ...}
-        Returns candidates with added 'rerank_score' sorted descending.
+        Cheap first stage over every candidate; only its top cascade_m go to the
+        cross-encoder. The rest rank below every finalist, in first-stage order.
+        """
+        n, m = len(candidates), self.cascade_m
+        if not m or n <= m:
+            return self._cross_encoder_scores(query, candidates)
+        order = np.argsort(-self._stage1_scores(query, candidates), kind="stable")
+        finalists, cut = order[:m], order[m:]
+        scores = np.empty(n, dtype=np.float32)
+        scores[finalists] = self._cross_encoder_scores(query, [candidates[i] for i in finalists])
+        low = float(scores[finalists].min())
+        steps = np.arange(1, len(cut) + 1) / (len(cut) + 1)
+        scores[cut] = low * (1 - steps) if low > 0 else low - steps
+        metrics.inc("rerank.cascade.cut", len(cut))
+        return scores
+
+    def invalidate_document(self, doc_id: str) -> int:
+        """Drop cached scores for doc_id's chunks (re-ingest / delete). Returns the number dropped."""
+        if self.score_cache is None:
+            return 0
+        return self.score_cache.invalidate(lambda key: key[3] == doc_id)
+
+    def _embedding_scores(self, query: str, texts: List[str]) -> np.ndarray:
+        """Cosine of each text to the query in one matrix-vector product."""
+        qv = np.asarray(self.embedder.generateEmbedding(query), dtype=np.float32)
+        docs = np.asarray(self.embedder.generateEmbeddings(texts), dtype=np.float32)
+        sims = docs @ qv / ((np.linalg.norm(docs, axis=1) + 1e-12) * (np.linalg.norm(qv) + 1e-12))
+        return 0.5 + 0.5 * sims if self.normalize_scores else sims  # map cosine from [-1,1] to [0,1]
+
+    def rerank(self, query: str, candidates: List[Candidate], top_k: int = 5) -> List[Candidate]:
+        """
+        Returns candidates with rerank_score set, sorted descending.
         """
         if not candidates:
             return []
 
-        # Prepare texts and valid candidates
-        texts = []
-        valid_candidates = []
-        for c in candidates:
-            chunk = c.get("chunk")
-            text = chunk.get("text") if isinstance(chunk, dict) else str(chunk)
-            texts.append(text)
-            valid_candidates.append(c)
+        valid_candidates = [Candidate.coerce(c) for c in candidates]
+        texts = [c.text for c in valid_candidates]
 
         try:
-            if self.model is not None:
-                # CrossEncoder scoring
-                pairs = [(query, t) for t in texts]
-                scores = self.model.predict(pairs)
-                if self.normalize_scores:
-                    scores = [float(expit(s)) for s in scores]  # map to 0..1
-                for cand, s in zip(valid_candidates, scores):
-                    cand["rerank_score"] = float(s)
-                    logger.debug(f"Candidate {cand['chunk'].get('id')}: rerank_score={s}")
-                reranked = sorted(valid_candidates, key=lambda x: x["rerank_score"], reverse=True)
-                logger.info("Reranker: used CrossEncoder")
-                return reranked[:top_k]
-            else:
-                # Embedding fallback
-                emb_q = self.embedder.generateEmbedding(query)
-                emb_docs = self.embedder.generateEmbeddings(texts)
-                sims = []
-                qv = np.array(emb_q, dtype=float)
-                qnorm = norm(qv) + 1e-12
-                for v in emb_docs:
-                    vv = np.array(v, dtype=float)
-                    sim = float(np.dot(qv, vv) / (qnorm * (norm(vv) + 1e-12)))
-                    if self.normalize_scores:
-                        sim = 0.5 + 0.5 * sim  # map cosine from [-1,1] to [0,1]
-                    sims.append(sim)
-                for cand, s in zip(valid_candidates, sims):
-                    cand["rerank_score"] = float(s)
-                    logger.debug(f"Candidate {cand['chunk'].get('id')}: rerank_score={s}")
-                reranked = sorted(valid_candidates, key=lambda x: x["rerank_score"], reverse=True)
-                logger.info("Reranker: used embedding fallback")
-                return reranked[:top_k]
+            with metrics.timer("rerank.seconds"):
+                if self.model is not None:
+                    scores = self._cascade_scores(query, valid_candidates)
+                    source = f"CrossEncoder ({self.backend})"
+                else:
+                    scores = self._embedding_scores(query, texts)
+                    source = "embedding fallback"
+            metrics.inc("rerank.candidates", len(texts))
+            for cand, s in zip(valid_candidates, scores):
+                cand.rerank_score = float(s)
+            reranked = sorted(valid_candidates, key=lambda c: c.rerank_score, reverse=True)
+            logger.info(f"Reranker: used {source} on {len(texts)} candidates")
+            return reranked[:top_k]
         except Exception as e:
             logger.exception(f"Reranker failed: {e}")
             # fallback: return original order
@@ -92,4 +286,3 @@ class Reranker:
 
 # singleton instance
 reranker = Reranker()
-
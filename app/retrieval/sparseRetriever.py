@@ -1,8 +1,18 @@
 # app/retrievers/sparseRetriever.py
 import os
+import time
 import pickle
-from rank_bm25 import BM25Okapi
-from typing import List, Dict
+import shutil
+import threading
+from typing import Callable, List, Dict, Optional
+from app.retrieval.bm25Index import BM25Index, BM25Builder
+from app.utils.textAnalyzer import Analyzer, analyzer
+from app.utils.cache import BoundedCache
+from app.utils.fileUtils import replace_dir, recover_dir
+from app.utils.metrics import metrics
+from app.config import (
+    BM25_FLUSH_INTERVAL, SPARSE_CACHE_MAX_BYTES, SPARSE_CACHE_POLICY, BM25_DYNAMIC_PRUNING, BM25_KEYWORD_BOOST
+)
 from app.utils.logger import getLogger
 
 logger = getLogger(__name__)
@@ -11,70 +21,221 @@ CACHE_DIR = "pythonService/data/cache/bm25"
 os.makedirs(CACHE_DIR, exist_ok=True)
 
 class SparseRetriever:
-    def __init__(self):
-        self.indices = {}  # in-memory cache {doc_id: BM25Okapi}
-        self._cached_chunks = {}  # {doc_id: chunks}
-        self._cached_ids = {}     # {doc_id: ids}
+    def __init__(self, cache_dir: str = CACHE_DIR, flush_interval: float = BM25_FLUSH_INTERVAL,
+                 max_bytes: int = SPARSE_CACHE_MAX_BYTES, policy: str = SPARSE_CACHE_POLICY):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        # loaded indexes {doc_id: BM25Index}, bounded by memory; evicted ones reload lazily via mmap
+        self.indices = BoundedCache("sparse_index_cache", max_bytes=max_bytes, policy=policy,
+                                    sizeof=lambda index: index.memory_bytes())
+        self.builders: Dict[str, BM25Builder] = {}  # docs with appended/deleted chunks not yet on disk
+        self.dirty_since: Dict[str, float] = {}
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()
+        self._flusher: Optional[threading.Thread] = None
+        self._analyzers: Dict[str, Analyzer] = {}
+        self._listeners: List[Callable[[str], None]] = []
+
+    def on_change(self, fn: Callable[[str], None]):
+        """Register fn(doc_id), called whenever a document's chunks change (rebuild, append or delete)."""
+        self._listeners.append(fn)
+
+    def _changed(self, doc_id: str):
+        for fn in self._listeners:
+            fn(doc_id)
 
     def _get_cache_path(self, doc_id: str) -> str:
-        return os.path.join(CACHE_DIR, f"{doc_id}.pkl")
-
+        return os.path.join(self.cache_dir, doc_id)
+
+    def _get_legacy_path(self, doc_id: str) -> str:
+        # pickled rank_bm25 objects written by earlier versions
+        return os.path.join(self.cache_dir, f"{doc_id}.pkl")
+
+    def _tokenize(self, text: str, signature: Optional[Dict] = None) -> List[str]:
+        """Tokens as produced by the analyzer an index was built with."""
+        if signature is None:  # indexes built before the shared analyzer
+            return text.lower().split()
+        if signature == analyzer.signature:
+            return analyzer.analyze(text)
+        key = repr(sorted(signature.items()))
+        if key not in self._analyzers:
+            self._analyzers[key] = Analyzer.from_signature(signature)
+        return self._analyzers[key].analyze(text)
+
+    def _save(self, doc_id: str, index: BM25Index):
+        # write next to the live index, then swap, so readers never see a partial directory
+        path = self._get_cache_path(doc_id)
+        tmp = f"{path}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        index.save(tmp)
+        replace_dir(tmp, path)
 
-    
     def indexDocument(self, doc_id: str, chunks: List[str], ids: List[str]):
         """
-        Build BM25 index for a document and cache it.
+        Build BM25 index for a document and cache it (replaces any existing chunks).
         """
-        tokenized_chunks = [chunk.lower().split() for chunk in chunks]
-        bm25 = BM25Okapi(tokenized_chunks)
-
-        # Store chunks, ids, and BM25 model in cache
-        cache_data = {"chunks": chunks, "ids": ids, "bm25": bm25}
-        self.indices[doc_id] = bm25
-        self._cached_chunks[doc_id] = chunks
-        self._cached_ids[doc_id] = ids
-
-        with open(self._get_cache_path(doc_id), "wb") as f:
-            pickle.dump(cache_data, f)
-
+        tokenized = [analyzer.analyze(c) for c in chunks]
+        index = BM25Index.build(tokenized, ids, chunks, analyzer=analyzer.signature)
+        with self.lock:
+            self.builders.pop(doc_id, None)
+            self.dirty_since.pop(doc_id, None)
+            self._save(doc_id, index)
+            self.indices.put(doc_id, BM25Index.load(self._get_cache_path(doc_id)))
+        self._changed(doc_id)
         logger.info(f"BM25 index built and cached for document {doc_id}")
 
-
-    def _load_index(self, doc_id: str):
-        if doc_id in self.indices:
-            return self.indices[doc_id]
-
-        path = self._get_cache_path(doc_id)
-        if not os.path.exists(path):
-            raise FileNotFoundError(f"No BM25 cache found for doc_id={doc_id}")
-
-        with open(path, "rb") as f:
-            data = pickle.load(f)
-            bm25 = data["bm25"]
-            self.indices[doc_id] = bm25
-            self._cached_chunks[doc_id] = data["chunks"]
-            self._cached_ids[doc_id] = data["ids"]
-            return bm25
-
-    def query(self, doc_id: str, query: str, top_k: int = 5) -> List[Dict]:
+    # ---------------- Incremental updates ----------------
+    def _builder(self, doc_id: str) -> BM25Builder:
+        builder = self.builders.get(doc_id)
+        if builder is None:
+            try:
+                builder = BM25Builder.from_index(self._load_index(doc_id))
+            except FileNotFoundError:
+                builder = BM25Builder(analyzer=analyzer.signature)
+            self.builders[doc_id] = builder
+        return builder
+
+    def _mark_dirty(self, doc_id: str):
+        self.indices.pop(doc_id, None)  # next query freezes the builder
+        self.dirty_since.setdefault(doc_id, time.time())
+        if self.flush_interval > 0 and self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="bm25-flush", daemon=True)
+            self._flusher.start()
+
+    def appendChunks(self, doc_id: str, chunks: List[str], ids: List[str]):
+        """
+        Add chunks to a document's index without rebuilding it. Changes are
+        searchable immediately and reach disk on flush() or the flush timer.
+        """
+        with self.lock:
+            builder = self._builder(doc_id)
+            signature = builder.params["analyzer"]
+            builder.append([self._tokenize(c, signature) for c in chunks], ids, chunks)
+            self._mark_dirty(doc_id)
+        self._changed(doc_id)
+
+    def deleteChunks(self, doc_id: str, ids: List[str]) -> int:
+        with self.lock:
+            removed = self._builder(doc_id).delete(ids)
+            if removed:
+                self._mark_dirty(doc_id)
+        if removed:
+            self._changed(doc_id)
+        return removed
+
+    def flush(self, doc_id: Optional[str] = None):
+        """Write pending changes for one document (or all documents) to disk."""
+        with self.lock:
+            targets = [doc_id] if doc_id is not None else list(self.builders)
+            for d in targets:
+                builder = self.builders.pop(d, None)
+                if builder is None:
+                    continue
+                self.dirty_since.pop(d, None)
+                self._save(d, builder.freeze())
+                self.indices.put(d, BM25Index.load(self._get_cache_path(d)))
+                logger.info(f"BM25 index flushed for document {d}: {builder.stats()}")
+
+    def discard(self, doc_id: str):
+        """
+        Abandon a document whose ingest failed: its unflushed builder is dropped
+        before the flush timer can write it, and anything already on disk
+        (an earlier flush or a half-written swap) is removed.
+        """
+        with self.lock:
+            self.deleteDocument(doc_id)
+            for leftover in (".tmp", ".old"):
+                shutil.rmtree(f"{self._get_cache_path(doc_id)}{leftover}", ignore_errors=True)
+        logger.info(f"BM25 index discarded for document {doc_id}")
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            now = time.time()
+            with self.lock:
+                stale = [d for d, t in self.dirty_since.items() if now - t >= self.flush_interval]
+            for d in stale:
+                try:
+                    self.flush(d)
+                except Exception as e:
+                    logger.error(f"BM25 timed flush failed for {d}: {e}")
+
+    def _load_index(self, doc_id: str) -> BM25Index:
+        with self.lock:
+            index = self.indices.get(doc_id)
+            if index is not None:
+                return index
+            if doc_id in self.builders:
+                index = self.builders[doc_id].freeze()
+                self.indices.put(doc_id, index)
+                return index
+
+        with metrics.timer("sparse_index_cache.load_seconds"):
+            recover_dir(self._get_cache_path(doc_id))
+            index = BM25Index.load(self._get_cache_path(doc_id))
+        if index is None:
+            legacy = self._get_legacy_path(doc_id)
+            if not os.path.exists(legacy):
+                raise FileNotFoundError(f"No BM25 cache found for doc_id={doc_id}")
+            # one-time migration from the pickle format
+            with open(legacy, "rb") as f:
+                data = pickle.load(f)
+            self.indexDocument(doc_id, data["chunks"], data["ids"])
+            os.remove(legacy)
+            index = BM25Index.load(self._get_cache_path(doc_id))
+
+        self.indices.put(doc_id, index)
+        return index
+
+    def getIndex(self, doc_id: str) -> BM25Index:
+        """The document's current BM25Index (raises FileNotFoundError if it has none)."""
+        return self._load_index(doc_id)
+
+    def query(self, doc_id: str, query: str, top_k: int = 5, keywords: Optional[List[str]] = None) -> List[Dict]:
         """
         Retrieve top chunks for a query using BM25.
         Returns list of dicts: [{"chunk": str, "score": float, "id": str}, ...]
+        Only chunks sharing at least one term with the query (or a keyword) are returned.
+        keywords (e.g. from the query refiner) add BM25_KEYWORD_BOOST per distinct
+        keyword a chunk contains.
         """
-        bm25 = self._load_index(doc_id)
-        query_tokens = query.lower().split()
-        scores = bm25.get_scores(query_tokens)
-
-        chunks = self._cached_chunks[doc_id]
-        ids = self._cached_ids[doc_id]
-
-        ranked = sorted(
-            [{"chunk": c, "score": s, "id": i} for c, s, i in zip(chunks, scores, ids)],
-            key=lambda x: x["score"],
-            reverse=True
-        )
-
-        return ranked[:top_k]
+        index = self._load_index(doc_id)
+        keyword_tokens = self._tokenize(" ".join(keywords), index.analyzer) if keywords else None
+        hits = index.top_k(self._tokenize(query, index.analyzer), top_k, prune=BM25_DYNAMIC_PRUNING,
+                           keyword_tokens=keyword_tokens, keyword_boost=BM25_KEYWORD_BOOST)
+        return [{"chunk": index.texts[i], "score": s, "id": index.ids[i]} for i, s in hits]
+
+    def listDocuments(self) -> List[str]:
+        """docIds with an index on disk (current or legacy format)."""
+        docs = set()
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pkl"):
+                docs.add(name[:-len(".pkl")])
+            elif not name.endswith((".tmp", ".old")) and os.path.isdir(os.path.join(self.cache_dir, name)):
+                docs.add(name)
+        return sorted(docs)
+
+    def deleteDocument(self, doc_id: str) -> int:
+        """
+        Drop a document's BM25 index from memory and disk.
+        Returns the number of bytes freed on disk.
+        """
+        with self.lock:
+            self.indices.pop(doc_id, None)
+            self.builders.pop(doc_id, None)
+            self.dirty_since.pop(doc_id, None)
+        size = 0
+        path = self._get_cache_path(doc_id)
+        if os.path.isdir(path):
+            size += sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            shutil.rmtree(path)
+        legacy = self._get_legacy_path(doc_id)
+        if os.path.exists(legacy):
+            size += os.path.getsize(legacy)
+            os.remove(legacy)
+        if size:
+            logger.info(f"BM25 index deleted for document {doc_id} ({size} bytes)")
+        return size
 
 
 # Singleton instance
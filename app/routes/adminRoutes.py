@@ -1,10 +1,19 @@
-from fastapi import APIRouter, HTTPException
+import secrets
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Header
 from app.storage.documentStore import documentStore
+from app.storage.storageReclaimer import storageReclaimer
 from app.utils.logger import getLogger
+from app.config import ADMIN_TOKEN
 
-router = APIRouter()
 logger = getLogger(__name__)
 
+def requireAdmin(x_admin_token: str = Header(default="")):
+    # constant-time compare; an unset ADMIN_TOKEN never matches
+    if not ADMIN_TOKEN or not secrets.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Admin token required")
+
+router = APIRouter(dependencies=[Depends(requireAdmin)])
+
 @router.get("/admin/documents")
 def listDocuments():
     return {"documents": documentStore.listDocuments()}
@@ -24,8 +33,18 @@ def getDocument(docId: str):
 
 @router.delete("/admin/documents/{docId}")
 def deleteDocument(docId: str):
-    ok = documentStore.deleteDocument(docId)
-    if not ok:
+    # removes metadata, vectors, BM25/binary indexes, uploads and extracted files
+    report = storageReclaimer.deleteDocument(docId)
+    if not report["found"]:
         raise HTTPException(status_code=404, detail="Document not found")
     logger.info(f"Deleted document {docId}")
-    return {"deleted": True}
\ No newline at end of file
+    return {"deleted": True, "report": report}
+
+@router.post("/admin/compact")
+def compactStorage(background_tasks: BackgroundTasks):
+    background_tasks.add_task(storageReclaimer.compact)
+    return {"scheduled": True}
+
+@router.get("/admin/compact")
+def lastCompaction():
+    return {"lastCompaction": storageReclaimer.lastCompaction}
@@ -4,6 +4,8 @@ from pydantic import BaseModel
 from typing import List
 from pathlib import Path
 import os
+import re
+from app.storage.storageReclaimer import storageReclaimer
 
 router = APIRouter()
 
@@ -51,6 +53,11 @@ def deleteDocument(docId: str):
         raise HTTPException(status_code=404, detail="Document not found")
     
     os.remove(file_path)
+
+    # Uploads are saved as "<uuid docId>_<fileName>": purge the indexed data as well
+    m = re.match(r"^([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})_", docId)
+    if m:
+        storageReclaimer.deleteDocument(m.group(1))
     return DeleteDocumentResponse(docId=docId, deleted=True)
 
 
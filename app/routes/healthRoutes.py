@@ -1,7 +1,30 @@
 from fastapi import APIRouter
+from app.utils.metrics import metrics
+from app.retrieval.sparseRetriever import sparseRetriever
+from app.retrieval.blendedRetriever import blendedRetriever
+from app.retrieval.reranker import reranker
+from app.utils.inferenceExecutor import ragExecutor
+from app.llm.llmClient import llmClient
 
 router = APIRouter()
 
 @router.get("/")
 def healthCheck():
     return{"status":"ok","service":"Document AI Engine"}
+
+@router.get("/metrics")
+def getMetrics():
+    # counters / gauges / latency histograms plus per-cache summaries
+    return {
+        **metrics.snapshot(),
+        "caches": {
+            "sparseIndex": sparseRetriever.indices.stats(),
+            "retrieval": blendedRetriever.result_cache.stats(),
+            "rerank": reranker.score_cache.stats() if reranker.score_cache is not None else None,
+        },
+        "executors": {
+            "rag": ragExecutor.stats(),
+        },
+        # prompt-eval seconds saved per static template by reusing its KV state
+        "llmPrefixCache": llmClient.prefix_cache_stats(),
+    }
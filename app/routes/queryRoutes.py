@@ -6,6 +6,7 @@ from app.retrieval.queryRefiner import refine_query_intelligent
 from app.embeddings.embeddingClient import EmbeddingClient
 from app.storage.documentStore import documentStore
 from app.utils.logger import getLogger
+from app.utils.textAnalyzer import analyzer
 from app.chromaClient import chromaClient  # Changed: removed 'collection', use chromaClient.chunks instead
 
 router = APIRouter()
@@ -53,9 +54,9 @@ def mergeTopChunks(chunks: list[dict], maxTokens: int = 500):
 
 def getTopSentences(text: str, query: str, top_n: int = 3):
     sentences = re.split(r'(?<=[.!?]) +', text)
-    query_terms = set(query.lower().split())
-    scores = [(len(set(s.lower().split()) & query_terms), s) for s in sentences]
-    scores.sort(reverse=True)
+    query_terms = analyzer.term_set(query)
+    scores = [(len(analyzer.term_set(s) & query_terms), s) for s in sentences]
+    scores.sort(key=lambda x: x[0], reverse=True)
     return " ".join([s for _, s in scores[:top_n]])
 
 def chromaRetrieveTopK(doc_id: str, query: str, topK: int = 5):
@@ -1,21 +1,86 @@
-from fastapi import APIRouter
+import json
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional
 from app.ragService import query_document
-from app.rag.hybridRagPipeline import run_pipeline
+from app.rag.hybridRagPipeline import run_pipeline, stream_pipeline
+from app.rag.pipelineGraph import PROFILES
+from app.utils.inferenceExecutor import ragExecutor
+from app.utils.exceptions import queueFullError, queueTimeoutError
 
 router = APIRouter()
 
 class RAGRequest(BaseModel):
-    docId: str
+    docId: Optional[str] = None
     query: str
     topK: int = 5
+    docIds: Optional[List[str]] = None  # cross-document mode over these documents
+    allDocuments: bool = False          # cross-document mode over the whole library
+    perDocTopK: Optional[int] = None    # candidates per document in cross-document mode
+    mmrLambda: Optional[float] = None   # result diversity: 1.0 = relevance only, lower = more varied (MMR)
+    profile: Optional[str] = None       # pipeline stages: "fast", "balanced" or "accurate" (PIPELINE_PROFILE)
 
 # @router.post("/api/ask")
 # async def ask_rag(req: RAGRequest):
 #     result = query_document(req.docId, req.query, req.topK)
 #     return result
+
+
+def _validate(req: RAGRequest):
+    if not req.docId and not req.docIds and not req.allDocuments:
+        raise HTTPException(status_code=400, detail="Provide docId, docIds or allDocuments")
+    if req.profile is not None and req.profile not in PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown profile; expected one of {sorted(PROFILES)}")
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
 @router.post("/api/ask")
 async def ask_rag(req: RAGRequest):
-    out = run_pipeline(req.docId, req.query, top_k=req.topK, debug=True)
+    _validate(req)
+    # the pipeline blocks on model calls: run it on the bounded executor, not the event loop
+    try:
+        out = await ragExecutor.run(
+            run_pipeline,
+            req.docId, req.query, top_k=req.topK, debug=True,
+            doc_ids=req.docIds, all_documents=req.allDocuments, per_doc_k=req.perDocTopK,
+            mmr_lambda=req.mmrLambda, profile=req.profile
+        )
+    except (queueFullError, queueTimeoutError) as e:
+        raise HTTPException(status_code=503, detail=f"RAG service busy: {e.message}", headers={"Retry-After": "5"})
     return out
 
+
+@router.post("/api/ask/stream")
+async def ask_rag_stream(req: RAGRequest):
+    """
+    Server-Sent Events: "retrieval" (chunks + citations), then "token" events
+    as the answer is generated, then "answer", "judge" and "done" (with TTFT).
+    """
+    _validate(req)
+    try:
+        events = ragExecutor.stream(
+            stream_pipeline,
+            req.docId, req.query, top_k=req.topK,
+            doc_ids=req.docIds, all_documents=req.allDocuments, per_doc_k=req.perDocTopK,
+            mmr_lambda=req.mmrLambda, profile=req.profile
+        )
+    except queueFullError as e:
+        raise HTTPException(status_code=503, detail=f"RAG service busy: {e.message}", headers={"Retry-After": "5"})
+
+    async def body():
+        try:
+            async for event, data in events:
+                yield _sse(event, data)
+        except queueTimeoutError as e:
+            yield _sse("error", {"error": "RAG service busy", "details": e.message})
+        except Exception as e:
+            yield _sse("error", {"error": "Streaming failed", "details": str(e)})
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(body(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
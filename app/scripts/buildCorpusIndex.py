@@ -0,0 +1,45 @@
+# app/scripts/buildCorpusIndex.py
+# Build (or rebuild) the corpus indexes used for cross-document queries:
+# the IVF-PQ dense index and the global BM25 index (corpus-level IDF).
+# Usage: python -m app.scripts.buildCorpusIndex [--dense-only | --sparse-only]
+
+import argparse
+import shutil
+from app.chromaClient import chromaClient
+from app.retrieval.ivfpqIndex import build_corpus_index
+from app.retrieval.corpusBM25Index import build_corpus_bm25
+from app.retrieval.sparseRetriever import sparseRetriever
+from app.utils.fileUtils import replace_dir
+from app.config import (
+    CORPUS_INDEX_DIR, CORPUS_BM25_DIR, IVFPQ_NLIST, IVFPQ_M, IVFPQ_NBITS,
+    IVFPQ_NPROBE, IVFPQ_RERANK_K, IVFPQ_TRAIN_SIZE, IVFPQ_EXACT_MAX
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the corpus-level retrieval indexes")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--dense-only", action="store_true")
+    group.add_argument("--sparse-only", action="store_true")
+    args = parser.parse_args()
+
+    if not args.sparse_only:
+        tmp_dir = f"{CORPUS_INDEX_DIR}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        index = build_corpus_index(
+            chromaClient,
+            tmp_dir,
+            nlist=IVFPQ_NLIST,
+            m=IVFPQ_M,
+            nbits=IVFPQ_NBITS,
+            nprobe=IVFPQ_NPROBE,
+            rerank_k=IVFPQ_RERANK_K,
+            train_size=IVFPQ_TRAIN_SIZE,
+            exact_max=IVFPQ_EXACT_MAX,
+        )
+        replace_dir(tmp_dir, str(CORPUS_INDEX_DIR))
+        print(f"✅ Corpus index built: {len(index)} vectors, {len(index.doc_table)} documents -> {CORPUS_INDEX_DIR}")
+
+    if not args.dense_only:
+        corpus_bm25 = build_corpus_bm25(sparseRetriever, chromaClient)
+        corpus_bm25.save(str(CORPUS_BM25_DIR))
+        print(f"✅ Corpus BM25 built: {len(corpus_bm25)} chunks, {len(corpus_bm25.doc_table)} documents -> {CORPUS_BM25_DIR}")
@@ -0,0 +1,54 @@
+# app/scripts/exportOnnxReranker.py
+# Export the reranker cross-encoder to int8 ONNX (RERANK_ONNX_DIR) and check
+# that it ranks candidates like the float32 PyTorch model: mean per-query
+# Spearman correlation over (query, chunk) pools sampled from ingested
+# documents must reach RERANK_ONNX_MIN_SPEARMAN. Enable with RERANK_BACKEND = "onnx".
+# Usage: python -m app.scripts.exportOnnxReranker [--queries N] [--pool N] [--check-only]
+
+import argparse
+import sys
+import numpy as np
+from sentence_transformers import CrossEncoder
+from app.storage.documentStore import documentStore
+from app.retrieval.onnxCrossEncoder import OnnxCrossEncoder, export_quantized, rank_fidelity
+from app.config import RERANK_MODEL_NAME, RERANK_MAX_LENGTH, RERANK_ONNX_DIR, RERANK_ONNX_MIN_SPEARMAN
+
+
+def sample_pools(n_queries: int, pool: int, seed: int = 0):
+    """Known-item pools: a sentence of a random chunk as the query, that chunk plus random others as candidates."""
+    texts = [c["text"] for d in documentStore.listDocuments()
+             for c in (documentStore.getDocument(d["docId"]) or {}).get("chunks", [])]
+    if len(texts) < pool:
+        sys.exit(f"Need at least {pool} ingested chunks for the fidelity check, found {len(texts)}")
+    rng = np.random.default_rng(seed)
+    pools = []
+    for _ in range(n_queries):
+        i = int(rng.integers(len(texts)))
+        sentences = [s.strip() for s in texts[i].split(".") if len(s.split()) >= 4] or [texts[i][:200]]
+        others = rng.choice([j for j in range(len(texts)) if j != i], size=pool - 1, replace=False)
+        pools.append((sentences[rng.integers(len(sentences))], [texts[i]] + [texts[j] for j in others]))
+    return pools
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the int8 ONNX reranker and check rank fidelity")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--pool", type=int, default=15)
+    parser.add_argument("--check-only", action="store_true", help="skip the export, only run the fidelity check")
+    args = parser.parse_args()
+
+    if not args.check_only:
+        path = export_quantized(RERANK_MODEL_NAME, str(RERANK_ONNX_DIR))
+        print(f"✅ Exported {RERANK_MODEL_NAME} -> {path}")
+
+    reference = CrossEncoder(RERANK_MODEL_NAME, max_length=RERANK_MAX_LENGTH)
+    quantized = OnnxCrossEncoder(str(RERANK_ONNX_DIR), max_length=RERANK_MAX_LENGTH)
+    mean_rho, min_rho = rank_fidelity(
+        lambda pairs: reference.predict(pairs, show_progress_bar=False),
+        quantized.predict,
+        sample_pools(args.queries, args.pool),
+    )
+    print(f"Spearman vs float32: mean={mean_rho:.4f} min={min_rho:.4f} (threshold {RERANK_ONNX_MIN_SPEARMAN})")
+    if mean_rho < RERANK_ONNX_MIN_SPEARMAN:
+        sys.exit("❌ int8 model does not rank like the float32 model; keep RERANK_BACKEND = \"torch\"")
+    print("✅ Fidelity check passed")
@@ -0,0 +1,103 @@
+# app/sharding/coordinator.py
+import json
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
+from app.sharding.hashRing import ConsistentHashRing
+from app.retrieval.scoring import rrf_fuse
+from app.config import SHARD_URLS, SHARD_RPC_TIMEOUT
+from app.utils.logger import getLogger
+
+logger = getLogger(__name__)
+
+
+class ShardClient:
+    """Minimal JSON RPC client for one shard (see shardServer.py)."""
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def call(self, method: str, **params):
+        body = json.dumps({"method": method, "params": params}).encode("utf-8")
+        req = urllib.request.Request(f"{self.url}/rpc", data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            payload = json.loads(resp.read())
+        if "error" in payload:
+            raise RuntimeError(f"Shard {self.url} error: {payload['error']}")
+        return payload["result"]
+
+
+class ShardCoordinator:
+    """
+    Routes documents to shards by consistent hashing and scatters queries to the
+    shards that own the requested documents, merging their top-k candidates.
+    """
+
+    def __init__(self, shard_urls: List[str], vnodes: int = 128, timeout: float = 10.0):
+        self.clients = {url: ShardClient(url, timeout=timeout) for url in shard_urls}
+        self.ring = ConsistentHashRing(shard_urls, vnodes=vnodes)
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(shard_urls)), thread_name_prefix="shard-rpc")
+
+    def shard_for(self, doc_id: str) -> str:
+        return self.ring.get_node(doc_id)
+
+    def index_document(self, doc_id: str, chunk_ids: List[str], texts: List[str],
+                       embeddings, pages: Optional[List[int]] = None) -> Dict:
+        url = self.shard_for(doc_id)
+        vectors = [list(map(float, e)) for e in embeddings]
+        return self.clients[url].call("index_document", doc_id=doc_id, chunk_ids=chunk_ids,
+                                      texts=texts, embeddings=vectors, pages=pages)
+
+    def delete_document(self, doc_id: str) -> Dict:
+        return self.clients[self.shard_for(doc_id)].call("delete_document", doc_id=doc_id)
+
+    def query(self, query: str, query_embedding, doc_ids: Optional[List[str]] = None, top_k: int = 10) -> List[Dict]:
+        """
+        Returns fused candidates [{"chunk": {...}, "score": rrf}, ...] across shards.
+        doc_ids=None broadcasts to every shard.
+        """
+        qvec = list(map(float, query_embedding))
+        if doc_ids is None:
+            targets = {url: None for url in self.clients}
+        else:
+            targets = self.ring.group(doc_ids)
+
+        futures = {
+            self.executor.submit(self.clients[url].call, "query", query=query, query_embedding=qvec,
+                                 doc_ids=docs, top_k=top_k): url
+            for url, docs in targets.items()
+        }
+        dense, sparse = [], []
+        for fut, url in futures.items():
+            try:
+                res = fut.result()
+                dense.extend(res["dense"])
+                sparse.extend(res["sparse"])
+            except Exception as e:
+                logger.warning(f"Shard {url} failed, merging partial results: {e}")
+
+        dense.sort(key=lambda x: x["score"], reverse=True)
+        sparse.sort(key=lambda x: x["score"], reverse=True)
+        # rank-based fusion: shard-local scores are not calibrated against each other
+        return rrf_fuse([dense[:top_k], sparse[:top_k]])[:top_k]
+
+    def _broadcast(self, method: str) -> List[Dict]:
+        out = []
+        for url, client in self.clients.items():
+            try:
+                out.append({"url": url, **client.call(method)})
+            except Exception as e:
+                out.append({"url": url, "error": str(e)})
+        return out
+
+    def stats(self) -> List[Dict]:
+        return self._broadcast("stats")
+
+    def compact(self) -> List[Dict]:
+        """Per-shard compaction reports (orphaned index files removed, bytes freed)."""
+        return self._broadcast("compact")
+
+
+# Singleton instance (None when retrieval runs in-process)
+shardCoordinator = ShardCoordinator(SHARD_URLS, timeout=SHARD_RPC_TIMEOUT) if SHARD_URLS else None
@@ -0,0 +1,57 @@
+# app/sharding/hashRing.py
+import bisect
+import hashlib
+from typing import Dict, List, Iterable
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class ConsistentHashRing:
+    """
+    Places documents on shards by consistent hashing. Each shard owns `vnodes`
+    points on the ring so load stays even, and adding/removing a shard only
+    moves the documents adjacent to its points.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 128):
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: Dict[int, str] = {}
+        self.nodes: List[str] = []
+        for node in nodes:
+            self.add_node(node)
+
+    def add_node(self, node: str):
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for i in range(self.vnodes):
+            point = _hash(f"{node}#{i}")
+            self._owners[point] = node
+            bisect.insort(self._points, point)
+
+    def remove_node(self, node: str):
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        for i in range(self.vnodes):
+            point = _hash(f"{node}#{i}")
+            self._owners.pop(point, None)
+            idx = bisect.bisect_left(self._points, point)
+            if idx < len(self._points) and self._points[idx] == point:
+                self._points.pop(idx)
+
+    def get_node(self, key: str) -> str:
+        if not self._points:
+            raise ValueError("Hash ring has no nodes")
+        idx = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[self._points[idx]]
+
+    def group(self, keys: Iterable[str]) -> Dict[str, List[str]]:
+        """Bucket keys by owning node."""
+        out: Dict[str, List[str]] = {}
+        for key in keys:
+            out.setdefault(self.get_node(key), []).append(key)
+        return out
@@ -0,0 +1,184 @@
+# app/sharding/shardServer.py
+# One retrieval shard: owns a partition of the documents and serves dense
+# (binary prefilter + float rescoring) and BM25 retrieval over JSON RPC.
+#
+# Run locally, one process per shard:
+#   python -m app.sharding.shardServer --port 9101 --data-dir data/shards/0
+import os
+import json
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Dict, Optional
+import numpy as np
+from app.retrieval.binaryIndex import BinaryIndex
+from app.retrieval.sparseRetriever import SparseRetriever
+from app.utils.logger import getLogger
+
+logger = getLogger(__name__)
+
+
+class ShardService:
+    """Document-partitioned retrieval state for a single shard."""
+
+    def __init__(self, shard_id: str, data_dir: str):
+        self.shard_id = shard_id
+        self.chunks_dir = os.path.join(data_dir, "chunks")
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        self.binary = BinaryIndex(os.path.join(data_dir, "binary"))
+        self.sparse = SparseRetriever(cache_dir=os.path.join(data_dir, "bm25"))
+        self.lock = threading.Lock()
+        self._chunks: Dict[str, Dict] = {}  # doc_id -> {chunk_id: {"text", "page"}}
+
+    def _chunk_path(self, doc_id: str) -> str:
+        return os.path.join(self.chunks_dir, f"{doc_id}.json")
+
+    def _get_chunks(self, doc_id: str) -> Dict:
+        with self.lock:
+            if doc_id in self._chunks:
+                return self._chunks[doc_id]
+        path = self._chunk_path(doc_id)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            table = json.load(f)
+        with self.lock:
+            self._chunks[doc_id] = table
+        return table
+
+    # ---------------- RPC methods ----------------
+    def index_document(self, doc_id: str, chunk_ids: List[str], texts: List[str],
+                       embeddings: List[List[float]], pages: Optional[List[int]] = None) -> Dict:
+        pages = pages or [None] * len(chunk_ids)
+        table = {cid: {"text": t, "page": p} for cid, t, p in zip(chunk_ids, texts, pages)}
+        with open(self._chunk_path(doc_id), "w") as f:
+            json.dump(table, f)
+        with self.lock:
+            self._chunks[doc_id] = table
+        self.sparse.indexDocument(doc_id, texts, chunk_ids)
+        self.binary.add(doc_id, chunk_ids, np.asarray(embeddings, dtype=np.float32))
+        self.binary.save(doc_id)
+        logger.info(f"[shard {self.shard_id}] indexed {doc_id} ({len(chunk_ids)} chunks)")
+        return {"indexed": len(chunk_ids)}
+
+    def delete_document(self, doc_id: str) -> Dict:
+        with self.lock:
+            self._chunks.pop(doc_id, None)
+        freed = 0
+        path = self._chunk_path(doc_id)
+        if os.path.exists(path):
+            freed += os.path.getsize(path)
+            os.remove(path)
+        freed += self.sparse.deleteDocument(doc_id)
+        freed += self.binary.delete(doc_id)
+        logger.info(f"[shard {self.shard_id}] deleted {doc_id} ({freed} bytes)")
+        return {"bytesFreed": freed}
+
+    def list_documents(self) -> List[str]:
+        return sorted(f[:-len(".json")] for f in os.listdir(self.chunks_dir) if f.endswith(".json"))
+
+    def compact(self) -> Dict:
+        """Drop BM25 / binary files of docIds whose chunk table is gone (e.g. an interrupted delete)."""
+        owned = set(self.list_documents())
+        on_disk = set(self.sparse.listDocuments()) | set(os.listdir(self.binary.index_dir))
+        orphans = sorted(on_disk - owned)
+        freed = sum(self.sparse.deleteDocument(d) + self.binary.delete(d) for d in orphans)
+        logger.info(f"[shard {self.shard_id}] compacted {len(orphans)} orphans ({freed} bytes)")
+        return {"orphansRemoved": orphans, "bytesFreed": freed}
+
+    def _chunk(self, doc_id: str, chunk_id: str) -> Dict:
+        row = self._get_chunks(doc_id).get(chunk_id, {})
+        return {"id": chunk_id, "text": row.get("text", ""), "meta": {"doc_id": doc_id, "page": row.get("page")}}
+
+    def query(self, query: str, query_embedding: List[float], doc_ids: Optional[List[str]] = None,
+              top_k: int = 10) -> Dict:
+        """
+        Dense and BM25 candidates over the shard's documents (all of them when
+        doc_ids is None). Lists are returned separately so the coordinator can
+        fuse them globally.
+        """
+        owned = set(self.list_documents())
+        targets = [d for d in doc_ids if d in owned] if doc_ids is not None else sorted(owned)
+        qvec = np.asarray(query_embedding, dtype=np.float32)
+        dense, sparse = [], []
+        for doc_id in targets:
+            for hit in self.binary.search(doc_id, qvec, top_k=top_k):
+                dense.append({"chunk": self._chunk(doc_id, hit["id"]), "score": hit["score"]})
+            try:
+                hits = self.sparse.query(doc_id, query, top_k=top_k)
+            except FileNotFoundError:
+                continue
+            best = max((float(h["score"]) for h in hits), default=0.0)
+            for h in hits:
+                score = float(h["score"]) / best if best > 0 else 0.0
+                sparse.append({"chunk": self._chunk(doc_id, h["id"]), "score": score})
+        dense.sort(key=lambda x: x["score"], reverse=True)
+        sparse.sort(key=lambda x: x["score"], reverse=True)
+        return {"shard": self.shard_id, "dense": dense[:top_k], "sparse": sparse[:top_k]}
+
+    def stats(self) -> Dict:
+        return {"shard": self.shard_id, "documents": len(self.list_documents())}
+
+
+def make_handler(service: ShardService):
+    methods = {
+        "index_document": service.index_document,
+        "delete_document": service.delete_document,
+        "list_documents": service.list_documents,
+        "compact": service.compact,
+        "query": service.query,
+        "stats": service.stats,
+    }
+
+    class RPCHandler(BaseHTTPRequestHandler):
+        def _send(self, status: int, payload: Dict):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, {"status": "ok", **service.stats()})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/rpc":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                req = json.loads(self.rfile.read(length) or b"{}")
+                fn = methods.get(req.get("method"))
+                if fn is None:
+                    self._send(400, {"error": f"unknown method {req.get('method')!r}"})
+                    return
+                self._send(200, {"result": fn(**req.get("params", {}))})
+            except Exception as e:
+                logger.exception(f"[shard {service.shard_id}] RPC failed: {e}")
+                self._send(500, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            logger.debug(f"[shard {service.shard_id}] " + format % args)
+
+    return RPCHandler
+
+
+def serve(host: str, port: int, data_dir: str, shard_id: Optional[str] = None):
+    service = ShardService(shard_id or str(port), data_dir)
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    logger.info(f"Shard {service.shard_id} serving on {host}:{port} (data_dir={data_dir})")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one retrieval shard")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--data-dir", required=True)
+    parser.add_argument("--shard-id", default=None)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.data_dir, args.shard_id)
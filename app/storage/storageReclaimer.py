@@ -0,0 +1,188 @@
+# app/storage/storageReclaimer.py
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List, Optional
+from app.storage.documentStore import documentStore
+from app.chromaClient import chromaClient, DB_DIR
+from app.retrieval.sparseRetriever import sparseRetriever
+from app.retrieval.binaryIndex import binaryIndex
+from app.retrieval.blendedRetriever import blendedRetriever
+from app.retrieval.ivfpqIndex import IVFPQIndex, build_corpus_index
+from app.retrieval.corpusBM25Index import CorpusBM25Index, build_corpus_bm25
+from app.sharding.coordinator import shardCoordinator
+from app.config import (
+    UPLOADS_DIR, CORPUS_INDEX_DIR, CORPUS_BM25_DIR, IVFPQ_NLIST, IVFPQ_M, IVFPQ_NBITS,
+    IVFPQ_NPROBE, IVFPQ_RERANK_K, IVFPQ_TRAIN_SIZE, IVFPQ_EXACT_MAX
+)
+from app.utils.fileUtils import replace_dir
+from app.utils.logger import getLogger
+
+logger = getLogger(__name__)
+
+# pdfToJson.extract_pdf_layout default output_dir (extracted images + table JSON)
+LAYOUT_DIR = "output_json"
+
+
+def _path_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+
+def _remove_prefixed(directory: str, prefix: str) -> int:
+    """Delete files in directory whose name starts with prefix. Returns bytes freed."""
+    if not os.path.isdir(directory):
+        return 0
+    freed = 0
+    for name in os.listdir(directory):
+        if name.startswith(prefix):
+            fp = os.path.join(directory, name)
+            if os.path.isfile(fp):
+                freed += os.path.getsize(fp)
+                os.remove(fp)
+    return freed
+
+
+class StorageReclaimer:
+    """
+    Single deletion path for a docId across every store (metadata, Chroma,
+    BM25 cache, binary codes, corpus index, shards, uploads, extracted layout
+    files), plus a compaction job that drops orphans and rebuilds the corpus index.
+    With shards configured, BM25 / binary deletes and orphan removal run on the
+    owning shards through the coordinator.
+    """
+
+    def __init__(self, upload_dirs: List[str], layout_dir: str = LAYOUT_DIR):
+        self.upload_dirs = sorted({os.path.abspath(d) for d in upload_dirs})
+        self.layout_dir = layout_dir
+        self.lock = threading.Lock()  # one compaction at a time
+        self.lastCompaction: Optional[Dict[str, Any]] = None
+
+    def _stores(self) -> Dict[str, str]:
+        return {
+            "chroma": DB_DIR,
+            "bm25": sparseRetriever.cache_dir,
+            "binary": binaryIndex.index_dir,
+            "corpusIndex": str(CORPUS_INDEX_DIR),
+            "corpusBM25": str(CORPUS_BM25_DIR),
+            "layout": self.layout_dir,
+            **{f"uploads:{d}": d for d in self.upload_dirs},
+        }
+
+    def deleteDocument(self, docId: str) -> Dict[str, Any]:
+        report: Dict[str, Any] = {"docId": docId, "metadata": documentStore.deleteDocument(docId)}
+        report["chroma"] = chromaClient.delete_document(docId)
+        report["corpusIndexTombstoned"] = blendedRetriever.delete_document(docId)
+
+        freed = {
+            "uploads": sum(_remove_prefixed(d, f"{docId}_") for d in self.upload_dirs),
+            "images": _remove_prefixed(os.path.join(self.layout_dir, "images"), f"{docId}-"),
+            "tables": _remove_prefixed(os.path.join(self.layout_dir, "tables"), f"{docId}-"),
+        }
+        if shardCoordinator is not None:
+            # sharded: the BM25 / binary indexes live only on the owning shard
+            try:
+                freed["shard"] = shardCoordinator.delete_document(docId).get("bytesFreed", 0)
+            except Exception as e:
+                logger.warning(f"Shard delete failed for {docId}: {e}")
+        else:
+            freed["bm25"] = sparseRetriever.deleteDocument(docId)
+            freed["binary"] = binaryIndex.delete(docId)
+        report["bytesFreed"] = freed
+        report["found"] = bool(report["metadata"] or any(report["chroma"].values()) or any(freed.values()))
+        logger.info(f"Deleted document {docId}: {report}")
+        return report
+
+    # ---------------- Compaction ----------------
+    def _drop_orphans(self) -> List[str]:
+        """Side files (BM25, binary codes) for docIds that no longer have chunks in Chroma."""
+        candidates = set()
+        if os.path.isdir(sparseRetriever.cache_dir):
+            candidates |= set(sparseRetriever.listDocuments())
+        if os.path.isdir(binaryIndex.index_dir):
+            candidates |= set(os.listdir(binaryIndex.index_dir))
+        orphans = [d for d in sorted(candidates) if not chromaClient.has_document(d)]
+        for docId in orphans:
+            sparseRetriever.deleteDocument(docId)
+            binaryIndex.delete(docId)
+        return orphans
+
+    def _rebuild_corpus_index(self) -> bool:
+        index = IVFPQIndex.load(str(CORPUS_INDEX_DIR))
+        if index is None or not index.tombstones:
+            return False
+        tmp_dir = f"{CORPUS_INDEX_DIR}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        build_corpus_index(
+            chromaClient, tmp_dir, nlist=IVFPQ_NLIST, m=IVFPQ_M, nbits=IVFPQ_NBITS, nprobe=IVFPQ_NPROBE,
+            rerank_k=IVFPQ_RERANK_K, train_size=IVFPQ_TRAIN_SIZE, exact_max=IVFPQ_EXACT_MAX
+        )
+        replace_dir(tmp_dir, str(CORPUS_INDEX_DIR))
+        blendedRetriever.reload_corpus_index()
+        return True
+
+    def _rebuild_corpus_bm25(self) -> bool:
+        index = CorpusBM25Index.load(str(CORPUS_BM25_DIR))
+        if index is None or not index.tombstones:
+            return False
+        rebuilt = build_corpus_bm25(sparseRetriever, chromaClient)
+        tmp_dir = f"{CORPUS_BM25_DIR}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        rebuilt.save(tmp_dir)
+        replace_dir(tmp_dir, str(CORPUS_BM25_DIR))
+        blendedRetriever.reload_corpus_index()
+        return True
+
+    def _vacuum_chroma(self) -> bool:
+        try:
+            return chromaClient.vacuum()
+        except sqlite3.Error as e:
+            logger.warning(f"Chroma VACUUM skipped: {e}")
+            return False
+
+    def compact(self) -> Dict[str, Any]:
+        if not self.lock.acquire(blocking=False):
+            return {"status": "running"}
+        try:
+            started = time.time()
+            before = {name: _path_size(p) for name, p in self._stores().items()}
+            report: Dict[str, Any] = {"status": "done", "startedAt": started}
+            if shardCoordinator is not None:
+                report["shards"] = shardCoordinator.compact()
+            else:
+                report["orphansRemoved"] = self._drop_orphans()
+            try:
+                report["corpusIndexRebuilt"] = self._rebuild_corpus_index()
+            except Exception as e:
+                logger.error(f"Corpus index rebuild failed: {e}")
+                report["corpusIndexRebuilt"] = False
+            try:
+                report["corpusBM25Rebuilt"] = self._rebuild_corpus_bm25()
+            except Exception as e:
+                logger.error(f"Corpus BM25 rebuild failed: {e}")
+                report["corpusBM25Rebuilt"] = False
+            report["chromaVacuumed"] = self._vacuum_chroma()
+            after = {name: _path_size(p) for name, p in self._stores().items()}
+            report["bytesBefore"] = before
+            report["bytesAfter"] = after
+            report["bytesReclaimed"] = sum(before.values()) - sum(after.values())
+            report["durationSec"] = round(time.time() - started, 3)
+            self.lastCompaction = report
+            logger.info(f"Compaction finished: reclaimed {report['bytesReclaimed']} bytes in {report['durationSec']}s")
+            return report
+        finally:
+            self.lock.release()
+
+
+# Singleton instance
+storageReclaimer = StorageReclaimer(upload_dirs=[str(UPLOADS_DIR), "data/uploads"])
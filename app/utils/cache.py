@@ -0,0 +1,129 @@
+# app/utils/cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+from app.utils.metrics import metrics
+
+
+class BoundedCache:
+    """
+    Thread-safe cache bounded by total size (sizeof(value), bytes by convention)
+    and/or item count, with LRU or LFU eviction and an optional TTL.
+
+    Hits, misses and evictions are counted here and in the shared metrics
+    registry as `<name>.hits`, `<name>.misses`, `<name>.evictions`.
+    """
+
+    def __init__(self, name: str, max_bytes: Optional[int] = None, max_items: Optional[int] = None,
+                 policy: str = "lru", ttl: Optional[float] = None,
+                 sizeof: Optional[Callable[[Any], int]] = None):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.policy = policy
+        self.ttl = ttl
+        self.sizeof = sizeof or (lambda v: 1)
+        self.lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()  # recency order, oldest first
+        self._sizes: Dict[Hashable, int] = {}
+        self._freq: Dict[Hashable, int] = {}
+        self._stored_at: Dict[Hashable, float] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self.lock:
+            return key in self._data and not self._expired(key)
+
+    def _expired(self, key: Hashable) -> bool:
+        return self.ttl is not None and time.time() - self._stored_at[key] > self.ttl
+
+    def _remove(self, key: Hashable) -> Any:
+        value = self._data.pop(key)
+        self.bytes -= self._sizes.pop(key)
+        self._freq.pop(key, None)
+        self._stored_at.pop(key, None)
+        return value
+
+    def _victim(self, keep: Hashable) -> Hashable:
+        candidates = (k for k in self._data if k != keep)
+        if self.policy == "lfu":
+            # least frequently used; ties go to the least recently used
+            return min(candidates, key=lambda k: self._freq[k])
+        return next(candidates)
+
+    def _over_budget(self) -> bool:
+        return ((self.max_bytes is not None and self.bytes > self.max_bytes) or
+                (self.max_items is not None and len(self._data) > self.max_items))
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            if key in self._data and self._expired(key):
+                self._remove(key)
+            if key not in self._data:
+                self.misses += 1
+                metrics.inc(f"{self.name}.misses")
+                return default
+            self._data.move_to_end(key)
+            self._freq[key] += 1
+            self.hits += 1
+            metrics.inc(f"{self.name}.hits")
+            return self._data[key]
+
+    def put(self, key: Hashable, value: Any):
+        size = int(self.sizeof(value))
+        with self.lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = value
+            self._sizes[key] = size
+            self._freq[key] = 1
+            self._stored_at[key] = time.time()
+            self.bytes += size
+            # the newest entry is kept even if it alone exceeds the budget
+            while len(self._data) > 1 and self._over_budget():
+                self._remove(self._victim(keep=key))
+                self.evictions += 1
+                metrics.inc(f"{self.name}.evictions")
+            metrics.set_gauge(f"{self.name}.bytes", self.bytes)
+            metrics.set_gauge(f"{self.name}.items", len(self._data))
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            return self._remove(key) if key in self._data else default
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every key for which predicate(key) is true. Returns the number dropped."""
+        with self.lock:
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                self._remove(k)
+            return len(keys)
+
+    def clear(self):
+        with self.lock:
+            for k in list(self._data):
+                self._remove(k)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "policy": self.policy,
+                "items": len(self._data),
+                "bytes": self.bytes,
+                "maxBytes": self.max_bytes,
+                "maxItems": self.max_items,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRate": round(self.hits / lookups, 4) if lookups else None,
+            }
@@ -1,4 +1,16 @@
 class pdfProcessingError(Exception):
     def __init__(self, message="Failed to process PDF"):
         self.message = message
-        super().__init__(self.message)
\ No newline at end of file
+        super().__init__(self.message)
+
+
+class queueFullError(Exception):
+    def __init__(self, message="Inference queue is full"):
+        self.message = message
+        super().__init__(self.message)
+
+
+class queueTimeoutError(Exception):
+    def __init__(self, message="Request waited too long in the inference queue"):
+        self.message = message
+        super().__init__(self.message)
@@ -0,0 +1,27 @@
+# app/utils/fileUtils.py
+import os
+import shutil
+
+
+def replace_dir(src: str, dst: str):
+    """
+    Swap a freshly written directory src in for dst. The live dst is renamed
+    aside before src takes its place and only deleted afterwards, so a crash
+    at any point leaves either dst or dst.old intact (see recover_dir).
+    """
+    old = f"{dst}.old"
+    recover_dir(dst)
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(dst):
+        os.replace(dst, old)
+    os.replace(src, dst)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def recover_dir(dst: str) -> bool:
+    """Put dst.old back if a swap was interrupted between its two renames. Returns True if it did."""
+    old = f"{dst}.old"
+    if not os.path.exists(dst) and os.path.exists(old):
+        os.replace(old, dst)
+        return True
+    return False
@@ -0,0 +1,146 @@
+# app/utils/inferenceExecutor.py
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+from app.utils.exceptions import queueFullError, queueTimeoutError
+from app.utils.metrics import metrics
+from app.config import RAG_EXECUTOR_WORKERS, RAG_QUEUE_MAX, RAG_QUEUE_TIMEOUT
+
+
+class InferenceExecutor:
+    """
+    Bounded thread pool for blocking model work (retrieval, reranking, LLM
+    generation, judging) called from async routes, so the event loop keeps
+    serving other requests.
+
+    Admission control: at most max_queue requests wait for a worker; beyond
+    that run() raises queueFullError at once. A request that waited longer
+    than queue_timeout is dropped with queueTimeoutError when it reaches a
+    worker instead of running late. Metrics: `<name>.queued` / `.running`
+    gauges, `.wait_seconds` histogram, `.rejected` / `.expired` / `.completed`
+    / `.failed` counters.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, queue_timeout: Optional[float] = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.rejected = 0
+        self.expired = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _gauges(self):
+        metrics.set_gauge(f"{self.name}.queued", self.queued)
+        metrics.set_gauge(f"{self.name}.running", self.running)
+
+    def _admit(self):
+        with self.lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                metrics.inc(f"{self.name}.rejected")
+                raise queueFullError(f"{self.queued} requests already waiting")
+            self.queued += 1
+            self._gauges()
+
+    def _task(self, submitted: float, fn: Callable, args, kwargs) -> Any:
+        waited = time.perf_counter() - submitted
+        metrics.observe(f"{self.name}.wait_seconds", waited)
+        with self.lock:
+            self.queued -= 1
+            expired = self.queue_timeout is not None and waited > self.queue_timeout
+            if expired:
+                self.expired += 1
+                metrics.inc(f"{self.name}.expired")
+            else:
+                self.running += 1
+            self._gauges()
+        if expired:
+            raise queueTimeoutError(f"waited {waited:.1f}s for a worker")
+        ok = False
+        try:
+            result = fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            with self.lock:
+                self.running -= 1
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._gauges()
+            metrics.inc(f"{self.name}.completed" if ok else f"{self.name}.failed")
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on the pool and await its result."""
+        self._admit()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, self._task, time.perf_counter(), fn, args, kwargs)
+
+    def stream(self, gen_fn: Callable[..., Iterator], *args, **kwargs) -> AsyncIterator:
+        """
+        Admit now (raises queueFullError before any response is sent), then run
+        the generator gen_fn(*args, **kwargs) on the pool and yield its items
+        asynchronously. Closing the async iterator (client disconnect) stops
+        the generator at its next item.
+        """
+        self._admit()
+        loop = asyncio.get_running_loop()
+        items: asyncio.Queue = asyncio.Queue()
+        stopped = threading.Event()
+        end = object()
+
+        def produce():
+            gen = gen_fn(*args, **kwargs)
+            try:
+                for item in gen:
+                    if stopped.is_set():
+                        break
+                    loop.call_soon_threadsafe(items.put_nowait, (item, None))
+            finally:
+                gen.close()
+
+        future = loop.run_in_executor(self.pool, self._task, time.perf_counter(), produce, (), {})
+        # runs on the loop after every item put above; also ends the stream if the request expired in the queue
+        future.add_done_callback(
+            lambda f: items.put_nowait((end, None if f.cancelled() else f.exception())))
+
+        async def consume():
+            try:
+                while True:
+                    item, error = await items.get()
+                    if item is end:
+                        if error is not None:
+                            raise error
+                        return
+                    yield item
+            finally:
+                stopped.set()
+
+        return consume()
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "maxWorkers": self.max_workers,
+                "maxQueue": self.max_queue,
+                "queueTimeout": self.queue_timeout,
+                "queued": self.queued,
+                "running": self.running,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+
+# Singleton instance: the RAG question path (/rag/api/ask)
+ragExecutor = InferenceExecutor("rag_executor", RAG_EXECUTOR_WORKERS, RAG_QUEUE_MAX, RAG_QUEUE_TIMEOUT)
@@ -0,0 +1,95 @@
+# app/utils/textAnalyzer.py
+import re
+import unicodedata
+from functools import lru_cache
+from typing import List, Dict, FrozenSet, Optional
+from app.config import TEXT_ANALYZER_STOPWORDS, TEXT_ANALYZER_STEMMING
+
+_token_re = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not now of off on once only or other our ours ourselves out over own same she should
+so some such than that the their theirs them themselves then there these they this those through to
+too under until up very was we were what when where which while who whom why will with would you
+your yours yourself yourselves
+""".split())
+
+# (suffix, replacement, minimum stem length) - checked in order, first match wins
+_suffix_rules = (
+    ("ational", "ate", 3), ("ization", "ize", 3), ("fulness", "ful", 3), ("iveness", "ive", 3),
+    ("ements", "", 4), ("ement", "", 4), ("ments", "", 4), ("ment", "", 4),
+    ("ingly", "", 3), ("edly", "", 3), ("ies", "y", 2), ("ied", "y", 2),
+    ("ing", "", 3), ("ed", "", 3), ("ly", "", 3), ("es", "", 3), ("s", "", 3),
+)
+
+
+def normalize(text: str) -> str:
+    """Unicode NFKC, lowercase, collapsed whitespace."""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def tokenize(text: str) -> List[str]:
+    return _token_re.findall(normalize(text))
+
+
+def stem(token: str) -> str:
+    """Light suffix stripping (no external stemmer dependency)."""
+    if token.isdigit() or token.endswith("ss"):
+        return token
+    for suffix, repl, min_len in _suffix_rules:
+        if token.endswith(suffix) and len(token) - len(suffix) >= min_len:
+            return token[: len(token) - len(suffix)] + repl
+    return token
+
+
+class Analyzer:
+    """
+    The one text pipeline for indexing and matching: normalize -> tokenize ->
+    drop stopwords -> (optionally) stem. BM25 indexes record the settings they
+    were built with (`signature`) so queries are analyzed the same way.
+    """
+
+    def __init__(self, remove_stopwords: bool = True, stemming: bool = False, cache_size: int = 8192):
+        self.remove_stopwords = remove_stopwords
+        self.stemming = stemming
+        # token streams for recently seen texts (chunks re-appear across judge/citer/snippets)
+        self._cached = lru_cache(maxsize=cache_size)(self._analyze)
+
+    @property
+    def signature(self) -> Dict:
+        return {"stopwords": self.remove_stopwords, "stemming": self.stemming}
+
+    @classmethod
+    def from_signature(cls, signature: Optional[Dict]) -> "Analyzer":
+        signature = signature or {}
+        return cls(remove_stopwords=signature.get("stopwords", True), stemming=signature.get("stemming", False))
+
+    def _analyze(self, text: str) -> tuple:
+        tokens = tokenize(text)
+        if self.remove_stopwords:
+            tokens = [t for t in tokens if t not in STOPWORDS]
+        if self.stemming:
+            tokens = [stem(t) for t in tokens]
+        return tuple(tokens)
+
+    def analyze(self, text: str) -> List[str]:
+        return list(self._cached(text or ""))
+
+    def term_set(self, text: str) -> FrozenSet[str]:
+        return frozenset(self._cached(text or ""))
+
+    def keywords(self, text: str, cap: int = 10, min_len: int = 3) -> List[str]:
+        """Distinct content terms in order of first appearance."""
+        seen = dict.fromkeys(t for t in self._cached(text or "") if len(t) >= min_len)
+        return list(seen)[:cap]
+
+    def overlap(self, a: str, b: str) -> int:
+        return len(self.term_set(a) & self.term_set(b))
+
+
+# Shared instance used by ingest, retrieval, judging and citation
+analyzer = Analyzer(remove_stopwords=TEXT_ANALYZER_STOPWORDS, stemming=TEXT_ANALYZER_STEMMING)
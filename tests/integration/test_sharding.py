@@ -0,0 +1,124 @@
+# tests/integration/test_sharding.py
+# Spins up several shard processes on localhost and queries them through the coordinator.
+import os
+import sys
+import json
+import time
+import socket
+import subprocess
+import urllib.request
+import numpy as np
+import pytest
+from app.sharding.coordinator import ShardCoordinator
+from app.pdfParser.indexWriter import DocumentIndexWriter
+from app.retrieval.binaryIndex import BinaryIndex
+from app.retrieval.sparseRetriever import SparseRetriever
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_healthy(url: str, timeout: float = 20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=1) as r:
+                if json.loads(r.read())["status"] == "ok":
+                    return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f"Shard {url} did not start")
+
+
+@pytest.fixture
+def shards(tmp_path):
+    procs, urls = [], []
+    for i in range(3):
+        port = _free_port()
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "app.sharding.shardServer", "--port", str(port),
+             "--data-dir", str(tmp_path / f"shard{i}"), "--shard-id", str(i)],
+            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+        urls.append(f"http://127.0.0.1:{port}")
+    try:
+        for url in urls:
+            _wait_healthy(url)
+        yield urls
+    finally:
+        for p in procs:
+            p.terminate()
+            p.wait(timeout=10)
+
+
+def test_documents_are_partitioned_and_results_merged(shards):
+    coordinator = ShardCoordinator(shards)
+    rng = np.random.default_rng(0)
+    topics = {"gpu": "gpu cuda kernels throughput", "tax": "tax filing deductions income", "bio": "protein folding cells"}
+    vectors = {}
+    for d in range(9):
+        doc_id = f"doc{d}"
+        topic = list(topics)[d % 3]
+        emb = rng.standard_normal((4, 32)).astype(np.float32)
+        emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+        vectors[doc_id] = emb
+        coordinator.index_document(
+            doc_id,
+            chunk_ids=[f"{doc_id}_page1_chunk{i}" for i in range(4)],
+            texts=[f"{topics[topic]} section {i}" for i in range(4)],
+            embeddings=emb,
+            pages=[1] * 4,
+        )
+
+    stats = coordinator.stats()
+    assert sum(s["documents"] for s in stats) == 9
+    assert sum(1 for s in stats if s["documents"] > 0) >= 2
+
+    # restricted to two documents (likely on different shards), query by doc3's first vector
+    hits = coordinator.query("gpu kernels", vectors["doc3"][0], doc_ids=["doc3", "doc4"], top_k=5)
+    assert hits and hits[0]["chunk"]["id"] == "doc3_page1_chunk0"
+    assert {h["chunk"]["meta"]["doc_id"] for h in hits} <= {"doc3", "doc4"}
+
+    # broadcast query across every shard
+    hits = coordinator.query("tax deductions", vectors["doc1"][2], top_k=10)
+    assert len(hits) == 10
+    assert "doc1_page1_chunk2" in {h["chunk"]["id"] for h in hits}
+
+
+class RecordingChroma:
+    def __init__(self):
+        self.added = []
+
+    def add_chunk(self, chunk_id, **kwargs):
+        self.added.append(chunk_id)
+
+
+def test_sharded_ingest_keeps_no_local_index(shards, tmp_path):
+    coordinator = ShardCoordinator(shards)
+    chroma = RecordingChroma()
+    sparse = SparseRetriever(cache_dir=str(tmp_path / "api" / "bm25"))
+    binary = BinaryIndex(str(tmp_path / "api" / "binary"))
+    writer = DocumentIndexWriter("docA", chroma=chroma, sparse=sparse, binary=binary, coordinator=coordinator)
+    rng = np.random.default_rng(1)
+    for page in (1, 2):
+        chunks = [{"id": f"docA_page{page}_chunk{i}", "text": f"budget approval step {page}.{i}"} for i in range(3)]
+        writer.add_page(page, chunks, rng.standard_normal((3, 32)).astype(np.float32))
+    writer.commit()
+
+    # the API node holds nothing for the document
+    assert chroma.added == []
+    assert sparse.listDocuments() == [] and not sparse.builders
+    assert not binary.has_document("docA") and not binary._pending
+    # the owning shard has all six chunks and serves them
+    assert sum(s["documents"] for s in coordinator.stats()) == 1
+    hits = coordinator.query("budget approval", rng.standard_normal(32), doc_ids=["docA"], top_k=10)
+    assert {h["chunk"]["id"] for h in hits} == {f"docA_page{p}_chunk{i}" for p in (1, 2) for i in range(3)}
+
+    coordinator.delete_document("docA")
+    assert sum(s["documents"] for s in coordinator.stats()) == 0
+    assert all(r["orphansRemoved"] == [] for r in coordinator.compact())
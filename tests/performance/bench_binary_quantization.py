@@ -0,0 +1,55 @@
+# tests/performance/bench_binary_quantization.py
+# Binary (1-bit sign) prefilter + float rescoring vs. exact float search on a
+# generated corpus. Reports memory footprint, QPS and recall@10.
+# Usage: python -m tests.performance.bench_binary_quantization [n_chunks]
+import sys
+import time
+import tempfile
+import numpy as np
+from app.retrieval.binaryIndex import BinaryIndex
+
+
+def generate_corpus(n: int, dim: int = 384, n_topics: int = 200, seed: int = 0) -> np.ndarray:
+    """Clustered, L2-normalized vectors: closer to real sentence embeddings than pure noise."""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    x = topics[rng.integers(0, n_topics, n)] + 0.8 * rng.standard_normal((n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def run(n: int = 200_000, rescore_ks=(100, 200, 500, 1000), n_queries: int = 200, top_k: int = 10):
+    corpus = generate_corpus(n)
+    rng = np.random.default_rng(1)
+    dim = corpus.shape[1]
+    # perturb real chunks by ~0.3 in norm so queries land near, not on, stored vectors
+    queries = corpus[rng.choice(n, n_queries, replace=False)] + (0.3 / np.sqrt(dim)) * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    t0 = time.perf_counter()
+    truth = [np.argpartition(-(corpus @ q), top_k)[:top_k] for q in queries]
+    float_qps = n_queries / (time.perf_counter() - t0)
+
+    print(f"corpus={n} dim={dim} queries={n_queries}")
+    with tempfile.TemporaryDirectory() as tmp:
+        index = BinaryIndex(tmp)
+        index.add("bench", [str(i) for i in range(n)], corpus)
+        index.save("bench")
+        mem = index.memory_footprint("bench")
+        print(f"memory   float32={mem['float_bytes'] / 1e6:.1f} MB  binary codes={mem['codes_bytes'] / 1e6:.1f} MB  "
+              f"({mem['float_bytes'] / max(1, mem['codes_bytes']):.0f}x smaller)")
+        print(f"exact float scan: {float_qps:.1f} QPS")
+
+        index.search("bench", queries[0], top_k=top_k)  # warm the load
+        for rescore_k in rescore_ks:
+            t0 = time.perf_counter()
+            approx = [index.search("bench", q, top_k=top_k, rescore_k=rescore_k) for q in queries]
+            qps = n_queries / (time.perf_counter() - t0)
+            recall = np.mean([
+                len({str(i) for i in t} & {h["id"] for h in a}) / top_k
+                for t, a in zip(truth, approx)
+            ])
+            print(f"binary+rescore rescore_k={rescore_k:<5} {qps:8.1f} QPS  recall@{top_k}={recall:.3f}")
+
+
+if __name__ == "__main__":
+    run(n=int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,59 @@
+# tests/performance/bench_llm_prefix_cache.py
+# Prompt evaluation with and without the saved KV state of each registered
+# static template (LLMClient.register_prefix). Each prompt is generated with
+# max_tokens=1 so the time is dominated by prompt evaluation. Cold runs reset
+# the context first; warm runs restore the template's prefix state.
+# Usage: python -m tests.performance.bench_llm_prefix_cache [repeats]
+import sys
+import time
+import numpy as np
+from app.llm.llmClient import llmClient
+from app.rag.prompts import RQ_PROMPT
+from app.llm.queryDecomposition import DECOMPOSITION_PROMPT
+from app.llm.sourceCiter import CITATION_PROMPT_HEADER
+from app.rag.hybridRagPipeline import ANSWER_PROMPT_HEADER
+
+QUESTIONS = [
+    "What is the approval process for budget changes?",
+    "Which teams report quarterly revenue and how is risk tracked?",
+    "Summarize the section on procurement limits.",
+]
+CONTEXT = "[1] (page=3)\nBudget changes above the quarterly limit are approved by the finance lead.\n\n"
+
+TEMPLATES = {
+    "query_refiner": lambda q: RQ_PROMPT.format(question=q),
+    "decomposition": lambda q: DECOMPOSITION_PROMPT.replace("{query}", q),
+    "answer": lambda q: ANSWER_PROMPT_HEADER + f"{CONTEXT}Question: {q}\n\nAnswer:",
+    "citation": lambda q: CITATION_PROMPT_HEADER + f'\nThe user asked: "{q}"\nThe assistant answered: "..."\n\n'
+                                                   f"Here are the available source chunks with IDs and page numbers:\n"
+                                                   f"{CONTEXT}\nCitations JSON:\n",
+}
+
+
+def timed(prompt: str, warm: bool) -> float:
+    with llmClient.lock:
+        if warm:
+            llmClient._restore_prefix(prompt)
+        else:
+            llmClient.llm.reset()
+        started = time.perf_counter()
+        llmClient.llm(prompt=prompt, max_tokens=1, temperature=0.0)
+        return time.perf_counter() - started
+
+
+def run(repeats: int = 3):
+    print(f"model={llmClient.model_path}")
+    for name, build in TEMPLATES.items():
+        cold, warm = [], []
+        for _ in range(repeats):
+            for q in QUESTIONS:
+                cold.append(timed(build(q), warm=False))
+                warm.append(timed(build(q), warm=True))
+        stats = llmClient.prefix_cache_stats().get(name, {})
+        c, w = 1000 * np.median(cold), 1000 * np.median(warm)
+        print(f"  {name:14s} prefix={stats.get('tokens', 0):4d} tokens  cold={c:7.1f} ms  "
+              f"with prefix state={w:7.1f} ms  saved={c - w:7.1f} ms/call ({100 * (1 - w / max(c, 1e-9)):.0f}%)")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
@@ -0,0 +1,45 @@
+# tests/performance/bench_onnx_reranker.py
+# float32 PyTorch cross-encoder vs. its int8 ONNX Runtime export
+# (python -m app.scripts.exportOnnxReranker) across candidate counts.
+# Reports median latency per rerank call and per-query Spearman correlation
+# of the int8 scores against float32.
+# Usage: python -m tests.performance.bench_onnx_reranker [repeats]
+import sys
+import time
+import numpy as np
+from sentence_transformers import CrossEncoder
+from app.config import RERANK_MODEL_NAME, RERANK_MAX_LENGTH, RERANK_ONNX_DIR
+from app.retrieval.onnxCrossEncoder import OnnxCrossEncoder, spearman
+from tests.performance.bench_rerank_batching import generate_pool
+
+CANDIDATE_COUNTS = (5, 15, 30, 60)
+QUERY = "what is the approval process for budget changes"
+
+
+def median_ms(fn, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return 1000 * float(np.median(times))
+
+
+def run(repeats: int = 20):
+    torch_model = CrossEncoder(RERANK_MODEL_NAME, max_length=RERANK_MAX_LENGTH)
+    onnx_model = OnnxCrossEncoder(str(RERANK_ONNX_DIR), max_length=RERANK_MAX_LENGTH)
+    rng = np.random.default_rng(0)
+    print(f"model={RERANK_MODEL_NAME} max_length={RERANK_MAX_LENGTH} repeats={repeats}")
+    for n in CANDIDATE_COUNTS:
+        pairs = [(QUERY, t) for t in generate_pool(n, rng)]
+        torch_model.predict(pairs, show_progress_bar=False)  # warm-up
+        onnx_model.predict(pairs)
+        torch_ms = median_ms(lambda: torch_model.predict(pairs, batch_size=32, show_progress_bar=False), repeats)
+        onnx_ms = median_ms(lambda: onnx_model.predict(pairs, batch_size=32), repeats)
+        rho = spearman(torch_model.predict(pairs, show_progress_bar=False), onnx_model.predict(pairs))
+        print(f"  candidates={n:<3d} torch={torch_ms:7.1f} ms  onnx-int8={onnx_ms:7.1f} ms  "
+              f"({torch_ms / max(onnx_ms, 1e-9):.1f}x)  spearman={rho:.4f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,82 @@
+# tests/performance/bench_rerank_batching.py
+# CPU time per reranked candidate: unsorted default-batch CrossEncoder.predict
+# (the old path) vs. length-sorted batches with max_length, and concurrent
+# requests coalesced into shared forward passes. Also times the embedding
+# fallback (per-vector loop vs. one matrix-vector product).
+# Usage: python -m tests.performance.bench_rerank_batching [n_requests] [pool_size]
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+def generate_pool(n: int, rng) -> list:
+    """Chunks with a long-tailed length distribution (most short, some near the chunker limit)."""
+    words = ["retrieval", "document", "policy", "the", "of", "approval", "system", "page", "budget", "report",
+             "section", "table", "figure", "process", "and", "value", "quarter", "revenue", "risk", "team"]
+    lengths = rng.lognormal(mean=4.0, sigma=0.8, size=n).clip(8, 400).astype(int)
+    return [" ".join(rng.choice(words, size=L)) for L in lengths]
+
+
+def cpu_per_candidate(fn, n_candidates: int) -> tuple:
+    wall, cpu = time.perf_counter(), time.process_time()
+    fn()
+    return (1000 * (time.process_time() - cpu) / n_candidates,
+            1000 * (time.perf_counter() - wall) / n_candidates)
+
+
+def bench_cross_encoder(n_requests: int, pool: int, rng):
+    try:
+        from sentence_transformers import CrossEncoder
+    except ImportError:
+        print("sentence_transformers not installed; skipping cross-encoder timings")
+        return
+    from app.retrieval.reranker import Reranker
+
+    requests = [("what is the approval process for budget changes", generate_pool(pool, rng))
+                for _ in range(n_requests)]
+    n = n_requests * pool
+    baseline = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+    engine = Reranker(coalesce_window=0)
+    coalesced = Reranker(coalesce_window=0.003)
+    baseline.predict([("warm", "up")])
+    engine.predict([("warm", "up")])
+
+    old = cpu_per_candidate(lambda: [baseline.predict([(q, t) for t in texts]) for q, texts in requests], n)
+    new = cpu_per_candidate(lambda: [engine.predict([(q, t) for t in texts]) for q, texts in requests], n)
+    with ThreadPoolExecutor(max_workers=n_requests) as pool_exec:
+        shared = cpu_per_candidate(lambda: list(pool_exec.map(
+            lambda r: coalesced.batcher.score([(r[0], t) for t in r[1]]), requests)), n)
+
+    print(f"cross-encoder  requests={n_requests} pool={pool} batch={engine.batch_size} max_length={engine.max_length}")
+    for label, (cpu, wall) in (("unsorted predict", old), ("length-sorted", new), ("coalesced concurrent", shared)):
+        print(f"  {label:22s} cpu={cpu:.2f} ms/candidate  wall={wall:.2f} ms/candidate")
+
+
+def bench_fallback(n: int = 200, dim: int = 768, repeats: int = 200, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    q = rng.standard_normal(dim).astype(np.float32)
+    docs = rng.standard_normal((n, dim)).astype(np.float32)
+
+    def loop():
+        qv = np.array(q, dtype=float)
+        qnorm = np.linalg.norm(qv) + 1e-12
+        return [float(np.dot(qv, np.array(v, dtype=float)) / (qnorm * (np.linalg.norm(v) + 1e-12))) for v in docs]
+
+    def vectorized():
+        return docs @ q / ((np.linalg.norm(docs, axis=1) + 1e-12) * (np.linalg.norm(q) + 1e-12))
+
+    assert np.allclose(loop(), vectorized(), atol=1e-5)
+    for label, fn in (("python loop", loop), ("vectorized", vectorized)):
+        cpu = time.process_time()
+        for _ in range(repeats):
+            fn()
+        print(f"  fallback {label:12s} {1e6 * (time.process_time() - cpu) / (repeats * n):.2f} us/candidate")
+
+
+if __name__ == "__main__":
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    pool = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    bench_cross_encoder(n_requests, pool, np.random.default_rng(0))
+    print("embedding fallback  candidates=200 dim=768")
+    bench_fallback()
@@ -0,0 +1,78 @@
+# tests/performance/bench_rerank_cascade.py
+# Offline tuning of RERANK_CASCADE_M. Known-item queries are sampled from an
+# ingested document's chunks (one sentence each); for every query the fused
+# retrieval pool is scored by the full cross-encoder and by the cascade at
+# several M. Reports overlap with the full top-k (recall loss), how often the
+# source chunk stays in the top-k, and cross-encoder time per query.
+# Usage: python -m tests.performance.bench_rerank_cascade <docId> [n_queries] [pool] [top_k]
+import sys
+import time
+import numpy as np
+from app.storage.documentStore import documentStore
+from app.retrieval.blendedRetriever import blendedRetriever
+from app.retrieval.reranker import Reranker
+
+M_VALUES = (5, 10, 15, 20, 30, 40)
+
+
+def sample_queries(doc_id: str, n: int, seed: int = 0):
+    """(sentence, source chunk id) pairs from the document's chunks."""
+    doc = documentStore.getDocument(doc_id)
+    if not doc:
+        raise SystemExit(f"Document not found: {doc_id}")
+    rng = np.random.default_rng(seed)
+    queries = []
+    for i in rng.permutation(len(doc["chunks"])):
+        chunk = doc["chunks"][i]
+        sentences = [s.strip() for s in chunk["text"].split(".") if len(s.split()) >= 6]
+        if sentences:
+            queries.append((sentences[rng.integers(len(sentences))], chunk["id"]))
+        if len(queries) == n:
+            break
+    return queries
+
+
+def timed_rerank(reranker: Reranker, query: str, pool, top_k: int):
+    started = time.perf_counter()
+    ranked = reranker.rerank(query, [c.copy() for c in pool], top_k=top_k)
+    return [c.id for c in ranked], time.perf_counter() - started
+
+
+def run(doc_id: str, n_queries: int = 50, pool_size: int = 40, top_k: int = 5):
+    queries = sample_queries(doc_id, n_queries)
+    pools = [blendedRetriever.query(doc_id, q, top_k=pool_size, rerank=False, mmr_lambda=1.0) for q, _ in queries]
+    # no score cache, no coalescing: every configuration pays for its own forward passes
+    reranker = Reranker(cascade_m=0, coalesce_window=0)
+    reranker.score_cache = None
+    if reranker.model is None:
+        raise SystemExit("sentence_transformers / cross-encoder not available")
+
+    reference, full_s, full_hits = [], 0.0, 0
+    for (q, source), pool in zip(queries, pools):
+        ids, seconds = timed_rerank(reranker, q, pool, top_k)
+        reference.append(ids)
+        full_s += seconds
+        full_hits += source in ids
+    n = len(queries)
+    print(f"doc={doc_id} queries={n} pool={pool_size} top_k={top_k} "
+          f"avg pool={np.mean([len(p) for p in pools]):.1f}")
+    print(f"  full       cross-encoder={1000 * full_s / n:6.1f} ms/query  source@{top_k}={full_hits / n:.2f}")
+
+    for m in M_VALUES:
+        reranker.cascade_m = m
+        cascade_s, overlap, hits = 0.0, 0.0, 0
+        for (q, source), pool, ref in zip(queries, pools, reference):
+            ids, seconds = timed_rerank(reranker, q, pool, top_k)
+            cascade_s += seconds
+            overlap += len(set(ids) & set(ref)) / max(1, len(ref))
+            hits += source in ids
+        print(f"  M={m:<3d}      cross-encoder={1000 * cascade_s / n:6.1f} ms/query  "
+              f"saved={100 * (1 - cascade_s / max(full_s, 1e-9)):5.1f}%  "
+              f"recall vs full top-{top_k}={overlap / n:.3f}  source@{top_k}={hits / n:.2f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise SystemExit("Usage: python -m tests.performance.bench_rerank_cascade <docId> [n_queries] [pool] [top_k]")
+    args = [int(a) for a in sys.argv[2:5]]
+    run(sys.argv[1], *args)
@@ -0,0 +1,44 @@
+# tests/unit/test_binary_index.py
+import numpy as np
+from app.retrieval.binaryIndex import BinaryIndex, pack_signs, hamming_distances
+
+
+def test_hamming_distances_match_bit_differences():
+    a = np.array([[1.0, -1.0, 1.0, -1.0, 1.0, 1.0, 1.0, 1.0, -1.0]])
+    b = np.array([[1.0, 1.0, 1.0, -1.0, -1.0, 1.0, 1.0, 1.0, 1.0]])
+    assert pack_signs(a).shape == (1, 2)
+    assert hamming_distances(pack_signs(a), pack_signs(b)[0])[0] == 3
+
+
+def test_prefilter_with_rescoring_finds_exact_top1(tmp_path):
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((1000, 64)).astype(np.float32)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    index = BinaryIndex(str(tmp_path), rescore_k=50)
+    index.add("doc", [f"c{i}" for i in range(500)], x[:500])
+    index.add("doc", [f"c{i}" for i in range(500, 1000)], x[500:])
+    index.save("doc")
+
+    hits = index.search("doc", x[123], top_k=5)
+    assert hits[0]["id"] == "c123"
+    assert hits == sorted(hits, key=lambda h: h["score"], reverse=True)
+    assert index.memory_footprint("doc")["float_bytes"] == 32 * index.memory_footprint("doc")["codes_bytes"]
+    assert index.search("other", x[0]) == []
+
+
+def test_delete_frees_disk(tmp_path):
+    index = BinaryIndex(str(tmp_path))
+    index.add("doc", ["a", "b"], np.eye(2, 16, dtype=np.float32))
+    index.save("doc")
+    assert index.delete("doc") > 0
+    assert index.search("doc", np.ones(16)) == []
+    assert index.delete("doc") == 0
+
+
+def test_delete_drops_vectors_buffered_by_a_failed_ingest(tmp_path):
+    index = BinaryIndex(str(tmp_path))
+    index.add("doc", ["a", "b"], np.eye(2, 16, dtype=np.float32))
+    assert index.delete("doc") == 0
+    assert "doc" not in index._pending
+    index.save("doc")  # nothing left to write
+    assert not index.has_document("doc") and not (tmp_path / "doc").exists()
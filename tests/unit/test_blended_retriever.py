@@ -0,0 +1,74 @@
+# tests/unit/test_blended_retriever.py
+import threading
+import time
+import pytest
+import app.retrieval.blendedRetriever as blended_module
+from app.retrieval.blendedRetriever import BlendedRetriever
+from app.retrieval.candidate import Candidate
+from app.utils.metrics import metrics
+
+
+@pytest.fixture
+def make_retriever(monkeypatch):
+    monkeypatch.setattr(blended_module, "EmbeddingClient", lambda: type("Stub", (), {"generateEmbedding": None})())
+    retrievers = []
+
+    def make(**kwargs):
+        r = BlendedRetriever(**kwargs)
+        retrievers.append(r)
+        return r
+    yield make
+    for r in retrievers:
+        r.executor.shutdown(wait=True)
+
+
+def _dense(*ids):
+    return [Candidate(id=i, doc_id="docA", text=i, score=s, dense_score=s) for i, s in zip(ids, (0.9, 0.8, 0.7))]
+
+
+def test_queueing_on_the_shared_pool_does_not_count_against_a_branch(make_retriever):
+    r = make_retriever(max_workers=1, dense_timeout=0.2, sparse_timeout=0.2, queue_timeout=5.0)
+    release = threading.Event()
+    busy = r.executor.submit(release.wait, 5)  # another request holds the only worker
+    futures = {
+        r._submit("dense", lambda: _dense("c1", "c2")): ("dense", "docA"),
+        r._submit("sparse", lambda: [Candidate(id="c3", doc_id="docA", score=1.0, sparse_score=1.0)]): ("sparse", "docA"),
+    }
+    threading.Timer(0.5, release.set).start()  # longer than either branch timeout
+    results = r._gather(futures)
+    assert [c.id for c in results["dense"]] == ["c1", "c2"] and [c.id for c in results["sparse"]] == ["c3"]
+    busy.result()
+
+
+def test_slow_branch_times_out_and_the_other_is_fused_alone(make_retriever):
+    r = make_retriever(max_workers=2, dense_timeout=1.0, sparse_timeout=0.1)
+    before = metrics.snapshot()["counters"]
+    release = threading.Event()
+
+    def slow_sparse():
+        release.wait(5)
+        return [Candidate(id="late", doc_id="docA", score=1.0, sparse_score=1.0)]
+    futures = {
+        r._submit("dense", lambda: _dense("c1", "c2", "c3")): ("dense", "docA"),
+        r._submit("sparse", slow_sparse): ("sparse", "docA"),
+    }
+    started = time.perf_counter()
+    results = r._gather(futures)
+    release.set()
+    assert time.perf_counter() - started < 0.9
+    assert results["sparse"] == []
+    ranked, full = r._fused(results, 3)
+    assert [c.id for c in ranked] == ["c1", "c2", "c3"] and full
+    after = metrics.snapshot()["counters"]
+    for name in ("retrieval.sparse.timeouts", "retrieval.degraded.sparse"):
+        assert after.get(name, 0) == before.get(name, 0) + 1
+
+
+def test_branch_that_never_gets_a_worker_is_dropped(make_retriever):
+    r = make_retriever(max_workers=1, dense_timeout=1.0, sparse_timeout=1.0, queue_timeout=0.2)
+    release = threading.Event()
+    r.executor.submit(release.wait, 5)
+    fut = r._submit("dense", lambda: _dense("c1"))
+    results = r._gather({fut: ("dense", "docA")})
+    release.set()
+    assert results["dense"] == [] and fut.cancelled()
@@ -0,0 +1,184 @@
+# tests/unit/test_bm25_index.py
+import os
+import pickle
+import time
+import pytest
+import numpy as np
+from rank_bm25 import BM25Okapi
+from app.retrieval.bm25Index import BM25Index, BM25Builder
+from app.retrieval.sparseRetriever import SparseRetriever
+
+WORDS = ["revenue", "growth", "table", "figure", "the", "of", "margin", "cost", "q3", "report", "risk", "net"]
+
+
+def _corpus(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(WORDS, size=rng.integers(3, 30))) for _ in range(n)]
+
+
+def test_scores_match_rank_bm25():
+    texts = _corpus()
+    tokenized = [t.split() for t in texts]
+    ref = BM25Okapi(tokenized)
+    index = BM25Index.build(tokenized, [f"c{i}" for i in range(len(texts))], texts)
+
+    for query in (["revenue", "growth"], ["the", "of", "the"], ["risk", "unknown"]):
+        expected = ref.get_scores(query)
+        cand, scores = index.score(query)
+        dense = np.zeros(len(texts))
+        dense[cand] = scores
+        np.testing.assert_allclose(dense, expected, rtol=1e-4, atol=1e-5)
+
+        top = index.top_k(query, 10)
+        # top-k ranks the chunks that match at least one query term
+        np.testing.assert_allclose([s for _, s in top], np.sort(expected[cand])[::-1][:10], rtol=1e-4)
+
+
+def test_save_load_roundtrip(tmp_path):
+    texts = _corpus(50)
+    ids = [f"c{i}" for i in range(50)]
+    index = BM25Index.build([t.split() for t in texts], ids, texts)
+    index.save(str(tmp_path / "idx"))
+
+    loaded = BM25Index.load(str(tmp_path / "idx"))
+    assert isinstance(loaded.post_docs, np.memmap)
+    assert list(loaded.ids) == ids and loaded.texts[7] == texts[7]
+    assert loaded.top_k(["margin", "cost"], 5) == index.top_k(["margin", "cost"], 5)
+    assert BM25Index.load(str(tmp_path / "missing")) is None
+
+
+def test_sparse_retriever_migrates_pickle(tmp_path):
+    texts, ids = ["net revenue grew", "cost of risk"], ["a", "b"]
+    with open(tmp_path / "doc.pkl", "wb") as f:
+        pickle.dump({"bm25": BM25Okapi([t.split() for t in texts]), "chunks": texts, "ids": ids}, f)
+
+    retriever = SparseRetriever(cache_dir=str(tmp_path))
+    hits = retriever.query("doc", "revenue", top_k=5)
+    assert [h["id"] for h in hits] == ["a"]
+    assert not (tmp_path / "doc.pkl").exists()
+    assert retriever.listDocuments() == ["doc"]
+    assert retriever.deleteDocument("doc") > 0
+    assert retriever.listDocuments() == []
+
+
+def test_builder_append_delete_matches_full_build():
+    texts = _corpus(60, seed=1)
+    ids = [f"c{i}" for i in range(60)]
+    tokenized = [t.split() for t in texts]
+    builder = BM25Builder()
+    for start in range(0, 60, 10):  # page by page
+        builder.append(tokenized[start:start + 10], ids[start:start + 10], texts[start:start + 10])
+    assert builder.delete(["c3", "c40", "missing"]) == 2
+
+    keep = [i for i in range(60) if ids[i] not in ("c3", "c40")]
+    expected = BM25Index.build([tokenized[i] for i in keep], [ids[i] for i in keep], [texts[i] for i in keep])
+    frozen = builder.freeze()
+    assert list(frozen.ids) == list(expected.ids)
+    assert frozen.top_k(["growth", "risk"], 8) == expected.top_k(["growth", "risk"], 8)
+
+    again = BM25Builder.from_index(frozen)
+    assert again.stats() == builder.stats()
+
+
+def test_sparse_retriever_appends_pages_and_flushes_once(tmp_path):
+    retriever = SparseRetriever(cache_dir=str(tmp_path), flush_interval=0)
+    retriever.appendChunks("doc", ["net revenue grew"], ["p1"])
+    retriever.appendChunks("doc", ["operating cost of risk"], ["p2"])
+    assert [h["id"] for h in retriever.query("doc", "revenue risk")] and retriever.listDocuments() == []
+
+    retriever.flush("doc")
+    reloaded = SparseRetriever(cache_dir=str(tmp_path), flush_interval=0)
+    assert {h["id"] for h in reloaded.query("doc", "revenue risk")} == {"p1", "p2"}
+
+    assert reloaded.deleteChunks("doc", ["p1"]) == 1
+    assert [h["id"] for h in reloaded.query("doc", "revenue risk")] == ["p2"]
+
+
+def test_sparse_index_cache_evicts_and_reloads_lazily(tmp_path):
+    texts = _corpus(40)
+    ids = [f"c{i}" for i in range(40)]
+    retriever = SparseRetriever(cache_dir=str(tmp_path), flush_interval=0)
+    for d in ("d1", "d2", "d3"):
+        retriever.indexDocument(d, texts, ids)
+    one = retriever.indices.get("d3").memory_bytes()
+
+    budgeted = SparseRetriever(cache_dir=str(tmp_path), flush_interval=0, max_bytes=2 * one + 1)
+    expected = budgeted.query("d1", "revenue growth")
+    budgeted.query("d2", "revenue growth")
+    budgeted.query("d3", "revenue growth")  # evicts d1 (least recently used)
+    assert "d1" not in budgeted.indices and len(budgeted.indices) == 2
+    assert budgeted.query("d1", "revenue growth") == expected  # reloaded from the memory map
+
+    stats = budgeted.indices.stats()
+    assert stats["misses"] == 4 and stats["evictions"] == 2 and stats["bytes"] <= 2 * one + 1
+
+
+def test_maxscore_matches_exhaustive_top_k():
+    rng = np.random.default_rng(3)
+    vocab = [f"t{i}" for i in range(400)]
+    p = 1.0 / np.arange(1, 401)
+    p /= p.sum()  # Zipfian: a few very common terms, many rare ones
+    tokenized = [list(rng.choice(vocab, size=rng.integers(5, 40), p=p)) for _ in range(3000)]
+    index = BM25Index.build(tokenized, [str(i) for i in range(3000)], [""] * 3000)
+    mask = rng.random(3000) < 0.5
+
+    pruned_any = False
+    for _ in range(30):
+        query = list(rng.choice(vocab, size=rng.integers(2, 12), p=p)) + [vocab[rng.integers(100, 400)]]
+        for m in (None, mask):
+            hits, evaluated, total = index.maxscore_top_k(query, 10, mask=m)
+            cand, scores = index.score(query, m)
+            expected = np.sort(scores)[::-1][:10]
+            np.testing.assert_allclose([s for _, s in hits], expected, rtol=1e-5)
+            full = dict(zip(cand.tolist(), scores.tolist()))
+            assert all(abs(full[i] - s) < 1e-4 for i, s in hits)
+            pruned_any |= evaluated < total
+    assert pruned_any
+
+
+def test_keyword_boost_matches_brute_force():
+    rng = np.random.default_rng(5)
+    vocab = [f"t{i}" for i in range(200)]
+    p = 1.0 / np.arange(1, 201)
+    p /= p.sum()
+    tokenized = [list(rng.choice(vocab, size=rng.integers(5, 30), p=p)) for _ in range(1000)]
+    index = BM25Index.build(tokenized, [str(i) for i in range(1000)], [""] * 1000)
+
+    for _ in range(20):
+        query = list(rng.choice(vocab, size=rng.integers(2, 8), p=p))
+        keywords = list(rng.choice(vocab, size=3))
+        expected = np.zeros(1000)
+        cand, scores = index.score(query)
+        expected[cand] = scores
+        expected += [0.1 * len(set(keywords) & set(toks)) for toks in tokenized]
+        for prune in (True, False):
+            hits = index.top_k(query, 10, prune=prune, keyword_tokens=keywords, keyword_boost=0.1)
+            np.testing.assert_allclose([s for _, s in hits], np.sort(expected)[::-1][:10], rtol=1e-5)
+            assert all(abs(expected[i] - s) < 1e-4 for i, s in hits)
+
+
+def test_discard_after_failed_ingest_leaves_no_index(tmp_path):
+    retriever = SparseRetriever(cache_dir=str(tmp_path), flush_interval=0.05)
+    retriever.appendChunks("doc", ["net revenue grew"], ["p1"])
+    retriever.flush("doc")  # an earlier page already reached disk
+    retriever.appendChunks("doc", ["operating cost of risk"], ["p2"])
+    retriever.discard("doc")  # ingest failed on a later page
+
+    time.sleep(0.2)  # the flush timer must not resurrect it
+    assert retriever.listDocuments() == [] and not os.listdir(tmp_path)
+    assert not retriever.builders and not retriever.dirty_since
+    with pytest.raises(FileNotFoundError):
+        retriever.query("doc", "revenue")
+
+
+def test_sparse_retriever_reports_every_change(tmp_path):
+    # BlendedRetriever listens to take a changed document out of the corpus BM25 index
+    retriever = SparseRetriever(cache_dir=str(tmp_path), flush_interval=0)
+    changed = []
+    retriever.on_change(changed.append)
+    retriever.indexDocument("a", ["net revenue grew"], ["a1"])
+    retriever.appendChunks("b", ["operating cost"], ["b1"])
+    retriever.flush("b")
+    assert retriever.deleteChunks("a", ["missing"]) == 0
+    assert retriever.deleteChunks("a", ["a1"]) == 1
+    assert changed == ["a", "b", "a"]
@@ -0,0 +1,32 @@
+# tests/unit/test_bounded_cache.py
+import time
+from app.utils.cache import BoundedCache
+from app.utils.metrics import Histogram
+
+
+def test_lfu_keeps_frequently_used_entries():
+    cache = BoundedCache("test_lfu", max_items=2, policy="lfu")
+    cache.put("a", 1)
+    cache.put("b", 2)
+    for _ in range(3):
+        cache.get("a")
+    cache.put("c", 3)
+    assert "a" in cache and "b" not in cache and cache.stats()["evictions"] == 1
+
+
+def test_size_budget_and_ttl():
+    cache = BoundedCache("test_ttl", max_bytes=10, ttl=0.05, sizeof=len)
+    cache.put("x", "abcdef")
+    cache.put("y", "ghijkl")  # 12 bytes > budget: x goes
+    assert cache.get("x") is None and cache.get("y") == "ghijkl"
+    time.sleep(0.06)
+    assert cache.get("y") is None
+    assert cache.stats()["hitRate"] == round(1 / 3, 4)
+
+
+def test_histogram_quantiles():
+    h = Histogram(buckets=(0.01, 0.1, 1.0))
+    for v in (0.005, 0.05, 0.05, 0.5):
+        h.observe(v)
+    snap = h.snapshot()
+    assert snap["count"] == 4 and snap["p50"] == 0.1 and snap["buckets"]["+Inf"] == 0
@@ -0,0 +1,23 @@
+from app.retrieval.candidate import Candidate
+
+
+def test_page_and_doc_come_from_metadata():
+    c = Candidate.from_dense({"id": "d_x_7", "text": "body", "meta": {"doc_id": "d", "page": "3"}}, 0.8)
+    assert (c.doc_id, c.page, c.dense_score, c.score) == ("d", 3, 0.8, 0.8)
+    assert Candidate.from_chunk({"id": "d_page9_chunk0", "text": "", "meta": {}}).page is None  # no id parsing
+
+
+def test_coerce_legacy_shapes():
+    legacy = Candidate.coerce({"chunk": {"id": "a", "text": "t", "meta": {"page": 2}}, "score": 0.5, "rerank_score": 0.9})
+    assert (legacy.id, legacy.text, legacy.page, legacy.score, legacy.rerank_score) == ("a", "t", 2, 0.5, 0.9)
+    assert Candidate.coerce({"text": "plain"}).text == "plain"
+    assert Candidate.coerce("raw").text == "raw"
+    assert Candidate.coerce(legacy) is legacy
+
+
+def test_sparse_hit_and_copy():
+    c = Candidate.from_sparse({"chunk": "text", "score": 2.0, "id": "a", "doc_id": "d", "page": 4})
+    clone = c.copy()
+    clone.score = 0.0
+    assert (c.sparse_score, c.score, c.page, c.doc_id) == (2.0, 2.0, 4, "d")
+    assert c.to_dict()["chunk"] == {"id": "a", "text": "text", "meta": {"doc_id": "d", "page": 4}}
@@ -0,0 +1,44 @@
+# tests/unit/test_corpus_bm25.py
+import numpy as np
+from rank_bm25 import BM25Okapi
+from app.retrieval.bm25Index import BM25Index
+from app.retrieval.corpusBM25Index import CorpusBM25Index
+from app.utils.textAnalyzer import analyzer
+
+DOCS = {
+    "a": ["net revenue grew in europe", "operating cost rose", "revenue guidance raised"],
+    "b": ["credit risk provisions", "revenue from services", "headcount cost"],
+    "c": ["europe expansion plan", "risk factors and revenue risk"],
+}
+
+
+def _parts():
+    for doc_id, texts in DOCS.items():
+        ids = [f"{doc_id}_page{p + 1}_chunk0" for p in range(len(texts))]
+        index = BM25Index.build([analyzer.analyze(t) for t in texts], ids, texts, analyzer=analyzer.signature)
+        yield doc_id, index, list(range(1, len(texts) + 1))
+
+
+def test_corpus_idf_matches_single_index():
+    corpus = CorpusBM25Index.merge(_parts())
+    texts = [t for ts in DOCS.values() for t in ts]
+    ref = BM25Okapi([analyzer.analyze(t) for t in texts]).get_scores(analyzer.analyze("revenue risk"))
+    hits = corpus.search("revenue risk", top_k=len(texts))
+    matching = [i for i, t in enumerate(texts) if {"revenue", "risk"} & set(analyzer.analyze(t))]
+    np.testing.assert_allclose([h["score"] for h in hits], np.sort(ref[matching])[::-1], rtol=1e-4, atol=1e-6)
+    assert hits[0]["doc_id"] == "c"
+
+
+def test_doc_page_filters_and_tombstones(tmp_path):
+    corpus = CorpusBM25Index.merge(_parts())
+    assert {h["doc_id"] for h in corpus.search("revenue", doc_ids=["a", "b"])} == {"a", "b"}
+    assert [h["page"] for h in corpus.search("revenue", doc_ids=["a"], page_range=(2, 3))] == [3]
+
+    corpus.save(str(tmp_path))
+    loaded = CorpusBM25Index.load(str(tmp_path))
+    loaded.delete_document("c")
+    loaded.save_ids(str(tmp_path))
+    reloaded = CorpusBM25Index.load(str(tmp_path))
+    assert not reloaded.covers("c") and reloaded.covers("a")
+    assert "c" not in {h["doc_id"] for h in reloaded.search("risk europe")}
+    assert reloaded.search("risk", doc_ids=["c"]) == []
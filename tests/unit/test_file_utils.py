@@ -0,0 +1,38 @@
+# tests/unit/test_file_utils.py
+import os
+from app.utils.fileUtils import replace_dir, recover_dir
+
+
+def _write(path, text):
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "data"), "w") as f:
+        f.write(text)
+
+
+def _read(path):
+    with open(os.path.join(path, "data")) as f:
+        return f.read()
+
+
+def test_replace_dir_swaps_and_cleans_up(tmp_path):
+    live, new = str(tmp_path / "index"), str(tmp_path / "index.tmp")
+    _write(live, "v1")
+    _write(new, "v2")
+    replace_dir(new, live)
+    assert _read(live) == "v2"
+    assert not os.path.exists(new) and not os.path.exists(f"{live}.old")
+    # first build: nothing to move aside
+    _write(str(tmp_path / "fresh.tmp"), "v1")
+    replace_dir(str(tmp_path / "fresh.tmp"), str(tmp_path / "fresh"))
+    assert _read(str(tmp_path / "fresh")) == "v1"
+
+
+def test_interrupted_swap_keeps_the_old_index(tmp_path):
+    live = str(tmp_path / "index")
+    _write(f"{live}.old", "v1")  # crashed after moving the live dir aside
+    assert recover_dir(live) and _read(live) == "v1"
+    assert not recover_dir(live)  # nothing left to recover
+    _write(f"{live}.tmp", "v2")
+    _write(f"{live}.old", "stale")  # both present: the live one wins, the stale copy goes
+    replace_dir(f"{live}.tmp", live)
+    assert _read(live) == "v2" and not os.path.exists(f"{live}.old")
@@ -0,0 +1,20 @@
+# tests/unit/test_hash_ring.py
+from collections import Counter
+from app.sharding.hashRing import ConsistentHashRing
+
+
+def test_placement_is_balanced_and_stable():
+    ring = ConsistentHashRing(["s0", "s1", "s2"])
+    keys = [f"doc-{i}" for i in range(3000)]
+    placement = {k: ring.get_node(k) for k in keys}
+    counts = Counter(placement.values())
+    assert all(600 < c < 1400 for c in counts.values())
+
+    # adding a shard only moves keys onto the new shard
+    ring.add_node("s3")
+    moved = [k for k in keys if ring.get_node(k) != placement[k]]
+    assert moved and all(ring.get_node(k) == "s3" for k in moved)
+    assert len(moved) < len(keys) / 2
+
+    ring.remove_node("s3")
+    assert all(ring.get_node(k) == placement[k] for k in keys)
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.utils.exceptions import queueFullError, queueTimeoutError
+from app.utils.inferenceExecutor import InferenceExecutor
+
+
+def test_runs_off_the_event_loop_and_rejects_when_queue_is_full():
+    executor = InferenceExecutor("test_executor", max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def scenario():
+        loop_thread = threading.get_ident()
+        blocked = asyncio.ensure_future(executor.run(lambda: (release.wait(5), threading.get_ident())[1]))
+        await asyncio.sleep(0.05)  # running, so it no longer counts as queued
+        waiting = asyncio.ensure_future(executor.run(lambda: "second"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(queueFullError):
+            await executor.run(lambda: "third")
+        release.set()
+        worker_thread, second = await blocked, await waiting
+        return loop_thread, worker_thread, second
+
+    loop_thread, worker_thread, second = asyncio.run(scenario())
+    assert worker_thread != loop_thread and second == "second"
+    stats = executor.stats()
+    assert (stats["rejected"], stats["completed"], stats["queued"], stats["running"]) == (1, 2, 0, 0)
+
+
+def test_requests_that_waited_too_long_are_dropped():
+    executor = InferenceExecutor("test_executor_timeout", max_workers=1, max_queue=4, queue_timeout=0.05)
+    release = threading.Event()
+
+    async def scenario():
+        blocked = asyncio.ensure_future(executor.run(release.wait, 5))
+        late = asyncio.ensure_future(executor.run(lambda: "late"))
+        await asyncio.sleep(0.1)
+        release.set()
+        await blocked
+        with pytest.raises(queueTimeoutError):
+            await late
+
+    asyncio.run(scenario())
+    assert executor.stats()["expired"] == 1
+
+
+def test_stream_yields_generator_items_and_stops_on_close():
+    executor = InferenceExecutor("test_executor_stream", max_workers=1, max_queue=2)
+    produced = []
+
+    def events(n):
+        for i in range(n):
+            produced.append(i)
+            time.sleep(0.001)
+            yield "token", {"i": i}
+
+    async def scenario():
+        full = [item async for item in executor.stream(events, 3)]
+        partial = executor.stream(events, 1000)
+        first = await partial.__anext__()
+        await partial.aclose()
+        return full, first
+
+    full, first = asyncio.run(scenario())
+    assert full == [("token", {"i": i}) for i in range(3)]
+    assert first == ("token", {"i": 0})
+    time.sleep(0.05)
+    assert len(produced) < 3 + 100  # the second generator was stopped early
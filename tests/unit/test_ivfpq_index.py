@@ -0,0 +1,83 @@
+# tests/unit/test_ivfpq_index.py
+import numpy as np
+from app.retrieval.ivfpqIndex import IVFPQIndex, _sample
+
+
+def _corpus(n=2000, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.standard_normal((n, dim)).astype(np.float32)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    ids = [f"c{i}" for i in range(n)]
+    docs = [f"doc{i % 5}" for i in range(n)]
+    return x, ids, docs
+
+
+def _batches(x, ids, docs, size=300):
+    for s in range(0, len(x), size):
+        yield x[s:s + size], ids[s:s + size], docs[s:s + size]
+
+
+def _build(path, x, ids, docs, **params):
+    params = {"nlist": 16, "m": 8, "nbits": 8, "nprobe": 16, "rerank_k": 200, **params}
+    index = IVFPQIndex(**params)
+    index.train(x)
+    index.write(str(path), _batches(x, ids, docs), total=len(x))
+    return index
+
+
+def test_search_recovers_exact_neighbours(tmp_path):
+    x, ids, docs = _corpus()
+    index = _build(tmp_path, x, ids, docs)
+    q = x[7]
+    hits = index.search(q, top_k=10)
+    exact = np.argsort(-(x @ q))[:10]
+    assert hits[0]["id"] == "c7"
+    assert len({h["id"] for h in hits} & {ids[i] for i in exact}) >= 8
+    assert isinstance(index.vectors, np.memmap) and not (tmp_path / "staging").exists()
+
+
+def test_doc_filter_and_persistence(tmp_path):
+    x, ids, docs = _corpus()
+    _build(tmp_path, x, ids, docs)
+    index = IVFPQIndex.load(str(tmp_path))
+    assert isinstance(index.doc_rows, np.memmap)
+    # rows were regrouped by list: ids, documents and vectors must still line up
+    for row in (0, 777, 1999):
+        i = int(index.chunk_ids[row][1:])
+        np.testing.assert_array_equal(index.vectors[row], x[i])
+        assert index.doc_table[index.entry_docs[row]] == docs[i]
+    hits = index.search(x[3], top_k=5, doc_ids=["doc1", "doc2"])
+    assert hits and all(h["doc_id"] in ("doc1", "doc2") for h in hits)
+    assert IVFPQIndex.load(str(tmp_path / "missing")) is None
+
+
+def test_selective_filter_is_searched_exactly(tmp_path):
+    x, ids, docs = _corpus()
+    docs = ["small" if i % 200 == 0 else "big" for i in range(len(x))]  # 10 chunks spread over every list
+    index = _build(tmp_path, x, ids, docs, nprobe=1, exact_max=50)
+    q = x[1]
+    hits = index.search(q, top_k=5, doc_ids=["small"])
+    rows = np.arange(0, len(x), 200)
+    expected = rows[np.argsort(-(x[rows] @ q))[:5]]
+    assert [h["id"] for h in hits] == [ids[i] for i in expected]
+
+    index.delete_document("small")
+    assert index.search(q, top_k=5, doc_ids=["small"]) == []
+
+
+def test_broad_filter_widens_the_probe(tmp_path):
+    x, ids, docs = _corpus()
+    index = _build(tmp_path, x, ids, docs, nprobe=1, exact_max=0)
+    hits = index.search(x[2], top_k=10, doc_ids=["doc2"])  # a fifth of every list
+    assert len(hits) == 10 and all(h["doc_id"] == "doc2" for h in hits)
+    assert hits[0]["id"] == "c2"
+
+
+def test_reservoir_sample_is_bounded_and_covers_the_stream():
+    x = np.arange(10_000, dtype=np.float32).reshape(-1, 1)
+    sample, seen = _sample((x[s:s + 700] for s in range(0, len(x), 700)), 500)
+    assert seen == 10_000 and sample.shape == (500, 1)
+    assert len(np.unique(sample)) == 500
+    assert 3000 < sample.mean() < 7000  # not just the head of the stream
+    small, seen = _sample(iter([x[:10]]), 500)
+    assert seen == 10 and len(small) == 10
@@ -0,0 +1,35 @@
+import numpy as np
+from app.retrieval.mmr import mmr_select
+
+
+def _reference(vectors, relevance, k, lam):
+    v = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    rel = (relevance - relevance.min()) / (relevance.max() - relevance.min())
+    selected = []
+    while len(selected) < k:
+        best, best_score = None, -np.inf
+        for i in range(len(rel)):
+            if i in selected:
+                continue
+            redundancy = max((float(v[i] @ v[j]) for j in selected), default=0.0)
+            score = lam * rel[i] - (1 - lam) * max(redundancy, 0.0)
+            if score > best_score:
+                best, best_score = i, score
+        selected.append(best)
+    return selected
+
+
+def test_matches_reference_mmr():
+    rng = np.random.default_rng(0)
+    vectors = rng.random((40, 16)).astype(np.float32)  # non-negative: cosine >= 0
+    relevance = rng.random(40)
+    for lam in (0.3, 0.5, 0.7, 0.9):
+        assert mmr_select(vectors, relevance, 10, lam) == _reference(vectors, relevance, 10, lam)
+
+
+def test_near_duplicates_are_demoted():
+    base = np.eye(4, dtype=np.float32)
+    vectors = np.vstack([base[0], base[0] * 0.99 + base[1] * 0.01, base[2], base[3]])
+    relevance = np.array([1.0, 0.95, 0.6, 0.2])
+    assert mmr_select(vectors, relevance, 3, lam=1.0) == [0, 1, 2]
+    assert mmr_select(vectors, relevance, 3, lam=0.5) == [0, 2, 3]
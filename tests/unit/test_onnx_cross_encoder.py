@@ -0,0 +1,18 @@
+import numpy as np
+from app.retrieval.onnxCrossEncoder import rank_fidelity, spearman
+
+
+def test_spearman_matches_rank_definition():
+    assert spearman([1, 2, 3, 4], [10, 20, 30, 40]) == 1.0
+    assert spearman([1, 2, 3, 4], [4, 3, 2, 1]) == -1.0
+    # ties take their average rank: ranks (1, 2.5, 2.5, 4) vs (1, 2, 3, 4)
+    assert np.isclose(spearman([1, 2, 2, 3], [1, 2, 3, 4]), 0.9486833)
+
+
+def test_rank_fidelity_ignores_monotone_score_changes():
+    score = lambda pairs: np.array([len(t) for _, t in pairs], dtype=float)
+    squashed = lambda pairs: 1 / (1 + np.exp(-score(pairs) / 10))  # same ranking, different scale
+    reversed_ = lambda pairs: -score(pairs)
+    pools = [("q", ["a", "bbb", "cc", "dddd"]), ("r", ["xx", "y", "zzz"])]
+    assert rank_fidelity(score, squashed, pools) == (1.0, 1.0)
+    assert rank_fidelity(score, reversed_, pools) == (-1.0, -1.0)
@@ -0,0 +1,87 @@
+from dataclasses import dataclass
+from typing import Tuple
+import pytest
+from app.rag.pipelineGraph import PROFILES, PipelineProfile, PipelineState, Stage, StageError, StageGraph
+
+
+@dataclass
+class Out:
+    value: str
+    covers: Tuple[str, ...] = ()
+
+
+def _graph(calls, retrieve_covers=()):
+    def stage(name, covers=()):
+        def run(state):
+            calls.append(name)
+            return Out(name, covers)
+        return run
+    return StageGraph([
+        Stage("generate", stage("generate"), after=("rerank",)),
+        Stage("retrieve", stage("retrieve", retrieve_covers)),
+        Stage("rerank", stage("rerank"), after=("retrieve",), optional=True),
+    ])
+
+
+def test_stages_run_once_in_dependency_order():
+    calls = []
+    state = _graph(calls).run(PipelineState("q", 5, PROFILES["balanced"]))
+    assert calls == ["retrieve", "rerank", "generate"]
+    assert state.get("rerank").value == "rerank"
+
+
+def test_covered_and_profile_skipped_stages_do_not_run():
+    calls = []
+    state = _graph(calls, retrieve_covers=("rerank",)).run(PipelineState("q", 5, PROFILES["balanced"]))
+    assert calls == ["retrieve", "generate"]
+    assert [t["status"] for t in state.trace] == ["ran", "covered", "ran"]
+
+    calls.clear()
+    _graph(calls).run(PipelineState("q", 5, PipelineProfile("custom", skip=frozenset({"rerank"}))))
+    assert calls == ["retrieve", "generate"]
+
+
+def test_invalid_graphs_are_rejected():
+    noop = lambda state: None
+    with pytest.raises(ValueError):
+        StageGraph([Stage("a", noop, after=("b",)), Stage("b", noop, after=("a",))])
+    with pytest.raises(ValueError):
+        StageGraph([Stage("a", noop, after=("missing",))])
+    with pytest.raises(ValueError):
+        StageGraph([Stage("a", noop), Stage("a", noop)])
+
+
+def test_run_until_and_complete_resume_without_rerunning():
+    calls = []
+    graph = _graph(calls)
+    state = PipelineState("q", 5, PROFILES["balanced"])
+    graph.run(state, until="rerank")
+    graph.complete(state, "rerank", Out("external"))
+    graph.run(state)
+    assert calls == ["retrieve", "generate"]
+    assert state.get("rerank").value == "external"
+    with pytest.raises(ValueError):
+        graph.complete(state, "generate", Out("again"))
+
+
+def test_marker_stages_must_be_covered_or_skipped():
+    calls = []
+
+    def stage(name, covers=()):
+        def run(state):
+            calls.append(name)
+            return Out(name, covers)
+        return run
+
+    def graph(retrieve_covers):
+        return StageGraph([
+            Stage("retrieve", stage("retrieve", retrieve_covers)),
+            Stage("rerank", after=("retrieve",), optional=True),  # no run: done inside retrieve
+            Stage("generate", stage("generate"), after=("rerank",)),
+        ])
+
+    state = graph(("rerank",)).run(PipelineState("q", 5, PROFILES["balanced"]))
+    assert calls == ["retrieve", "generate"] and state.get("rerank") is None
+    graph(()).run(PipelineState("q", 5, PipelineProfile("custom", skip=frozenset({"rerank"}))))
+    with pytest.raises(StageError):
+        graph(()).run(PipelineState("q", 5, PROFILES["balanced"]))
@@ -0,0 +1,159 @@
+# tests/unit/test_reranker.py
+import threading
+import time
+import numpy as np
+import pytest
+import app.retrieval.reranker as reranker_module
+from app.retrieval.candidate import Candidate
+from app.retrieval.reranker import Reranker, RerankBatcher
+
+
+class CountingModel:
+    """Cross-encoder stand-in: the score is read off the chunk text ("... s=0.7"), every scored pair is recorded."""
+
+    def __init__(self):
+        self.scored = []
+
+    def predict(self, pairs, batch_size=None, show_progress_bar=False):
+        self.scored.extend(pairs)
+        return np.array([float(t.rsplit("s=", 1)[1]) for _, t in pairs], dtype=np.float32)
+
+
+@pytest.fixture
+def make_reranker(monkeypatch):
+    monkeypatch.setattr(reranker_module, "CROSS_ENCODER_AVAILABLE", False)
+    monkeypatch.setattr(reranker_module, "EmbeddingClient", lambda: None)
+
+    def make(**kwargs):
+        r = Reranker(normalize_scores=False, coalesce_window=0, **{"cascade_m": 0, **kwargs})
+        r.model, r.backend = CountingModel(), "stub"
+        return r
+    return make
+
+
+def _cands(doc_id, scores):
+    return [Candidate(id=f"{doc_id}_c{i}", doc_id=doc_id, text=f"chunk {i} s={s}") for i, s in enumerate(scores)]
+
+
+def test_cache_hits_skip_the_model(make_reranker):
+    r = make_reranker()
+    cands = _cands("docA", [0.2, 0.9, 0.5])
+    first = r.rerank("What is the budget?", cands, top_k=3)
+    assert [c.id for c in first] == ["docA_c1", "docA_c2", "docA_c0"]
+    assert len(r.model.scored) == 3
+    # same normalized query: every score comes from the cache
+    again = r.rerank("  what is the BUDGET? ", _cands("docA", [0.2, 0.9, 0.5]), top_k=3)
+    assert [(c.id, c.rerank_score) for c in again] == [(c.id, c.rerank_score) for c in first]
+    assert len(r.model.scored) == 3
+
+
+def test_only_misses_reach_the_model(make_reranker):
+    r = make_reranker()
+    r.rerank("q", _cands("docA", [0.1, 0.2]))
+    r.model.scored.clear()
+    mixed = _cands("docA", [0.1, 0.2]) + _cands("docB", [0.8])
+    ranked = r.rerank("q", mixed, top_k=3)
+    assert r.model.scored == [("q", "chunk 0 s=0.8")]
+    assert [c.id for c in ranked] == ["docB_c0", "docA_c1", "docA_c0"]
+    r.model.scored.clear()
+    r.rerank("another query", _cands("docA", [0.1]))
+    assert len(r.model.scored) == 1  # keyed by query too
+
+
+def test_invalidate_document_drops_only_that_documents_scores(make_reranker):
+    r = make_reranker()
+    r.rerank("q", _cands("docA", [0.1, 0.2]) + _cands("docB", [0.3]))
+    assert r.invalidate_document("docA") == 2  # re-ingest / delete of docA
+    r.model.scored.clear()
+    # re-ingested docA: same chunk ids, new text, so stale scores must not be served
+    ranked = r.rerank("q", _cands("docA", [0.9, 0.2]) + _cands("docB", [0.3]), top_k=3)
+    assert sorted(t for _, t in r.model.scored) == ["chunk 0 s=0.9", "chunk 1 s=0.2"]
+    assert ranked[0].id == "docA_c0" and ranked[0].rerank_score == pytest.approx(0.9)
+    assert r.invalidate_document("docC") == 0
+
+
+def _staged(retrieval_scores, ce_scores):
+    """Candidates whose first-stage (fused) score and cross-encoder score are set independently."""
+    return [Candidate(id=f"c{i}", doc_id="docA", text=f"chunk {i} s={ce}", score=fused)
+            for i, (fused, ce) in enumerate(zip(retrieval_scores, ce_scores))]
+
+
+@pytest.mark.parametrize("finalist_scores, cut_scores", [
+    ((0.4, 0.8), (0.3, 0.2, 0.1)),         # low > 0: cut ones shrink toward 0 below the lowest finalist
+    ((-1.5, 0.8), (-1.75, -2.0, -2.25)),   # low <= 0: cut ones step down from it
+])
+def test_cascade_scores_finalists_and_ranks_the_cut_below_them(make_reranker, finalist_scores, cut_scores):
+    r = make_reranker(cascade_m=2)
+    # first-stage order: c0, c3 | c2, c4, c1 -- c2 would win the cross-encoder but is cut
+    low, high = finalist_scores
+    cands = _staged([0.9, 0.1, 0.5, 0.7, 0.3], [low, 0.95, 0.99, high, 0.97])
+    scores = r._cascade_scores("q", cands)
+    assert sorted(t for _, t in r.model.scored) == [f"chunk 0 s={low}", f"chunk 3 s={high}"]
+    np.testing.assert_allclose(scores[[0, 3]], finalist_scores)
+    np.testing.assert_allclose(scores[[2, 4, 1]], cut_scores)
+    ranked = r.rerank("q", _staged([0.9, 0.1, 0.5, 0.7, 0.3], [low, 0.95, 0.99, high, 0.97]), top_k=5)
+    assert [c.id for c in ranked] == ["c3", "c0", "c2", "c4", "c1"]
+
+
+def test_cascade_scores_everything_when_the_pool_is_small(make_reranker):
+    r = make_reranker(cascade_m=5)
+    scores = r._cascade_scores("q", _staged([0.1, 0.2, 0.3], [0.7, 0.6, 0.5]))
+    np.testing.assert_allclose(scores, [0.7, 0.6, 0.5])
+    assert len(r.model.scored) == 3
+
+
+def _concurrently(fn, args_list):
+    """Run fn(*args) for each args on its own thread; returns results (or raised exceptions) in order."""
+    results = [None] * len(args_list)
+
+    def run(i, args):
+        try:
+            results[i] = fn(*args)
+        except Exception as e:
+            results[i] = e
+    threads = [threading.Thread(target=run, args=(i, args)) for i, args in enumerate(args_list)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    return results
+
+
+def test_batcher_coalesces_concurrent_callers_and_splits_scores_back():
+    calls = []
+
+    def score_fn(pairs):
+        calls.append(list(pairs))
+        return np.array([len(t) for _, t in pairs], dtype=np.float32)
+
+    batcher = RerankBatcher(score_fn, window=0.5, max_pairs=1000)
+    requests = [[("q1", "a"), ("q1", "bb")], [("q2", "ccc")], [("q3", "dddd"), ("q3", "eeeee"), ("q3", "f")]]
+    results = _concurrently(batcher.score, [(pairs,) for pairs in requests])
+    assert len(calls) == 1 and sorted(calls[0]) == sorted(p for pairs in requests for p in pairs)
+    for pairs, scores in zip(requests, results):
+        np.testing.assert_array_equal(scores, [len(t) for _, t in pairs])
+
+
+def test_batcher_flushes_early_at_max_pairs():
+    batcher = RerankBatcher(lambda pairs: np.zeros(len(pairs)), window=30.0, max_pairs=4)
+    start = time.monotonic()
+    results = _concurrently(batcher.score, [([("q", "a"), ("q", "b")],), ([("q", "c"), ("q", "d")],)])
+    assert [len(r) for r in results] == [2, 2]
+    assert time.monotonic() - start < 5
+
+
+def test_batcher_propagates_a_failure_to_every_waiter():
+    fail = threading.Event()
+    fail.set()
+
+    def score_fn(pairs):
+        if fail.is_set():
+            raise RuntimeError("CUDA out of memory")
+        return np.ones(len(pairs))
+
+    batcher = RerankBatcher(score_fn, window=0.5, max_pairs=1000)
+    results = _concurrently(batcher.score, [([("q", str(i))],) for i in range(3)])
+    assert all(isinstance(r, RuntimeError) and str(r) == "CUDA out of memory" for r in results)
+    # the worker survives the failed batch
+    fail.clear()
+    np.testing.assert_array_equal(batcher.score([("q", "x")]), [1.0])
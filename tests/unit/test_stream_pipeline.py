@@ -0,0 +1,57 @@
+# tests/unit/test_stream_pipeline.py
+import pytest
+import app.rag.hybridRagPipeline as hybrid
+from app.rag.hybridRagPipeline import Answer, Cited, Refined, Retrieved, Verdict
+from app.rag.pipelineGraph import Stage, StageGraph
+from app.retrieval.candidate import Candidate
+
+
+@pytest.fixture
+def timeline(monkeypatch):
+    """Stub stages, LLM and document store; stage runs and stream events are appended in order."""
+    log = []
+
+    def not_run(name):
+        def run(state):
+            raise AssertionError(f"{name} should not run inside the graph")
+        return run
+
+    def judge(state):
+        log.append("judge stage")
+        return Verdict({"score": 0.9}, state.get("generate").text)
+
+    def cite(state):
+        log.append("cite stage")
+        assert state.get("judge") is None  # cited from the raw answer
+        return Cited(state.get("generate").text.upper(), [])
+
+    chunks = [Candidate(id="c1", doc_id="docA", page=1, text="budget approved in May")]
+    monkeypatch.setattr(hybrid, "PIPELINE", StageGraph([
+        Stage("refine", lambda state: Refined(state.query)),
+        Stage("retrieve", lambda state: Retrieved(chunks, ("fuse", "rerank")), after=("refine",)),
+        Stage("fuse", after=("retrieve",)),
+        Stage("rerank", after=("fuse",), optional=True),
+        Stage("generate", not_run("generate"), after=("rerank",)),
+        Stage("judge", judge, after=("generate",), optional=True),
+        Stage("cite", not_run("cite"), after=("judge",)),
+    ]))
+    monkeypatch.setattr(hybrid, "_cite_stage", cite)
+    monkeypatch.setattr(hybrid, "documentStore", type("Docs", (), {"getDocument": lambda self, d: {"docId": d}})())
+    monkeypatch.setattr(hybrid, "llmClient", type("LLM", (), {"streamAnswer": lambda self, *a, **k: iter(["in ", "May"])})())
+    return log
+
+
+def test_answer_is_sent_before_the_judge_runs(timeline):
+    for event, data in hybrid.stream_pipeline("docA", "When was the budget approved?", profile="balanced"):
+        timeline.append(event)
+        if event == "answer":
+            assert data == {"finalAnswer": "IN MAY", "rawAnswer": "in May"}
+        if event == "judge":
+            assert data == {"judge": {"score": 0.9}}
+    assert timeline == ["retrieval", "token", "token", "cite stage", "answer", "judge stage", "judge", "done"]
+
+
+def test_fast_profile_streams_without_a_judge(timeline):
+    events = [event for event, _ in hybrid.stream_pipeline("docA", "q", profile="fast")]
+    assert timeline == ["cite stage"]
+    assert events == ["retrieval", "token", "token", "answer", "judge", "done"]
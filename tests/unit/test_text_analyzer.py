@@ -0,0 +1,19 @@
+# tests/unit/test_text_analyzer.py
+from app.utils.textAnalyzer import Analyzer, normalize, tokenize, stem
+
+
+def test_normalize_and_tokenize():
+    assert normalize("  Net Revenue\n\tGREW ") == "net revenue grew"
+    assert tokenize("Q3 revenue (USD): 4.2bn, up 10%") == ["q3", "revenue", "usd", "4", "2bn", "up", "10"]
+
+
+def test_stopwords_stemming_and_keywords():
+    plain = Analyzer(remove_stopwords=True, stemming=False)
+    assert plain.analyze("The costs of the filings") == ["costs", "filings"]
+    assert plain.keywords("the risk and the risk of loss", cap=5) == ["risk", "loss"]
+
+    stemmed = Analyzer(remove_stopwords=True, stemming=True)
+    assert stemmed.analyze("Filing and filed costs") == ["fil", "fil", "cost"]
+    assert stem("class") == "class" and stem("policies") == "policy"
+    assert stemmed.overlap("rising costs", "cost rises") == 2
+    assert Analyzer.from_signature(stemmed.signature).signature == stemmed.signature